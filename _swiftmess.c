@@ -0,0 +1,432 @@
+/*
+ * Optional C implementation of the state machine in `swiftmess.MessageParser.feed()`.
+ *
+ * `swiftmess` uses it automatically if it has been built, for example using:
+ *
+ *   $ python3 setup.py build_ext --inplace
+ *
+ * and otherwise falls back to the pure Python implementation. Both yield the same items and
+ * report the same errors.
+ *
+ * Copyright (c) 2012, Thomas Aglassinger
+ *
+ * This program is free software: you can redistribute it and/or modify it
+ * under the terms of the GNU Lesser General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or (at your
+ * option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful, but WITHOUT
+ * ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+ * FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License
+ * for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ */
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+/* Tokenizer states in the same order as `swiftmess._States`. */
+enum {
+    BeforeStartOfBlock = 0,
+    InBlockKey,
+    InLine,
+    InFieldKey,
+    InFieldValue,
+    InValue,
+    StateCount
+};
+
+/* Item kinds, error kinds and the empty text, shared between all items. */
+static PyObject *BlockKind = NULL;
+static PyObject *FieldKind = NULL;
+static PyObject *ValueKind = NULL;
+static PyObject *MessageKind = NULL;
+static PyObject *UnmatchedError = NULL;
+static PyObject *NestedError = NULL;
+static PyObject *BlockStartError = NULL;
+static PyObject *BlockIdError = NULL;
+static PyObject *EmptyText = NULL;
+
+/* Append the item ``(level, kind, value)`` to ``items``. */
+static int
+appendItem(PyObject *items, Py_ssize_t level, PyObject *kind, PyObject *value)
+{
+    int result = -1;
+    PyObject *item = PyTuple_New(3);
+
+    if (item != NULL) {
+        PyObject *levelNumber = PyLong_FromSsize_t(level);
+
+        if (levelNumber != NULL) {
+            PyTuple_SET_ITEM(item, 0, levelNumber);
+            Py_INCREF(kind);
+            PyTuple_SET_ITEM(item, 1, kind);
+            Py_INCREF(value);
+            PyTuple_SET_ITEM(item, 2, value);
+            result = PyList_Append(items, item);
+        }
+        Py_DECREF(item);
+    }
+    return result;
+}
+
+/* Replace ``*text`` by ``*text + data[start:end]``; ``NULL`` counts as empty text. */
+static int
+appendText(PyObject **text, PyObject *data, Py_ssize_t start, Py_ssize_t end)
+{
+    PyObject *part = PyUnicode_Substring(data, start, end);
+
+    if (part == NULL) {
+        return -1;
+    }
+    if ((*text == NULL) || (PyUnicode_GET_LENGTH(*text) == 0)) {
+        Py_XSETREF(*text, part);
+    } else {
+        PyObject *joined = PyUnicode_Concat(*text, part);
+
+        Py_DECREF(part);
+        if (joined == NULL) {
+            return -1;
+        }
+        Py_SETREF(*text, joined);
+    }
+    return 0;
+}
+
+/* Replace ``*text`` by the empty text. */
+static void
+clearText(PyObject **text)
+{
+    Py_INCREF(EmptyText);
+    Py_XSETREF(*text, EmptyText);
+}
+
+/*
+ * New reference to ``text`` decoded using ``encoding`` after restoring the original bytes, same as
+ * `swiftmess._decoded()`, or to ``text`` itself if ``encoding`` is ``NULL``.
+ */
+static PyObject *
+decodedText(PyObject *text, const char *encoding)
+{
+    PyObject *result;
+
+    if (text == NULL) {
+        text = EmptyText;
+    }
+    if (encoding == NULL) {
+        Py_INCREF(text);
+        result = text;
+    } else {
+        PyObject *data = PyUnicode_AsLatin1String(text);
+
+        if (data == NULL) {
+            return NULL;
+        }
+        result = PyUnicode_Decode(PyBytes_AS_STRING(data), PyBytes_GET_SIZE(data), encoding, "strict");
+        Py_DECREF(data);
+    }
+    return result;
+}
+
+/* New reference to ``value`` or ``None`` if it is ``NULL``. */
+static PyObject *
+valueOrNone(PyObject *value)
+{
+    if (value == NULL) {
+        value = Py_None;
+    }
+    Py_INCREF(value);
+    return value;
+}
+
+PyDoc_STRVAR(feed__doc__,
+"feed(data, state, level, text, fieldKey, items, intern, encoding)\n"
+"\n"
+"Process ``data`` starting in the parser state described by ``state`` (an index into\n"
+"`swiftmess._States`), ``level``, ``text`` and ``fieldKey`` and append the items found to\n"
+"``items``. Field names are passed to ``intern`` and, like values, decoded using ``encoding``\n"
+"unless it is ``None``.\n"
+"\n"
+"The result is a tuple ``(state, level, text, fieldKey, errorKind, errorChar)`` describing the\n"
+"state after the data or, if ``errorKind`` is not ``None``, the state at which the error\n"
+"described by ``errorKind`` and ``errorChar`` was found. If an exception is raised meanwhile,\n"
+"for example while decoding, ``errorKind`` is that exception and ``errorChar`` is ``None`` so\n"
+"the caller can keep the state reached before raising it.");
+
+static PyObject *
+feed(PyObject *module, PyObject *args)
+{
+    PyObject *data;
+    int state;
+    Py_ssize_t level;
+    PyObject *textArgument;
+    PyObject *fieldKeyArgument;
+    PyObject *items;
+    PyObject *intern;
+    PyObject *encodingArgument;
+    const char *encoding = NULL;
+    PyObject *text = NULL;
+    PyObject *fieldKey = NULL;
+    PyObject *errorKind = NULL;
+    PyObject *errorChar = NULL;
+    PyObject *value = NULL;
+    PyObject *result = NULL;
+    int dataKind;
+    const void *buffer;
+    Py_ssize_t length;
+    Py_ssize_t index = 0;
+    Py_ssize_t endIndex;
+    Py_ssize_t digitEndIndex;
+    Py_UCS4 ch;
+
+    if (!PyArg_ParseTuple(
+            args, "UinOOO!OO:feed", &data, &state, &level, &textArgument, &fieldKeyArgument,
+            &PyList_Type, &items, &intern, &encodingArgument)) {
+        return NULL;
+    }
+    if ((state < 0) || (state >= StateCount)) {
+        PyErr_Format(PyExc_ValueError, "state must be between 0 and %d but is %d", StateCount - 1, state);
+        return NULL;
+    }
+    if (encodingArgument != Py_None) {
+        encoding = PyUnicode_AsUTF8(encodingArgument);
+        if (encoding == NULL) {
+            return NULL;
+        }
+    }
+    if (textArgument != Py_None) {
+        Py_INCREF(textArgument);
+        text = textArgument;
+    }
+    if (fieldKeyArgument != Py_None) {
+        Py_INCREF(fieldKeyArgument);
+        fieldKey = fieldKeyArgument;
+    }
+
+    dataKind = PyUnicode_KIND(data);
+    buffer = PyUnicode_DATA(data);
+    length = PyUnicode_GET_LENGTH(data);
+    while ((index < length) && (errorKind == NULL)) {
+        if ((state == InFieldValue) || (state == InValue)) {
+            endIndex = index;
+            while (endIndex < length) {
+                ch = PyUnicode_READ(dataKind, buffer, endIndex);
+                if ((ch == '\n') || (ch == '}')) {
+                    break;
+                }
+                endIndex += 1;
+            }
+            if (endIndex == length) {
+                if (appendText(&text, data, index, length) < 0) {
+                    goto cleanup;
+                }
+                index = length;
+            } else {
+                if (state == InFieldValue) {
+                    PyObject *name = decodedText(fieldKey, encoding);
+
+                    if (name == NULL) {
+                        goto cleanup;
+                    }
+                    value = PyObject_CallFunctionObjArgs(intern, name, NULL);
+                    Py_DECREF(name);
+                    if ((value == NULL) || (appendItem(items, level, FieldKind, value) < 0)) {
+                        goto cleanup;
+                    }
+                    Py_CLEAR(value);
+                    Py_CLEAR(fieldKey);
+                }
+                if (appendText(&text, data, index, endIndex) < 0) {
+                    goto cleanup;
+                }
+                value = decodedText(text, encoding);
+                if ((value == NULL) || (appendItem(items, level, ValueKind, value) < 0)) {
+                    goto cleanup;
+                }
+                Py_CLEAR(value);
+                Py_CLEAR(text);
+                if (PyUnicode_READ(dataKind, buffer, endIndex) == '}') {
+                    state = BeforeStartOfBlock;
+                    level -= 1;
+                } else {
+                    state = InLine;
+                }
+                index = endIndex + 1;
+            }
+        } else if (state == InLine) {
+            ch = PyUnicode_READ(dataKind, buffer, index);
+            if (ch == ':') {
+                state = InFieldKey;
+                clearText(&text);
+            } else if (ch == '{') {
+                state = InBlockKey;
+                level += 1;
+                clearText(&text);
+            } else if (ch == '}') {
+                state = BeforeStartOfBlock;
+                level -= 1;
+            } else if (ch == '\n') {
+                if (appendItem(items, level, ValueKind, EmptyText) < 0) {
+                    goto cleanup;
+                }
+            } else {
+                /* Keep the current character as start of the value. */
+                state = InValue;
+                clearText(&text);
+                index -= 1;
+            }
+            index += 1;
+        } else if (state == InFieldKey) {
+            endIndex = PyUnicode_FindChar(data, ':', index, length, 1);
+            if (endIndex == -2) {
+                goto cleanup;
+            }
+            if (endIndex < 0) {
+                if (appendText(&text, data, index, length) < 0) {
+                    goto cleanup;
+                }
+                index = length;
+            } else {
+                state = InFieldValue;
+                if (appendText(&text, data, index, endIndex) < 0) {
+                    goto cleanup;
+                }
+                Py_XSETREF(fieldKey, text);
+                text = NULL;
+                clearText(&text);
+                index = endIndex + 1;
+            }
+        } else if (state == BeforeStartOfBlock) {
+            ch = PyUnicode_READ(dataKind, buffer, index);
+            if (ch == '{') {
+                state = InBlockKey;
+                level += 1;
+                clearText(&text);
+            } else if (ch == '}') {
+                if (level == 0) {
+                    errorKind = UnmatchedError;
+                } else {
+                    level -= 1;
+                }
+            } else if (ch == '\n') {
+                if (level != 0) {
+                    errorKind = NestedError;
+                } else if (appendItem(items, level, MessageKind, Py_None) < 0) {
+                    goto cleanup;
+                }
+            } else {
+                errorKind = BlockStartError;
+            }
+            if (errorKind != NULL) {
+                errorChar = PyUnicode_FromOrdinal(ch);
+                if (errorChar == NULL) {
+                    goto cleanup;
+                }
+            } else {
+                index += 1;
+            }
+        } else {
+            /* InBlockKey */
+            endIndex = PyUnicode_FindChar(data, ':', index, length, 1);
+            if (endIndex == -2) {
+                goto cleanup;
+            }
+            if (endIndex < 0) {
+                endIndex = length;
+            }
+            digitEndIndex = index;
+            while ((digitEndIndex < endIndex) && Py_UNICODE_ISDIGIT(PyUnicode_READ(dataKind, buffer, digitEndIndex))) {
+                digitEndIndex += 1;
+            }
+            if (digitEndIndex < endIndex) {
+                errorKind = BlockIdError;
+                errorChar = PyUnicode_FromOrdinal(PyUnicode_READ(dataKind, buffer, digitEndIndex));
+                if (errorChar == NULL) {
+                    goto cleanup;
+                }
+            } else if (appendText(&text, data, index, endIndex) < 0) {
+                goto cleanup;
+            } else if (endIndex == length) {
+                index = length;
+            } else {
+                state = InLine;
+                value = PyLong_FromUnicodeObject((text != NULL) ? text : EmptyText, 10);
+                if ((value == NULL) || (appendItem(items, level, BlockKind, value) < 0)) {
+                    goto cleanup;
+                }
+                Py_CLEAR(value);
+                Py_CLEAR(text);
+                index = endIndex + 1;
+            }
+        }
+    }
+    result = Py_BuildValue(
+        "(inNNNN)", state, level, valueOrNone(text), valueOrNone(fieldKey), valueOrNone(errorKind),
+        valueOrNone(errorChar));
+cleanup:
+    if (result == NULL) {
+        PyObject *errorType;
+        PyObject *error;
+        PyObject *traceback;
+
+        /* Same as the ``finally`` of `swiftmess.MessageParser._pythonFeed()`, keep the state reached. */
+        PyErr_Fetch(&errorType, &error, &traceback);
+        PyErr_NormalizeException(&errorType, &error, &traceback);
+        if (error != NULL) {
+            if (traceback != NULL) {
+                PyException_SetTraceback(error, traceback);
+            }
+            result = Py_BuildValue(
+                "(inNNNN)", state, level, valueOrNone(text), valueOrNone(fieldKey), error, valueOrNone(NULL));
+        } else {
+            PyErr_Restore(errorType, error, traceback);
+            errorType = NULL;
+            traceback = NULL;
+        }
+        Py_XDECREF(errorType);
+        Py_XDECREF(traceback);
+    }
+    Py_XDECREF(value);
+    Py_XDECREF(text);
+    Py_XDECREF(fieldKey);
+    Py_XDECREF(errorChar);
+    return result;
+}
+
+static PyMethodDef methods[] = {
+    {"feed", feed, METH_VARARGS, feed__doc__},
+    {NULL, NULL, 0, NULL}
+};
+
+static struct PyModuleDef module = {
+    PyModuleDef_HEAD_INIT,
+    "_swiftmess",
+    "C implementation of the tokenizer state machine of `swiftmess.MessageParser`.",
+    -1,
+    methods
+};
+
+static int
+initText(PyObject **target, const char *text)
+{
+    *target = PyUnicode_InternFromString(text);
+    return (*target != NULL) ? 0 : -1;
+}
+
+PyMODINIT_FUNC
+PyInit__swiftmess(void)
+{
+    if ((initText(&BlockKind, "block") < 0)
+            || (initText(&FieldKind, "field") < 0)
+            || (initText(&ValueKind, "value") < 0)
+            || (initText(&MessageKind, "message") < 0)
+            || (initText(&UnmatchedError, "unmatched") < 0)
+            || (initText(&NestedError, "nested") < 0)
+            || (initText(&BlockStartError, "blockStart") < 0)
+            || (initText(&BlockIdError, "blockId") < 0)
+            || (initText(&EmptyText, "") < 0)) {
+        return NULL;
+    }
+    return PyModule_Create(&module);
+}
@@ -8,10 +8,21 @@ Create the installer archive::
 
   $ python setup.py sdist --formats=zip
 
+Build the optional C extension for Python 3 in place so the tests and benchmarks use it::
+
+  $ python3 setup.py build_ext --inplace
+
+Measure performance and compare it with the results of a previous version::
+
+  $ python test/bench_swiftmess.py --output bench_0.x.json
+  $ python test/bench_swiftmess.py --compare bench_0.x.json
+
 Upload release to PyPI::
 
   $ pep8 -r --ignore=E501 *.py test/*.py
   $ python test/test_swiftmess.py
+  $ python3 test/test_swiftmess.py
+  $ python3 test/test_swiftmessaio.py
   $ python setup.py sdist --formats=zip upload
 
 Tag a release::
@@ -33,14 +44,28 @@ Tag a release::
 #
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
-from setuptools import setup
+import sys
+
+from setuptools import Extension, setup
 
 import swiftmess
 
+# The asyncio reader needs Python 3.6 or later.
+_modules = ['swiftmess']
+if sys.version_info >= (3, 6):
+    _modules.append('swiftmessaio')
+
+# The C implementation of the tokenizer is optional: without a compiler, swiftmess falls back to
+# pure Python.
+_extensions = []
+if (sys.version_info >= (3, 3)) and (sys.implementation.name == 'cpython'):
+    _extensions.append(Extension('_swiftmess', ['_swiftmess.c'], optional=True))
+
 setup(
     name='swiftmess',
     version=swiftmess.__version__,
-    py_modules=['swiftmess'],
+    py_modules=_modules,
+    ext_modules=_extensions,
     description='parse SWIFT messages for financial transactions',
     keywords='swift bank banking financial message',
     author='Thomas Aglassinger',
@@ -48,6 +73,12 @@ setup(
     url='http://pypi.python.org/pypi/swiftmess/',
     long_description=swiftmess.__doc__,  # @UndefinedVariable
     install_requires=['setuptools'],
+    extras_require={
+        'arrow': ['pyarrow'],
+    },
+    entry_points={
+        'console_scripts': ['swiftmess = swiftmess:main', 'swiftmess-ingest = swiftmess:ingestMain'],
+    },
     classifiers=[
         'Development Status :: 4 - Beta',
         'Environment :: Console',
@@ -56,9 +87,8 @@ setup(
         'License :: OSI Approved :: GNU Library or Lesser General Public License (LGPL)',
         'Natural Language :: English',
         'Operating System :: OS Independent',
-        'Programming Language :: Python :: 2.5',
-        'Programming Language :: Python :: 2.6',
         'Programming Language :: Python :: 2.7',
+        'Programming Language :: Python :: 3',
         'Topic :: Office/Business :: Financial',
         'Topic :: Text Processing'
     ]
@@ -15,22 +15,138 @@ Swiftmess is a Python module to parse SWIFT messages used for financial transact
 #
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import array
+import bz2
+import collections
+import csv
 import decimal
+import glob
+import gzip
+import hashlib
+import io
 import logging
+import mmap
+import multiprocessing
+import multiprocessing.pool
+import optparse
+import os
 import re
+import sys
+import tempfile
+import threading
+import time
+import zlib
 from datetime import date, datetime
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+try:
+    # Optional C implementation of `MessageParser.feed()` built from _swiftmess.c.
+    import _swiftmess
+except ImportError:
+    _swiftmess = None
 
 _log = logging.getLogger('swift')
 
-__version__ = '0.2'
+# Most precise timer available to measure `ParseStats`.
+_timer = getattr(time, 'perf_counter', time.time)
+
+# Builtins that differ between Python 2 and 3.
+try:
+    _long = long
+    _range = xrange
+    _StringTypes = basestring
+    _Text = unicode
+except NameError:
+    _long = int
+    _range = range
+    _StringTypes = str
+    _Text = str
+
+# True on Python 2, where ``str`` holds bytes.
+_StrIsBytes = bytes is str
+
+if _StrIsBytes:
+    def _textOf(data):
+        return data
+
+    def _decoded(text, encoding):
+        return text.decode(encoding)
+else:
+    # Raw bytes are processed as ISO-8859-1 text, which maps each byte to exactly one character and
+    # so keeps offsets intact. Values are decoded using the actual encoding only when needed.
+    def _textOf(data):
+        if isinstance(data, (bytes, bytearray)):
+            data = data.decode('iso-8859-1')
+        return data
+
+    def _decoded(text, encoding):
+        return text.encode('iso-8859-1').decode(encoding)
+
+
+def _dataFor(targetFile, text):
+    '''
+    ``text`` encoded for ``targetFile`` unless it is a text file, so reading it with `_textOf()`
+    restores it.
+    '''
+    if isinstance(text, _Text) and not isinstance(targetFile, io.TextIOBase):
+        text = text.encode('iso-8859-1', 'backslashreplace')
+    return text
+
+
+__version__ = '0.3'
 
 _FamtMarker = 'FAMT/'
 
+#: Number of characters `messageItems` reads at once.
+DefaultBufferSize = 64 * 1024
+
+# Possible values for the tokenizer state.
+_BeforeStartOfBlock = 'BeforeStartOfBlock'
+_InBlockKey = 'InBlockKey'
+_InLine = 'InLine'
+_InFieldKey = 'InFieldKey'
+_InFieldValue = 'InFieldValue'
+_InValue = 'InValue'
+_States = (_BeforeStartOfBlock, _InBlockKey, _InLine, _InFieldKey, _InFieldValue, _InValue)
+
+# Characters that end a value.
+_ValueEndRegex = re.compile(r'[\n}]')
+
+# Value of the form ":<NAME>//<VALUE>".
+_SlashedNameValueRegex = re.compile(r'[:](?P<name>.+)//(?P<value>.*)')
+
+# Date in the form YYYYMMDD.
+_IsoDateRegex = re.compile(r'([0-9]{4})([0-9]{2})([0-9]{2})$')
+
+# Amount in SWIFT format: digits with a comma as decimal separator and no thousands separators.
+_SwiftAmountRegex = re.compile(r'([0-9]+),([0-9]*)$')
+
+#: Maximum number of converted dates and amounts a `Report` remembers to speed up repeated values.
+DefaultConverterCacheSize = 1024
+
+#: Maximum number of distinct values a `SymbolTable` shares between equal occurrences.
+DefaultSymbolTableSize = 4096
+
+#: Approximate number of bytes `parallelReport` and `parallelTrades` pass to a worker at once.
+DefaultChunkSize = 4 * 1024 * 1024
+
+# End of a block followed by a newline, which in valid input can only happen at the end of a message.
+_MessageEndRegex = re.compile(r'\}\r*\n')
+_MessageEndBytesRegex = re.compile(br'\}\r*\n')
+# Start of field 77E, which specifies the report type.
+_ReportFieldBytesRegex = re.compile(br'(?:^|\n):77E:')
+
+
 class Error(Exception):
     pass
 
 
-def messageItems(readable):
+def messageItems(
+        readable, engine='buffered', bufferSize=DefaultBufferSize, encoding=None, quarantine=None, stats=None,
+        symbols=None):
     '''
     Message items found in ``readable`` as tuples of the form ``(nestingLevel, type, value)`` with:
 
@@ -40,16 +156,86 @@ def messageItems(readable):
       and for 'message' this is ``None``.
 
     The messages have to be stored in EDIFACT / ISO 15022 format.
+
+    ``engine`` selects the tokenizer:
+
+    * 'buffered': read ``readable`` in chunks of ``bufferSize`` characters and scan them for delimiters
+      (the default).
+    * 'reference': read ``readable`` one character at a time; this is slow but simple and mainly serves
+      to check the results of the other engines.
+
+    Both engines yield the same items and raise the same errors.
+
+    If ``encoding`` is not ``None``, ``readable`` has to provide raw bytes, for example a `MappedFile`.
+    Only the field names and values actually yielded are decoded using ``encoding``.
+
+    If ``quarantine`` is a `Quarantine`, broken messages do not raise an `Error`. Instead their location
+    and error are added to ``quarantine``, none of their items are yielded, and parsing continues
+    with the next line starting with ``{`` outside of any block, or with ``{1:`` anywhere. Consequently
+    a message with a block that is never closed also swallows all following messages up to the next
+    one starting with ``{1:``.
+
+    If ``stats`` is a `ParseStats`, it is updated with the data read and the items found.
+
+    If ``symbols`` is a `SymbolTable`, the 'buffered' engine uses it to share equal field names, as
+    described in `MessageParser`.
+
+    Quarantine and stats require the 'buffered' engine.
     '''
     assert readable is not None
+    assert engine in ('buffered', 'reference'), u'engine=%r' % engine
+    assert bufferSize > 0
+    assert ((quarantine is None) and (stats is None)) or (engine == 'buffered')
+
+    if quarantine is not None:
+        for item in _quarantiningMessageItems(readable, bufferSize, encoding, quarantine, stats, symbols):
+            yield item
+    elif engine == 'buffered':
+        parser = MessageParser(encoding, symbols=symbols)
+        data = readable.read(bufferSize)
+        while data:
+            pendingError = None
+            if stats is not None:
+                startTime = _timer()
+            try:
+                parser.feed(data)
+            except Exception as error:
+                # Items found before the error still have to be yielded.
+                pendingError = error
+            items = parser.popItems()
+            if stats is not None:
+                stats._addTokenized(len(data), items, _timer() - startTime)
+                if pendingError is not None:
+                    stats.errorCount += 1
+                stats._notify()
+            for item in items:
+                yield item
+            if pendingError is not None:
+                raise pendingError
+            data = readable.read(bufferSize)
+        try:
+            parser.close()
+        except Error:
+            if stats is not None:
+                stats.errorCount += 1
+            raise
+        if stats is not None:
+            stats._addEndOfInput()
+    elif encoding is None:
+        for item in _referenceMessageItems(readable):
+            yield item
+    else:
+        for level, kind, value in _referenceMessageItems(readable):
+            if kind in ('field', 'value'):
+                value = _decoded(value, encoding)
+            yield (level, kind, value)
+
 
-    # Possible values for ``state``.
-    _BeforeStartOfBlock = 'BeforeStartOfBlock'
-    _InBlockKey = 'InBlockKey'
-    _InLine = 'InLine'
-    _InFieldKey = 'InFieldKey'
-    _InFieldValue = 'InFieldValue'
-    _InValue = 'InValue'
+def _referenceMessageItems(readable):
+    '''
+    Same as `messageItems` but read ``readable`` character by character.
+    '''
+    assert readable is not None
 
     state = _BeforeStartOfBlock
     text = None
@@ -57,9 +243,8 @@ def messageItems(readable):
     fieldKey = None
     level = 0
 
-    char = readable.read(1)
+    char = _textOf(readable.read(1))
     while (char != ''):
-        _log.debug('level=%d, char=%r, state=%s, text=%r', level, char, state, text)
         if char == '\r':
             pass
         elif state == _BeforeStartOfBlock:
@@ -80,7 +265,7 @@ def messageItems(readable):
         elif state == _InBlockKey:
             if char == ':':
                 state = _InLine
-                blockKey = long(text)
+                blockKey = _long(text)
                 yield (level, 'block', blockKey)
                 text = None
             elif char.isdigit():
@@ -137,314 +322,3781 @@ def messageItems(readable):
                     state = _InLine
             else:
                 text += char
-        char = readable.read(1)
+        char = _textOf(readable.read(1))
     if state != _BeforeStartOfBlock:
         raise Error(u'block must be closed (state=%r)' % state)
     if level != 0:
         raise Error(u'nested block must be closed (state=%r, level=%d)' % (state, level))
 
-def structuredItems(messageToRead):
-    assert messageToRead is not None
-    block = None
-    field = None
-    value = None
-    valuesSoFar = []
-    for level, kind, value in messageItems(messageToRead):
-        # TODO: remove: print u'    %d, %s, %s' % (level, kind, value)
-        if kind == 'block':
-            if block is not None:
-                yield (level, block, field, valuesSoFar)
-            block = value
-            field = None
-            valuesSoFar = []
-        elif kind == 'field':
-            if block is None:
-                raise Error(u'block for field "%s" must be specified' % value)
-            yield (level, block, field, valuesSoFar)
-            field = value
-            valuesSoFar = []
-        elif kind == 'value':
-            valuesSoFar.append(value)
+
+class MappedFile(object):
+    '''
+    Readable for `messageItems`, `structuredItems` and `Report` that provides the raw bytes of
+    ``source`` without copying all of them into memory at once. ``source`` can be:
+
+    * the path of a file, which is memory mapped and unmapped again by `close()`
+    * an ``mmap.mmap``
+    * a ``memoryview`` or any other object supporting slicing
+
+    Example::
+
+        with MappedFile('statement.txt') as swiftFile:
+            report = Report(swiftFile)
+    '''
+    def __init__(self, source):
+        assert source is not None
+        self._file = None
+        if isinstance(source, _StringTypes):
+            self._file = open(source, 'rb')
+            try:
+                if os.fstat(self._file.fileno()).st_size == 0:
+                    # mmap cannot map empty files.
+                    self._buffer = b''
+                else:
+                    self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            except (EnvironmentError, ValueError):
+                self._file.close()
+                raise
         else:
-            assert False, u'kind=%r' % kind
-    # Yield the last item.
-    if valuesSoFar:
-        yield (level, block, field, valuesSoFar)
+            self._buffer = source
+        self._position = 0
+        self._size = len(self._buffer)
 
-class Trade(object):
-    '''A trade in a `Report`.'''
-    def __init__(self):
-        self.accrInterest = None
-        self.ca = None
-        self.ccpStatus = None
-        self.clearingMember = None
-        self.exchangeMember = None
-        self.leg = None
-        self.orderNettingType = None
-        self.orderNumber = None
-        self.originType = None
-        self.settlementDate = None
-        self.tradeDate = None
-        self.tradeLocation = None
-        self.tradeNumber = None
-        self.tradeSettlement = None
-        self.tradeType = None
-        self.transactionType = None
-        
-class Report(object):
-    def __init__(self, messageToRead):
-        assert messageToRead is not None
-        self.report = None
-        for item in structuredItems(messageToRead):
-            _log.debug(u'item: %s', item)
-            leveBlockField = item[:3]
-            if self.report is None:
-                if leveBlockField == (1, 4, '77E'):
-                    report = self._valueFor(item, '/TRNA')
-                    if self.report is None:
-                        self.report = report
-                        if self.report == u'RAWCE260':
-                            self._initCe260()
-                    else:
-                        raise Error(u'cannot set report to "%s" because it already is "%s"' % (report, self.report))
-            elif self.report == u'RAWCE260':
-                self._processCe260(item)
-            else:
-                raise Error(u'cannot (yet) read reports of type "%s"' % self.report)
+    def read(self, size=-1):
+        '''
+        Up to ``size`` bytes starting at the current position, or all remaining bytes if ``size`` is
+        negative.
+        '''
+        if size < 0:
+            endPosition = self._size
+        else:
+            endPosition = min(self._position + size, self._size)
+        result = self._buffer[self._position:endPosition]
+        if isinstance(result, memoryview):
+            result = result.tobytes()
+        self._position = endPosition
+        return result
 
-        if self.report == u'RAWCE260':
-            # Add possibly remaining trade.
-            self._appendPossibleTrade()
-            self._trade = None
-            if self.trades == []:
-                raise Error(u'report must contain at least 1 trade (starting with :94B::PRIC)')
+    def seek(self, offset):
+        assert offset >= 0
+        self._position = min(offset, self._size)
 
-    def _valueFor(self, item, valuePrefix, strip=True, required=True, defaultValue=None):
-        assert item is not None
-        assert valuePrefix
-        if required:
-            assert defaultValue is None
+    def tell(self):
+        return self._position
 
-        result = None
-        _, block, field, values = item
-        valueIndex = 0
-        valueCount = len(values)
-        while (result is None) and (valueIndex < valueCount):
-            value = values[valueIndex]
-            if value.startswith(valuePrefix):
-                result = value[len(valuePrefix):]
-                if strip:
-                    result = result.strip()
-            else:
-                valueIndex += 1
-        if result is None:
-            if required:
-                raise Error(u'block %d, field "%s" must contain %s but found only: %s' % (block, field, valuePrefix, values))
-            else:
-                result = defaultValue
+    def close(self):
+        if self._file is not None:
+            if isinstance(self._buffer, mmap.mmap):
+                self._buffer.close()
+            self._file.close()
+            self._file = None
+        self._buffer = b''
+        self._position = 0
+        self._size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exceptionType, exceptionValue, traceback):
+        self.close()
+
+
+class ParserCheckpoint(object):
+    '''
+    State of a `MessageParser` after it processed the first ``offset`` characters of its input, which
+    allows to resume parsing at ``offset`` later, possibly in another process. Checkpoints can be
+    pickled or stored in a file using `writeParserCheckpoint()`.
+    '''
+    def __init__(self, offset, state, level, text, fieldKey):
+        assert offset >= 0
+        assert state in _States, u'state=%r' % state
+        assert level >= 0
+        self.offset = offset
+        self.state = state
+        self.level = level
+        self.text = text
+        self.fieldKey = fieldKey
+
+    def __eq__(self, other):
+        return isinstance(other, ParserCheckpoint) and (
+            (self.offset, self.state, self.level, self.text, self.fieldKey) == (
+                other.offset, other.state, other.level, other.text, other.fieldKey))
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return 'ParserCheckpoint(%r, %r, %r, %r, %r)' % (
+            self.offset, self.state, self.level, self.text, self.fieldKey)
+
+
+def writeParserCheckpoint(path, checkpoint):
+    '''
+    Store ``checkpoint`` in the file at ``path``. The file is replaced only after the checkpoint has
+    been written completely so a process dying meanwhile leaves the previous checkpoint intact.
+    '''
+    assert path is not None
+    assert checkpoint is not None
+    _writeFileAtomically(path, pickle.dumps(checkpoint, 2))
+
+
+def _writeFileAtomically(path, data):
+    '''
+    Write ``data`` to a temporary file and rename it to ``path`` once it is complete.
+    '''
+    fileDescriptor, temporaryPath = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(path) or os.curdir)
+    try:
+        with os.fdopen(fileDescriptor, 'wb') as temporaryFile:
+            temporaryFile.write(data)
+        if os.name == 'nt' and os.path.exists(path):
+            # Windows cannot rename to an existing file.
+            os.remove(path)
+        os.rename(temporaryPath, path)
+    except EnvironmentError:
+        _removeIfExists(temporaryPath)
+        raise
+
+
+def readParserCheckpoint(path):
+    '''
+    The `ParserCheckpoint` stored in the file at ``path`` by `writeParserCheckpoint()` or ``None`` if
+    there is no such file.
+    '''
+    assert path is not None
+    result = None
+    if os.path.exists(path):
+        with open(path, 'rb') as checkpointFile:
+            result = pickle.load(checkpointFile)
+        if not isinstance(result, ParserCheckpoint):
+            raise Error(u'file must contain a parser checkpoint: %s' % path)
+    return result
+
+
+class MessageParser(object):
+    '''
+    Parser that finds the same items as `messageItems` in data passed to `feed()` in chunks of
+    arbitrary size. Instead of examining each character on its own, it searches for the next
+    delimiter and slices the text in between. The state of the parser is kept between calls, so the
+    caller decides where the data come from and when to process them.
+
+    If ``encoding`` is not ``None``, field names and values are decoded when they are found.
+
+    If ``checkpoint`` is not ``None``, parsing continues from a `ParserCheckpoint` obtained by
+    `checkpoint()`, and the data passed to `feed()` have to start at ``checkpoint.offset``.
+
+    Field names are shared using ``symbols``, which is a `SymbolTable` of the parser's own unless
+    specified otherwise.
+
+    If the C extension ``_swiftmess`` has been built, for example using
+    ``python3 setup.py build_ext --inplace``, `feed()` uses it to process the data. Otherwise it falls
+    back to an implementation in Python. Both find the same items and raise the same errors.
+
+    Example::
+
+        parser = MessageParser(checkpoint=readParserCheckpoint('statement.chk'))
+        with open('statement.txt', 'rb') as statementFile:
+            statementFile.seek(parser.offset)
+            data = statementFile.read(DefaultBufferSize)
+            while data:
+                parser.feed(data)
+                for item in parser.popItems():
+                    ...
+                writeParserCheckpoint('statement.chk', parser.checkpoint())
+                data = statementFile.read(DefaultBufferSize)
+        parser.close()
+    '''
+    def __init__(self, encoding=None, checkpoint=None, symbols=None):
+        self._encoding = encoding
+        self.symbols = symbols if symbols is not None else SymbolTable()
+        if checkpoint is None:
+            self.offset = 0
+            self._state = _BeforeStartOfBlock
+            self._level = 0
+            self._text = None
+            self._fieldKey = None
+        else:
+            self.offset = checkpoint.offset
+            # Use the actual state constant because `feed()` compares states by identity.
+            self._state = _States[_States.index(checkpoint.state)]
+            self._level = checkpoint.level
+            self._text = checkpoint.text
+            self._fieldKey = checkpoint.fieldKey
+        self._items = []
+
+    def checkpoint(self):
+        '''
+        A `ParserCheckpoint` describing the current state. All items found so far must have been
+        obtained by `popItems()` because they are not part of the checkpoint.
+        '''
+        assert not self._items, u'items must be popped before creating a checkpoint'
+        return ParserCheckpoint(self.offset, self._state, self._level, self._text, self._fieldKey)
+
+    def popItems(self):
+        '''
+        Items found since the previous call.
+        '''
+        result = self._items
+        self._items = []
         return result
 
-    def _slashedNameValue(self, item):
-        assert item is not None
-        _, block, field, values = item
-        if len(values) != 1:
-            raise Error(u'value in block "%s", field "%s" must fit into one line but is: %r' % (block, field, values))
-        # TODO: compile regex.
-        finding = re.match(r'[:](?P<name>.+)//(?P<value>.*)', values[0])
-        if finding is None:
-            raise Error(u'value in block "%s", field "%s" must contain text matching ":<NAME>//<VALUE>" but is: %r' % (block, field, values))
-        name = finding.group('name')
-        value = finding.group('value')
-        return (name, value)
+    def feed(self, data):
+        '''
+        Process ``data`` and remember the items found in it for `popItems()`.
+        '''
+        assert data is not None
+        self.offset += len(data)
+        data = _textOf(data)
+        if '\r' in data:
+            data = data.replace('\r', '')
+        if _swiftmess is not None:
+            self._compiledFeed(data)
+        else:
+            self._pythonFeed(data)
 
-    def _dateFromIsoText(self, item, name, text):
-        assert item is not None
-        assert text is not None
+    def _compiledFeed(self, data):
+        stateIndex, self._level, self._text, self._fieldKey, errorKind, errorChar = _swiftmess.feed(
+            data, _States.index(self._state), self._level, self._text, self._fieldKey, self._items,
+            self.symbols.intern, self._encoding)
+        self._state = _States[stateIndex]
+        if isinstance(errorKind, BaseException):
+            raise errorKind
+        if errorKind is not None:
+            raise _parserError(errorKind, self._state, self._level, errorChar)
 
-        _, block, field, _ = item
+    def _pythonFeed(self, data):
+        appendItem = self._items.append
+        internSymbol = self.symbols.intern
+        encoding = self._encoding
+        state = self._state
+        level = self._level
+        text = self._text
+        fieldKey = self._fieldKey
+        dataLength = len(data)
+        index = 0
         try:
-            textAsTime = datetime.strptime(text, '%Y%m%d')
-        except ValueError, error:
-            message = u'cannot convert "%s" in block "%s", field "%s"' % (text, block, field)
-            if name is not None:
-                message += u', item "%s"' % name
-            message += u' to date: %s' % error
-            raise Error(message)
-        result = date(textAsTime.year, textAsTime.month, textAsTime.day)
-        return result
+            while index < dataLength:
+                if (state is _InFieldValue) or (state is _InValue):
+                    valueEnd = _ValueEndRegex.search(data, index)
+                    if valueEnd is None:
+                        text += data[index:]
+                        index = dataLength
+                    else:
+                        endIndex = valueEnd.start()
+                        if state is _InFieldValue:
+                            if encoding is not None:
+                                fieldKey = _decoded(fieldKey, encoding)
+                            appendItem((level, 'field', internSymbol(fieldKey)))
+                            fieldKey = None
+                        text += data[index:endIndex]
+                        if encoding is not None:
+                            text = _decoded(text, encoding)
+                        appendItem((level, 'value', text))
+                        text = None
+                        if data[endIndex] == '}':
+                            state = _BeforeStartOfBlock
+                            level -= 1
+                            assert level >= 0
+                        else:
+                            state = _InLine
+                        index = endIndex + 1
+                elif state is _InLine:
+                    char = data[index]
+                    if char == ':':
+                        state = _InFieldKey
+                        text = ''
+                    elif char == '{':
+                        state = _InBlockKey
+                        level += 1
+                        text = ''
+                    elif char == '}':
+                        state = _BeforeStartOfBlock
+                        level -= 1
+                        assert level >= 0
+                    elif char == '\n':
+                        if encoding is None:
+                            appendItem((level, 'value', ''))
+                        else:
+                            appendItem((level, 'value', u''))
+                    else:
+                        # Keep the current character as start of the value.
+                        state = _InValue
+                        text = ''
+                        index -= 1
+                    index += 1
+                elif state is _InFieldKey:
+                    keyEndIndex = data.find(':', index)
+                    if keyEndIndex < 0:
+                        text += data[index:]
+                        index = dataLength
+                    else:
+                        state = _InFieldValue
+                        fieldKey = text + data[index:keyEndIndex]
+                        text = ''
+                        index = keyEndIndex + 1
+                elif state is _BeforeStartOfBlock:
+                    char = data[index]
+                    if char == '{':
+                        state = _InBlockKey
+                        level += 1
+                        text = ''
+                    elif char == '}':
+                        if level == 0:
+                            raise _parserError('unmatched', state, level, char)
+                        level -= 1
+                    elif char == '\n':
+                        if level != 0:
+                            raise _parserError('nested', state, level, char)
+                        appendItem((level, 'message', None))
+                    else:
+                        raise _parserError('blockStart', state, level, char)
+                    index += 1
+                else:
+                    assert state is _InBlockKey, u'state=%r' % state
+                    keyEndIndex = data.find(':', index)
+                    if keyEndIndex < 0:
+                        keyEndIndex = dataLength
+                    digits = data[index:keyEndIndex]
+                    if (digits != '') and not digits.isdigit():
+                        for char in digits:
+                            if not char.isdigit():
+                                raise _parserError('blockId', state, level, char)
+                    text += digits
+                    if keyEndIndex < dataLength:
+                        state = _InLine
+                        appendItem((level, 'block', _long(text)))
+                        text = None
+                    index = keyEndIndex + 1
+        finally:
+            self._state = state
+            self._level = level
+            self._text = text
+            self._fieldKey = fieldKey
 
-    def _decimalFrom(self, item, name, value):
+    def close(self):
         '''
-        A ``decimal.Decimal`` from ``value`` properly handling all kinds of separators.
+        Check that all data passed to `feed()` form complete messages.
+        '''
+        if self._state != _BeforeStartOfBlock:
+            raise Error(u'block must be closed (state=%r)' % self._state)
+        if self._level != 0:
+            raise Error(u'nested block must be closed (state=%r, level=%d)' % (self._state, self._level))
 
-        Examples:
 
-        * _decimalFrom(..., '1') --> 1
-        * _decimalFrom(..., '123.45') --> 123.45
-        * _decimalFrom(..., '123,45') --> 123.45
-        * _decimalFrom(..., '123456.78') --> 123456.78
-        * _decimalFrom(..., '123,456.78') --> 123456.78
-        * _decimalFrom(..., '123.456,78') --> 123456.78
+def _parserError(kind, state, level, char):
+    '''
+    `Error` of ``kind`` found by `MessageParser` at ``char`` in ``state`` and nesting ``level``.
+    '''
+    if kind == 'unmatched':
+        message = 'unmatched %r outside of any block must be removed' % char
+    elif kind == 'nested':
+        message = u'nested block must be closed (state=%r, level=%d)' % (state, level)
+    elif kind == 'blockStart':
+        message = 'block must start with %r instead of %r' % ('{', char)
+    else:
+        assert kind == 'blockId', u'kind=%r' % kind
+        message = 'block id must consist of decimal digits bug encountered %r' % char
+    return Error(message)
+
+
+_BraceRegex = re.compile(r'[{}]')
+
+
+def _nextMessageStart(buffer, position):
+    '''
+    Offset in ``buffer`` where `messageItems` continues after the message starting at ``position``
+    in case that message is broken, or ``None`` if ``buffer`` does not contain such an offset yet.
+    This is the next line starting with ``{`` at brace level 0 or, to recover from unclosed blocks,
+    the next line starting with ``{1:`` at any brace level.
+    '''
+    level = 0
+    for brace in _BraceRegex.finditer(buffer, position):
+        index = brace.start()
+        if buffer[index] == '{':
+            if (index > position) and (buffer[index - 1] == '\n') \
+                    and ((level == 0) or buffer.startswith('{1:', index)):
+                return index
+            level += 1
+        elif level > 0:
+            level -= 1
+    return None
+
+
+class QuarantinedMessage(object):
+    '''
+    Location of a message that could not be parsed and the error it caused.
+    '''
+    def __init__(self, start, end, error):
+        assert start >= 0
+        assert end >= start
+        assert error is not None
+        self.start = start
+        self.end = end
+        self.error = error
+
+    def __eq__(self, other):
+        return isinstance(other, QuarantinedMessage) \
+            and ((self.start, self.end, self.error) == (other.start, other.end, other.error))
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return 'QuarantinedMessage(%r, %r, %r)' % (self.start, self.end, self.error)
+
+
+class Quarantine(object):
+    '''
+    Collection of the `QuarantinedMessage` found by `messageItems` and `structuredItems`.
+    '''
+    def __init__(self):
+        self.entries = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, index):
+        return self.entries[index]
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def write(self, quarantineFile):
         '''
-        assert item is not None
-        assert value is not None
+        Write the entries to ``quarantineFile`` with one line of tab separated start, end and error
+        message for each entry.
+        '''
+        assert quarantineFile is not None
+        for entry in self.entries:
+            errorText = ' '.join(entry.error.split())
+            quarantineFile.write(_dataFor(quarantineFile, '%d\t%d\t%s\n' % (entry.start, entry.end, errorText)))
 
-        isGermanNumeric = False
-        firstCommaIndex = value.find(',')
-        if firstCommaIndex >= 0:
-            firstDotIndex = value.find('.')
-            if firstCommaIndex > firstDotIndex:
-                isGermanNumeric = True
-        if isGermanNumeric:
-            unifiedValue = value.replace('.', '').replace(',', '.')
-        else:
-            unifiedValue = value.replace(',', '')
-        try:
-            result = decimal.Decimal(unifiedValue)
-        except Exception, error:
-            _, block, field, _ = item
-            message = u'cannot convert "%s" in block "%s", field "%s"' % (value, block, field)
-            if name is not None:
-                message += u', item "%s"' % name
-            message += u' to decimal: %s' % error
-            raise Error(message)
 
-        return result
+class ParseStats(object):
+    '''
+    Counters and timings collected while parsing if passed as ``stats`` to `messageItems`,
+    `structuredItems`, `Report` or `ReportReader`:
 
-    def _currencyAndAmountFrom(self, item, name, value):
+    * bytesRead: number of characters read from the input
+    * messageCount: number of messages containing at least one block
+    * blockCount: number of blocks, including nested ones
+    * fieldCounts: map of each field tag, for example '98A', to the number of its occurrences
+    * tradeCounts: map of each report type to the number of trades read for it
+    * errorCount: number of errors, including messages added to a `Quarantine`
+    * tokenizeSeconds: time spent finding items in the input
+    * convertSeconds: time spent processing items for a report, for example converting field values
+
+    If ``callback`` is not ``None``, it is called with the stats as argument after each part of the
+    input has been tokenized and once a report has been read completely. This allows to pass the
+    current values to a monitoring system while reading large inputs.
+
+    Without stats no counting or timing takes place, so reading is as fast as before.
+    '''
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.bytesRead = 0
+        self.messageCount = 0
+        self.blockCount = 0
+        self.fieldCounts = {}
+        self.tradeCounts = {}
+        self.errorCount = 0
+        self.tokenizeSeconds = 0.0
+        self.convertSeconds = 0.0
+        self._hasBlocks = False
+
+    @property
+    def fieldCount(self):
         '''
-        tuple with currency (as ISO code) and amount extracted from ``value``.
+        Total number of fields.
+        '''
+        return sum(self.fieldCounts.values())
 
-        Example: 'EUR123,45' --> (u'EUR', 123.45)
+    def asDict(self):
         '''
-        assert item is not None
-        assert value is not None
+        Dictionary with the counters and timings, for example to pass them to a monitoring system.
+        '''
+        return dict(
+            bytesRead=self.bytesRead, messageCount=self.messageCount, blockCount=self.blockCount,
+            fieldCounts=dict(self.fieldCounts), tradeCounts=dict(self.tradeCounts), errorCount=self.errorCount,
+            tokenizeSeconds=self.tokenizeSeconds, convertSeconds=self.convertSeconds)
 
-        def errorMessage(details):
-            _, block, field, _ = item
-            result = u'cannot convert "%s" in block "%s", field "%s"' % (value, block, field)
-            if name is not None:
-                result += u', item "%s"' % name
-            result += u' to currency and amount: %s' % details
-            return result
+    def _addTokenized(self, byteCount, items, seconds):
+        self.bytesRead += byteCount
+        self.tokenizeSeconds += seconds
+        fieldCounts = self.fieldCounts
+        for _, kind, value in items:
+            if kind == 'field':
+                fieldCounts[value] = fieldCounts.get(value, 0) + 1
+            elif kind == 'block':
+                self.blockCount += 1
+                self._hasBlocks = True
+            elif kind == 'message':
+                if self._hasBlocks:
+                    self.messageCount += 1
+                    self._hasBlocks = False
 
-        if len(value) < 4:
-            raise Error(errorMessage(u'value must have at least 4 characters'))
-        currency = value[:3]
-        try:
-            amount = self._decimalFrom(item, name, value[3:])
-        except Exception, error:
-            raise Error(errorMessage(error))
-        return (currency, amount)
+    def _addEndOfInput(self):
+        # Count the last message even if it lacks the trailing newline that yields its 'message' item.
+        if self._hasBlocks:
+            self.messageCount += 1
+            self._hasBlocks = False
 
-    def _initCe260(self):
-        self.financialInstrument = None
-        self.safekeepingAccount = None
-        self.trades = []
-        self._trade = None
+    def _addTrades(self, report, tradeCount):
+        self.tradeCounts[report] = self.tradeCounts.get(report, 0) + tradeCount
 
-    def _checkHasTrade(self, field, name=None):
-        if self._trade is None:
-            message = u'trade must start with 94B::PRIC before details can be specified with '
-            if name is None:
-                message += field
-            else:
-                message += field + '::' + name
-            raise Error(message)
+    def _notify(self):
+        if self.callback is not None:
+            self.callback(self)
 
-    def _appendPossibleTrade(self):
-        if self._trade is not None:
-            self.trades.append(self._trade)
-
-    def _processCe260(self, item):
-        def createTransactionDetailsNameToValueMap(item):
-            level, block, field, values = item
-            assert level == 1
-            assert block == 4
-            assert field == '70E'
-            assert values
-
-            result = {}
-            TrDeHeader = ':TRDE//'
-            if values[0].startswith(TrDeHeader):
-                transactionDetails = [values[0][len(TrDeHeader):]]
-                transactionDetails.extend(values[1:])
-                detailsText = u' '.join(transactionDetails)
-                for detail in detailsText.split(u'/'):
-                    detail = detail.rstrip()
-                    if detail != '':
-                        indexOfFirstSpace = detail.find(' ')
-                        if indexOfFirstSpace >= 0:
-                            name = detail[:indexOfFirstSpace]
-                            value = detail[indexOfFirstSpace + 1:].lstrip()
-                        else:
-                            name = detail
-                            value = None
-                        if name in result:
-                            raise Error(u'duplicate transaction detail "%s" must be removed: %s' % (name, transactionDetails))
-                        result[name] = value
+
+def _processMeasured(report, item, stats):
+    '''
+    Same as ``report._process(item)`` but add the time it took and possible errors to ``stats``.
+    '''
+    startTime = _timer()
+    try:
+        report._process(item)
+    except Error:
+        stats.errorCount += 1
+        raise
+    finally:
+        stats.convertSeconds += _timer() - startTime
+
+
+def _quarantiningMessageItems(readable, bufferSize, encoding, quarantine, stats, symbols):
+    '''
+    Same as `messageItems` but instead of raising an `Error` for a broken message, add it to
+    ``quarantine`` and continue with the next message.
+    '''
+    if symbols is None:
+        symbols = SymbolTable()
+    buffer = _textOf(readable.read(bufferSize))
+    bufferOffset = 0
+    position = 0
+    isEndOfInput = not buffer
+    while position < len(buffer):
+        nextStart = _nextMessageStart(buffer, position)
+        if (nextStart is None) and not isEndOfInput:
+            data = _textOf(readable.read(max(bufferSize, len(buffer) - position)))
+            if data:
+                buffer = buffer[position:] + data
+                bufferOffset += position
+                position = 0
             else:
-                raise Error(u'transaction details in field "%s" must start with "%s" but are: %s' % (field, TrDeHeader, values))
-            return result
+                isEndOfInput = True
+        else:
+            end = nextStart if nextStart is not None else len(buffer)
+            # Every message gets a parser of its own so a broken message cannot affect the next one.
+            parser = MessageParser(encoding, symbols=symbols)
+            if stats is not None:
+                startTime = _timer()
+            try:
+                parser.feed(buffer[position:end])
+                parser.close()
+            except Error as error:
+                start = bufferOffset + position
+                quarantine.entries.append(QuarantinedMessage(start, bufferOffset + end, _Text(error)))
+                _log.warning(u'quarantined message at %d: %s', start, error)
+                if stats is not None:
+                    stats._addTokenized(end - position, [], _timer() - startTime)
+                    stats.errorCount += 1
+            else:
+                items = parser.popItems()
+                if stats is not None:
+                    stats._addTokenized(end - position, items, _timer() - startTime)
+                for item in items:
+                    yield item
+            position = end
+        if stats is not None:
+            stats._notify()
+    if stats is not None:
+        stats._addEndOfInput()
+
+
+def structuredItems(messageToRead, quarantine=None, stats=None, symbols=None):
+    '''
+    Tuples ``(level, block, field, values)`` for the fields in ``messageToRead`` with the values of
+    each field collected from the items yielded by `messageItems`, which also describes the
+    remaining arguments.
+
+    The line '-' ending block 4 is not part of the values of its last field. A field whose first
+    value is '-', for example in "{4:\n:20:-}", keeps it.
+    '''
+    assert messageToRead is not None
+    structurer = _ItemStructurer()
+    items = messageItems(messageToRead, quarantine=quarantine, stats=stats, symbols=symbols)
+    for item in structurer.structure(items):
+        yield item
+    for item in structurer.close():
+        yield item
+
+
+# Line ending block 4 of a message.
+_MessageEndLine = '-'
+
+
+def _withoutMessageEnd(block, values):
+    '''
+    ``values`` of the last field in ``block`` without the line ending block 4, which is not a value
+    of the field. The first value is always kept because it is on the same line as the field tag.
+    '''
+    if (block == 4) and (len(values) >= 2) and (values[-1] == _MessageEndLine):
+        values = values[:-1]
+    return values
+
+
+class _ItemStructurer(object):
+    '''
+    Combine items as yielded by `messageItems` into tuples of the form ``(level, block, field, values)``
+    as yielded by `structuredItems`. The items can be passed in several parts by calling `structure()`
+    repeatedly, which allows to process data as it arrives.
+
+    The line '-' ending block 4 is removed from the values of its last field.
+    '''
+    def __init__(self):
+        self._level = None
+        self._block = None
+        self._field = None
+        self._valuesSoFar = []
+
+    def structure(self, items):
+        '''
+        Structured items for ``items``. The last field is kept until the next field or block starts or
+        `close()` is called because further values might still be added to it.
+        '''
+        level = self._level
+        block = self._block
+        field = self._field
+        valuesSoFar = self._valuesSoFar
+        try:
+            for itemLevel, kind, value in items:
+                if kind == 'message':
+                    # Ignore message boundaries so the last field of a message is yielded with the level
+                    # of its block just like it would if the messages were not separated by newlines.
+                    continue
+                isBlockEnd = (level is not None) and (itemLevel <= level)
+                level = itemLevel
+                if kind == 'block':
+                    if block is not None:
+                        if isBlockEnd:
+                            valuesSoFar = _withoutMessageEnd(block, valuesSoFar)
+                        yield (level, block, field, valuesSoFar)
+                    block = value
+                    field = None
+                    valuesSoFar = []
+                elif kind == 'field':
+                    if block is None:
+                        raise Error(u'block for field "%s" must be specified' % value)
+                    yield (level, block, field, valuesSoFar)
+                    field = value
+                    valuesSoFar = []
+                elif kind == 'value':
+                    valuesSoFar.append(value)
+                else:
+                    assert False, u'kind=%r' % kind
+        finally:
+            self._level = level
+            self._block = block
+            self._field = field
+            self._valuesSoFar = valuesSoFar
+
+    def close(self):
+        '''
+        The last structured item, if any.
+        '''
+        result = []
+        if self._valuesSoFar:
+            result.append((self._level, self._block, self._field, _withoutMessageEnd(self._block, self._valuesSoFar)))
+            self._valuesSoFar = []
+        return result
+
+
+#: Suffix of index files stored next to the file they describe.
+IndexSuffix = '.idx'
+
+_IndexHeader = 'swiftmess-index'
+_IndexFormatVersion = 1
+_TrnaMarker = '/TRNA'
+
+
+class MessageIndexEntry(object):
+    '''
+    Location and key data of a message in a file described by a `MessageIndex`.
+    '''
+    def __init__(self, start, end, reference=None, reportType=None):
+        assert start >= 0
+        assert end >= start
+        self.start = start
+        self.end = end
+        self.reference = reference
+        self.reportType = reportType
+
+    def __eq__(self, other):
+        return isinstance(other, MessageIndexEntry) and (
+            (self.start, self.end, self.reference, self.reportType) == (
+                other.start, other.end, other.reference, other.reportType))
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return 'MessageIndexEntry(%d, %d, %r, %r)' % (self.start, self.end, self.reference, self.reportType)
+
+
+class MessageIndex(object):
+    '''
+    Byte offsets of the messages in a file together with the reference from block 4, field
+    "20" and the report type from field "77E", item "/TRNA". This allows to process only
+    selected messages without tokenizing everything before them.
+
+    Example::
+
+        index = messageIndexFor('statement.txt')
+        with MappedFile('statement.txt') as swiftFile:
+            report = Report(SelectedMessages(swiftFile, index.entriesForReportType('RAWCE260')))
+    '''
+    def __init__(self, entries=None):
+        if entries is None:
+            self.entries = []
+        else:
+            self.entries = list(entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, number):
+        return self.entries[number]
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def entriesForReportType(self, reportType):
+        '''
+        Entries for all messages with report type ``reportType``.
+        '''
+        return [entry for entry in self.entries if entry.reportType == reportType]
+
+    def entriesForReference(self, reference):
+        '''
+        Entries for all messages with reference ``reference``.
+        '''
+        return [entry for entry in self.entries if entry.reference == reference]
+
+    def write(self, indexFile, sourceSize=None, sourceModified=None):
+        '''
+        Write the index to ``indexFile``, optionally noting the size and modification time of the
+        file described so `readMessageIndex()` can detect outdated indices.
+        '''
+        assert indexFile is not None
+        indexFile.write(_dataFor(indexFile, '%s\t%d\t%s\t%s\n' % (
+            _IndexHeader, _IndexFormatVersion, _textOrEmpty(sourceSize), _textOrEmpty(sourceModified))))
+        for entry in self.entries:
+            indexFile.write(_dataFor(indexFile, '%d\t%d\t%s\t%s\n' % (
+                entry.start, entry.end, _textOrEmpty(entry.reference), _textOrEmpty(entry.reportType))))
+
+
+def _textOrEmpty(value):
+    if value is None:
+        result = ''
+    else:
+        result = str(value)
+    return result
+
+
+def _noneIfEmpty(text):
+    if text == '':
+        result = None
+    else:
+        result = text
+    return result
+
+
+def buildMessageIndex(readable, bufferSize=DefaultBufferSize):
+    '''
+    `MessageIndex` for the messages in ``readable``, which has to be opened in binary mode so the
+    offsets match bytes.
+    '''
+    assert readable is not None
+    assert bufferSize > 0
+    return MessageIndex(_messageIndexEntries(readable, bufferSize))
+
+
+def _messageIndexEntries(readable, bufferSize):
+    '''
+    `MessageIndexEntry` for each message in ``readable`` as soon as its end is found.
+    '''
+    parser = MessageParser()
+    offset = 0
+    messageStart = 0
+    hasBlocks = False
+    reference = None
+    reportType = None
+    block = None
+    field = None
+    data = _textOf(readable.read(bufferSize))
+    while data:
+        dataLength = len(data)
+        lineStart = 0
+        while lineStart < dataLength:
+            # Feed line by line because a message can only end with a newline.
+            lineEnd = data.find('\n', lineStart)
+            if lineEnd < 0:
+                lineEnd = dataLength
+            else:
+                lineEnd += 1
+            parser.feed(data[lineStart:lineEnd])
+            offset += lineEnd - lineStart
+            lineStart = lineEnd
+            for _, kind, value in parser.popItems():
+                if kind == 'value':
+                    if block == 4:
+                        if (field == '20') and (reference is None):
+                            reference = value
+                        elif (field == '77E') and (reportType is None) and value.startswith(_TrnaMarker):
+                            reportType = value[len(_TrnaMarker):].strip()
+                elif kind == 'field':
+                    field = value
+                elif kind == 'block':
+                    block = value
+                    field = None
+                    hasBlocks = True
+                else:
+                    assert kind == 'message', u'kind=%r' % kind
+                    if hasBlocks:
+                        yield MessageIndexEntry(messageStart, offset, reference, reportType)
+                    messageStart = offset
+                    hasBlocks = False
+                    reference = None
+                    reportType = None
+                    block = None
+                    field = None
+        data = _textOf(readable.read(bufferSize))
+    parser.close()
+    if hasBlocks:
+        # Yield last message without trailing newline.
+        yield MessageIndexEntry(messageStart, offset, reference, reportType)
+
+
+def readMessageIndex(indexFile, sourceSize=None, sourceModified=None):
+    '''
+    `MessageIndex` stored in ``indexFile`` by `MessageIndex.write()`. If ``sourceSize`` or
+    ``sourceModified`` are specified and differ from the values stored in the index, the
+    index is outdated and the result is ``None``.
+    '''
+    assert indexFile is not None
+    headerLine = _textOf(indexFile.readline())
+    header = headerLine.rstrip('\n').split('\t')
+    if (len(header) != 4) or (header[0] != _IndexHeader):
+        raise Error(u'index must start with header "%s" but first line is: %r' % (_IndexHeader, headerLine))
+    if header[1] != str(_IndexFormatVersion):
+        raise Error(u'index format must be %d but is: %s' % (_IndexFormatVersion, header[1]))
+    isOutdated = ((sourceSize is not None) and (header[2] != str(sourceSize))) \
+        or ((sourceModified is not None) and (header[3] != str(sourceModified)))
+    if isOutdated:
+        result = None
+    else:
+        result = MessageIndex()
+        for lineNumber, line in enumerate(indexFile, 2):
+            line = _textOf(line)
+            columns = line.rstrip('\n').split('\t')
+            if len(columns) != 4:
+                raise Error(u'line %d of index must have 4 columns but has %d: %r' % (lineNumber, len(columns), line))
+            try:
+                start = int(columns[0])
+                end = int(columns[1])
+            except ValueError as error:
+                raise Error(u'line %d of index must start with 2 offsets: %s' % (lineNumber, error))
+            result.entries.append(MessageIndexEntry(start, end, _noneIfEmpty(columns[2]), _noneIfEmpty(columns[3])))
+    return result
+
+
+def messageIndexFor(path, rebuild=False):
+    '''
+    `MessageIndex` for the file at ``path``. If possible, the index is read from the index file
+    ``path + IndexSuffix``. Otherwise, or if ``rebuild`` is ``True``, the index is built and written
+    to the index file.
+    '''
+    assert path is not None
+    sourceStat = os.stat(path)
+    sourceSize = sourceStat.st_size
+    sourceModified = _modifiedNanoseconds(sourceStat)
+    indexPath = path + IndexSuffix
+    result = None
+    if not rebuild and os.path.exists(indexPath):
+        with open(indexPath, 'rb') as indexFile:
+            result = readMessageIndex(indexFile, sourceSize, sourceModified)
+    if result is None:
+        with MappedFile(path) as swiftFile:
+            result = buildMessageIndex(swiftFile)
+        indexFile = io.BytesIO()
+        result.write(indexFile, sourceSize, sourceModified)
+        _writeFileAtomically(indexPath, indexFile.getvalue())
+    return result
+
+
+def _modifiedNanoseconds(status):
+    '''
+    Modification time of the file described by the ``os.stat()`` result ``status`` in nanoseconds.
+    '''
+    result = getattr(status, 'st_mtime_ns', None)
+    if result is None:
+        # Python 2 only provides the modification time as float.
+        result = int(round(status.st_mtime * 1000000000))
+    return result
+
+
+class SelectedMessages(object):
+    '''
+    Readable for `messageItems`, `structuredItems` and `Report` that provides only the messages
+    described by ``entries`` from ``readable``, which has to support ``seek()``.
+    '''
+    def __init__(self, readable, entries):
+        assert readable is not None
+        assert entries is not None
+        self._readable = readable
+        self._entries = list(entries)
+        self._entryIndex = 0
+        self._remaining = 0
+
+    def read(self, size=-1):
+        if size < 0:
+            parts = []
+            part = self._readPart(-1)
+            while part:
+                parts.append(part)
+                part = self._readPart(-1)
+            result = parts[0][:0].join(parts) if parts else b''
+        else:
+            result = self._readPart(size)
+        return result
+
+    def _readPart(self, size):
+        # Skip to the next entry with data.
+        while (self._remaining == 0) and (self._entryIndex < len(self._entries)):
+            entry = self._entries[self._entryIndex]
+            self._entryIndex += 1
+            self._readable.seek(entry.start)
+            self._remaining = entry.end - entry.start
+        if (size < 0) or (size > self._remaining):
+            sizeToRead = self._remaining
+        else:
+            sizeToRead = size
+        if sizeToRead > 0:
+            result = self._readable.read(sizeToRead)
+            if len(result) < sizeToRead:
+                raise Error(u'message must fit into file but %d bytes at offset %d are missing' % (
+                    sizeToRead - len(result), self._readable.tell()))
+            self._remaining -= sizeToRead
+        else:
+            result = b''
+        return result
+
+
+class BasicHeader(object):
+    '''
+    Fields of block 1 of a message, for example ``'F01BANKBEBBAXXX2222123456'``.
+    '''
+    def __init__(self, text):
+        assert text is not None
+        if len(text) < 25:
+            raise Error(u'basic header must have at least 25 characters: %r' % text)
+        self.applicationId = text[0]
+        self.serviceId = text[1:3]
+        self.logicalTerminal = text[3:15]
+        self.sessionNumber = text[15:19]
+        self.sequenceNumber = text[19:25]
+
+
+class ApplicationHeader(object):
+    '''
+    Fields of block 2 of a message, for example ``'O5981519051128BANKBEBBAXXX22221234560511281520N'``
+    for an output message or ``'I598BANKDEFFXXXXN'`` for an input message. Fields that do not apply to
+    the direction of the message or are not specified are ``None``.
+    '''
+    def __init__(self, text):
+        assert text is not None
+        self.direction = text[:1]
+        if self.direction == 'O':
+            if len(text) < 46:
+                raise Error(u'application header of output message must have at least 46 characters: %r' % text)
+            self.inputTime = text[4:8]
+            self.messageInputReference = text[8:36]
+            self.senderAddress = text[14:26]
+            self.receiverAddress = None
+            self.outputDate = text[36:42]
+            self.outputTime = text[42:46]
+            self.priority = _noneIfEmpty(text[46:47])
+        elif self.direction == 'I':
+            if len(text) < 16:
+                raise Error(u'application header of input message must have at least 16 characters: %r' % text)
+            self.inputTime = None
+            self.messageInputReference = None
+            self.senderAddress = None
+            self.receiverAddress = text[4:16]
+            self.outputDate = None
+            self.outputTime = None
+            self.priority = _noneIfEmpty(text[16:17])
+        else:
+            raise Error(u'application header must start with "I" or "O": %r' % text)
+        self.messageType = text[1:4]
+
+
+class LazyMessage(object):
+    '''
+    Message found by `lazyMessages` with decoded headers. The body in block 4 is kept as text and only
+    parsed when `bodyItems()` is called.
+
+    * start, end: offsets of the message in the input
+    * basicHeader: `BasicHeader` from block 1 or ``None``
+    * applicationHeader: `ApplicationHeader` from block 2 or ``None``
+    * userHeader: map of the tags in block 3 to their value, for example ``{108: 'MUR'}``
+    * body: text of block 4 or ``None`` if the message has no block 4
+    * trailer: text after block 4, for example block 5
+    '''
+    def __init__(self, start, end, basicHeader, applicationHeader, userHeader, body, trailer):
+        assert start >= 0
+        assert end >= start
+        assert userHeader is not None
+        self.start = start
+        self.end = end
+        self.basicHeader = basicHeader
+        self.applicationHeader = applicationHeader
+        self.userHeader = userHeader
+        self.body = body
+        self.trailer = trailer
+        self._reportType = None
+        self._hasReportType = False
+
+    @property
+    def messageType(self):
+        '''
+        The message type from block 2, for example ``'598'``.
+        '''
+        return self.applicationHeader.messageType if self.applicationHeader is not None else None
+
+    @property
+    def sender(self):
+        '''
+        The logical terminal address of the sender.
+        '''
+        result = None
+        if self.applicationHeader is not None:
+            if self.applicationHeader.direction == 'O':
+                result = self.applicationHeader.senderAddress
+            elif self.basicHeader is not None:
+                result = self.basicHeader.logicalTerminal
+        return result
+
+    @property
+    def receiver(self):
+        '''
+        The logical terminal address of the receiver.
+        '''
+        result = None
+        if self.applicationHeader is not None:
+            if self.applicationHeader.direction == 'I':
+                result = self.applicationHeader.receiverAddress
+            elif self.basicHeader is not None:
+                result = self.basicHeader.logicalTerminal
+        return result
+
+    @property
+    def messageUserReference(self):
+        '''
+        The message user reference (MUR) from tag 108 in block 3.
+        '''
+        return self.userHeader.get(108)
+
+    @property
+    def reportType(self):
+        '''
+        The report type specified by field 77E, item /TRNA or ``None``. The body is only searched for the
+        field instead of being parsed.
+        '''
+        if not self._hasReportType:
+            self._reportType = _lazyReportType(self.body)
+            self._hasReportType = True
+        return self._reportType
+
+    def bodyItems(self, symbols=None):
+        '''
+        Items of block 4 as yielded by `structuredItems`. If ``symbols`` is a `SymbolTable`, the
+        values are interned using it.
+        '''
+        result = []
+        if self.body is not None:
+            parser = MessageParser(symbols=symbols)
+            parser.feed('{4:')
+            parser.feed(self.body)
+            parser.feed('}')
+            parser.close()
+            structurer = _ItemStructurer()
+            result.extend(structurer.structure(parser.popItems()))
+            result.extend(structurer.close())
+        return result
+
+
+def _lazyReportType(body):
+    result = None
+    if body is not None:
+        fieldStart = body.find('\n:77E:')
+        if fieldStart >= 0:
+            fieldEnd = body.find('\n:', fieldStart + 1)
+            if fieldEnd < 0:
+                fieldEnd = len(body)
+            for line in body[fieldStart + len('\n:77E:'):fieldEnd].split('\n'):
+                if line.startswith(_TrnaMarker):
+                    result = line[len(_TrnaMarker):].strip()
+                    break
+    return result
+
+
+def _lazyMessageBounds(buffer, position, isEndOfInput):
+    '''
+    Tuple ``(bodyStart, bodyEnd, end)`` with the offsets of block 4 and the end of the message starting
+    at ``position`` in ``buffer``, or ``None`` if more input is needed to find them. If the message has
+    no block 4, ``bodyStart`` and ``bodyEnd`` are ``None``.
+    '''
+    bufferLength = len(buffer)
+    messageEnd = _MessageEndRegex.search(buffer, position)
+    if messageEnd is None:
+        blockStart = buffer.find('{4:', position)
+    else:
+        blockStart = buffer.find('{4:', position, messageEnd.start())
+    if blockStart >= 0:
+        bodyStart = blockStart + 3
+        # Values end with "}", so the body cannot contain it.
+        bodyEnd = buffer.find('}', bodyStart)
+        if bodyEnd < 0:
+            if isEndOfInput:
+                raise Error(u'block 4 must be closed')
+            return None
+        messageEnd = _MessageEndRegex.search(buffer, bodyEnd)
+    else:
+        bodyStart = None
+        bodyEnd = None
+    if messageEnd is not None:
+        end = messageEnd.end()
+    elif isEndOfInput:
+        end = bufferLength
+    else:
+        return None
+    return (bodyStart, bodyEnd, end)
+
+
+def _lazyMessageHeaders(headerText):
+    '''
+    Tuple ``(basicHeader, applicationHeader, userHeader)`` for the blocks in ``headerText``.
+    '''
+    basicHeader = None
+    applicationHeader = None
+    userHeader = {}
+    parser = MessageParser()
+    parser.feed(headerText)
+    parser.close()
+    block = None
+    tag = None
+    for level, kind, value in parser.popItems():
+        if kind == 'block':
+            if level == 1:
+                block = value
+                tag = None
+            elif block == 3:
+                tag = value
+                userHeader[tag] = ''
+        elif kind == 'value':
+            if level == 1:
+                if block == 1:
+                    basicHeader = BasicHeader(value)
+                elif block == 2:
+                    applicationHeader = ApplicationHeader(value)
+            elif tag is not None:
+                userHeader[tag] = value
+    return (basicHeader, applicationHeader, userHeader)
+
+
+def lazyMessages(readable, bufferSize=DefaultBufferSize):
+    '''
+    `LazyMessage` for each message in ``readable``. Only blocks 1 to 3 are parsed. For block 4 the
+    end is searched and the text up to it kept without tokenizing it, which is considerably faster
+    than `structuredItems` if only the headers or the report type are needed, for example to route
+    messages.
+
+    Example::
+
+        with MappedFile('statement.txt') as swiftFile:
+            for message in lazyMessages(swiftFile):
+                print(message.messageType, message.sender, message.reportType)
+    '''
+    assert readable is not None
+    assert bufferSize > 0
+    buffer = _textOf(readable.read(bufferSize))
+    bufferOffset = 0
+    position = 0
+    isEndOfInput = not buffer
+    while not isEndOfInput or (position < len(buffer)):
+        bufferLength = len(buffer)
+        while (position < bufferLength) and (buffer[position] in '\r\n'):
+            position += 1
+        bounds = None
+        if position < bufferLength:
+            bounds = _lazyMessageBounds(buffer, position, isEndOfInput)
+        if bounds is None:
+            if not isEndOfInput:
+                # Read at least as much as remains in the buffer so large messages need few reads.
+                data = _textOf(readable.read(max(bufferSize, bufferLength - position)))
+                if data:
+                    buffer = buffer[position:] + data
+                    bufferOffset += position
+                    position = 0
+                else:
+                    isEndOfInput = True
+        else:
+            bodyStart, bodyEnd, end = bounds
+            if bodyStart is None:
+                headerText = buffer[position:end]
+                body = None
+                trailer = ''
+            else:
+                headerText = buffer[position:bodyStart - 3]
+                body = buffer[bodyStart:bodyEnd]
+                trailer = buffer[bodyEnd + 1:end].rstrip('\r\n')
+            basicHeader, applicationHeader, userHeader = _lazyMessageHeaders(headerText)
+            yield LazyMessage(
+                bufferOffset + position, bufferOffset + end, basicHeader, applicationHeader, userHeader,
+                body, trailer)
+            position = end
+
+
+#: Pairs of transaction detail names in field 70E and the `Trade` attribute they are stored in.
+TransactionDetailAttributeNames = (
+    ('CLGM', 'clearingMember'),
+    ('EXCH', 'exchangeMember'),
+    ('LN', 'leg'),
+    ('OT', 'originType'),
+    ('TYPE', 'transactionType'),
+    ('CA', 'ca'),
+    ('CCPSTAT', 'ccpStatus'),
+    ('ORDNETT', 'orderNettingType'),
+    ('ORDNB', 'orderNumber'),
+    ('TTYP', 'tradeType'),
+)
+
+# Transaction details with mostly distinct values, which are not worth sharing with a `SymbolTable`.
+_UnsharedTransactionDetailNames = ('ORDNB',)
+
+_TransactionDetailsHeader = ':TRDE//'
+
+
+def _transactionDetailAttributeMap(transactionDetailNames=None):
+    '''
+    Map of the transaction detail names to extract from field 70E to the `Trade` attribute to store
+    them in. If ``transactionDetailNames`` is ``None``, all details in
+    `TransactionDetailAttributeNames` are extracted.
+    '''
+    result = dict(TransactionDetailAttributeNames)
+    if transactionDetailNames is not None:
+        unknownNames = sorted(set(transactionDetailNames) - set(result))
+        if unknownNames:
+            raise Error(u'transaction details must be one of %s but also are: %s' % (
+                ', '.join(sorted(result)), ', '.join(unknownNames)))
+        result = dict((name, result[name]) for name in transactionDetailNames)
+    return result
+
+
+#: Names of the attributes of a `Trade`.
+TradeAttributeNames = (
+    'accrInterest',
+    'ca',
+    'ccpStatus',
+    'clearingMember',
+    'exchangeMember',
+    'leg',
+    'nominal',
+    'orderNettingType',
+    'orderNumber',
+    'originType',
+    'settlementDate',
+    'tradeDate',
+    'tradeLocation',
+    'tradeNumber',
+    'tradeSettlement',
+    'tradeType',
+    'transactionType',
+)
+
+
+def _projectedTradeAttributeNames(tradeAttributeNames=None):
+    '''
+    Set of the `Trade` attributes in ``tradeAttributeNames`` or ``None`` if it is ``None``, meaning
+    all attributes.
+    '''
+    result = None
+    if tradeAttributeNames is not None:
+        result = frozenset(tradeAttributeNames)
+        unknownNames = sorted(result - set(TradeAttributeNames))
+        if unknownNames:
+            raise Error(u'trade attributes must be one of %s but also are: %s' % (
+                ', '.join(TradeAttributeNames), ', '.join(unknownNames)))
+    return result
+
+
+# Attributes of a `Trade` by type, used to store them compactly in `TradeColumns`.
+_TradeDateNames = ('settlementDate', 'tradeDate')
+_TradeDecimalNames = ('nominal',)
+_TradeCurrencyAndAmountNames = ('accrInterest', 'tradeSettlement')
+
+
+class Trade(object):
+    '''A trade in a `Report`.'''
+    __slots__ = TradeAttributeNames
+
+    def __init__(self):
+        self.accrInterest = None
+        self.ca = None
+        self.ccpStatus = None
+        self.clearingMember = None
+        self.exchangeMember = None
+        self.leg = None
+        self.nominal = None
+        self.orderNettingType = None
+        self.orderNumber = None
+        self.originType = None
+        self.settlementDate = None
+        self.tradeDate = None
+        self.tradeLocation = None
+        self.tradeNumber = None
+        self.tradeSettlement = None
+        self.tradeType = None
+        self.transactionType = None
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in TradeAttributeNames)
+
+    def __setstate__(self, state):
+        for name, value in zip(TradeAttributeNames, state):
+            setattr(self, name, value)
+
+    def asDict(self):
+        '''
+        Dictionary mapping the names of all attributes to their values.
+        '''
+        return dict((name, getattr(self, name)) for name in TradeAttributeNames)
+
+
+class _DateColumn(object):
+    '''
+    Column of ``datetime.date`` values or ``None`` stored as ordinals.
+    '''
+    def __init__(self):
+        self._ordinals = array.array('l')
+
+    def __len__(self):
+        return len(self._ordinals)
+
+    def append(self, value):
+        if value is None:
+            self._ordinals.append(0)
+        else:
+            self._ordinals.append(value.toordinal())
+
+    def __getitem__(self, index):
+        ordinal = self._ordinals[index]
+        if ordinal == 0:
+            result = None
+        else:
+            result = date.fromordinal(ordinal)
+        return result
+
+    def values(self, start, end):
+        return [date.fromordinal(ordinal) if ordinal != 0 else None for ordinal in self._ordinals[start:end]]
+
+
+# Range of values that fit into an ``array.array('l')``.
+_MaxLong = 2 ** (8 * array.array('l').itemsize - 1) - 1
+_MinLong = -_MaxLong - 1
+
+
+class _DecimalColumn(object):
+    '''
+    Column of ``decimal.Decimal`` values or ``None`` stored as unscaled integer and exponent. Values
+    that do not fit are stored as they are.
+    '''
+    # Exponents marking values that are ``None`` or stored in ``_largeValues``.
+    _NoneExponent = -128
+    _LargeExponent = 127
+
+    def __init__(self):
+        self._unscaledValues = array.array('l')
+        self._exponents = array.array('b')
+        self._largeValues = {}
+
+    def __len__(self):
+        return len(self._exponents)
+
+    def append(self, value):
+        if value is None:
+            unscaledValue = 0
+            exponent = _DecimalColumn._NoneExponent
+        else:
+            sign, digits, exponent = value.as_tuple()
+            unscaledValue = None
+            if isinstance(exponent, int) and (_DecimalColumn._NoneExponent < exponent < _DecimalColumn._LargeExponent):
+                unscaledValue = 0
+                for digit in digits:
+                    unscaledValue = 10 * unscaledValue + digit
+                if sign:
+                    unscaledValue = -unscaledValue
+                if not (_MinLong <= unscaledValue <= _MaxLong):
+                    unscaledValue = None
+            if unscaledValue is None:
+                self._largeValues[len(self._exponents)] = value
+                unscaledValue = 0
+                exponent = _DecimalColumn._LargeExponent
+        self._unscaledValues.append(unscaledValue)
+        self._exponents.append(exponent)
+
+    def __getitem__(self, index):
+        exponent = self._exponents[index]
+        if exponent == _DecimalColumn._NoneExponent:
+            result = None
+        elif exponent == _DecimalColumn._LargeExponent:
+            if index < 0:
+                index += len(self._exponents)
+            result = self._largeValues[index]
+        else:
+            result = decimal.Decimal('%de%d' % (self._unscaledValues[index], exponent))
+        return result
+
+    def values(self, start, end):
+        return [self[index] for index in _range(start, end)]
+
+
+class _CurrencyAndAmountColumn(object):
+    '''
+    Column of ``(currency, amount)`` tuples or ``None`` stored as separate currency and amount.
+    '''
+    def __init__(self):
+        self._currencies = []
+        self._amounts = _DecimalColumn()
+
+    def __len__(self):
+        return len(self._currencies)
+
+    def append(self, value):
+        if value is None:
+            self._currencies.append(None)
+            self._amounts.append(None)
+        else:
+            currency, amount = value
+            self._currencies.append(currency)
+            self._amounts.append(amount)
+
+    def __getitem__(self, index):
+        currency = self._currencies[index]
+        if currency is None:
+            result = None
+        else:
+            result = (currency, self._amounts[index])
+        return result
+
+    def values(self, start, end):
+        return [self[index] for index in _range(start, end)]
+
+
+class TradeColumns(object):
+    '''
+    Trades stored as one column per attribute instead of one `Trade` object per trade, which takes
+    considerably less memory for large reports. Dates are stored as ordinals and decimals as
+    integer and exponent.
+
+    Indexing and iterating yields `TradeRow` views with the same attributes as `Trade`.
+    '''
+    def __init__(self):
+        self._columns = {}
+        for name in TradeAttributeNames:
+            if name in _TradeDateNames:
+                column = _DateColumn()
+            elif name in _TradeDecimalNames:
+                column = _DecimalColumn()
+            elif name in _TradeCurrencyAndAmountNames:
+                column = _CurrencyAndAmountColumn()
+            else:
+                column = []
+            self._columns[name] = column
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def append(self, trade):
+        '''
+        Add the attributes of ``trade``, which can be a `Trade` or `TradeRow`.
+        '''
+        assert trade is not None
+        for name, column in self._columns.items():
+            column.append(getattr(trade, name))
+        self._length += 1
+
+    def extend(self, trades):
+        for trade in trades:
+            self.append(trade)
+
+    def column(self, name, start=0, end=None):
+        '''
+        Values of attribute ``name`` for the trades from ``start`` to ``end`` (default: all trades).
+        '''
+        if end is None:
+            end = self._length
+        column = self._columns[name]
+        if isinstance(column, list):
+            result = column[start:end]
+        else:
+            result = column.values(start, end)
+        return result
+
+    def value(self, index, name):
+        return self._columns[name][index]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._length
+        if not (0 <= index < self._length):
+            raise IndexError(u'trade index must be between 0 and %d but is %d' % (self._length - 1, index))
+        return TradeRow(self, index)
+
+    def __iter__(self):
+        for index in _range(self._length):
+            yield TradeRow(self, index)
+
+    def trade(self, index):
+        '''
+        `Trade` with the attributes at ``index``.
+        '''
+        result = Trade()
+        for name in TradeAttributeNames:
+            setattr(result, name, self._columns[name][index])
+        return result
+
+
+class TradeRow(object):
+    '''
+    View on a trade stored in `TradeColumns` with the same attributes as `Trade`.
+    '''
+    __slots__ = ('_columns', '_index')
+
+    def __init__(self, columns, index):
+        self._columns = columns
+        self._index = index
+
+    def __getattr__(self, name):
+        if name not in Trade.__slots__:
+            raise AttributeError(name)
+        return self._columns.value(self._index, name)
+
+    def asDict(self):
+        return dict((name, self._columns.value(self._index, name)) for name in TradeAttributeNames)
+
+
+class SymbolTable(object):
+    '''
+    Table to share a single instance between equal values that occur many times, for example field
+    tags, currencies and member codes. Once ``maxSize`` distinct values have been collected, further
+    new values are passed on as they are so values with many different occurrences cannot use up
+    memory.
+    '''
+    def __init__(self, maxSize=DefaultSymbolTableSize):
+        assert maxSize >= 0
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self._symbols = {}
+
+    def __len__(self):
+        return len(self._symbols)
+
+    def intern(self, value):
+        '''
+        The instance in the table equal to ``value``, or ``value`` itself if there is none yet.
+        ``None`` is passed on without being counted.
+        '''
+        if value is None:
+            return None
+        result = self._symbols.get(value)
+        if result is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            result = value
+            if len(self._symbols) < self.maxSize:
+                self._symbols[value] = value
+        return result
+
+    @property
+    def hitRate(self):
+        '''
+        Fraction of `intern()` calls that found an equal value in the table, or 0.0 if there was no call
+        yet.
+        '''
+        callCount = self.hits + self.misses
+        return float(self.hits) / callCount if callCount else 0.0
+
+
+class _LruCache(object):
+    '''
+    Map with at most ``maxSize`` entries that discards the least recently used entry when full.
+    '''
+    def __init__(self, maxSize=DefaultConverterCacheSize):
+        assert maxSize > 0
+        self._maxSize = maxSize
+        self._values = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._values)
+
+    def get(self, key):
+        '''
+        The value stored for ``key`` or ``None``.
+        '''
+        values = self._values
+        result = values.get(key)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            # Mark entry as most recently used.
+            del values[key]
+            values[key] = result
+        return result
+
+    def put(self, key, value):
+        assert value is not None
+        values = self._values
+        if len(values) >= self._maxSize:
+            values.popitem(last=False)
+        values[key] = value
+
+
+#: Operators to compare values with in a `Condition`.
+ConditionOperators = ('==', '!=', '<', '<=', '>', '>=', 'in', 'between')
+
+#: Attributes of a `LazyMessage` that message conditions of a `Query` can refer to.
+MessageConditionNames = ('messageType', 'messageUserReference', 'receiver', 'reportType', 'sender')
+
+
+class Condition(object):
+    '''
+    Condition that the value of the attribute ``name`` relates to ``value`` as specified by
+    ``operator``, which must be one of `ConditionOperators`:
+
+    * '==', '!=', '<', '<=', '>', '>=': compare with ``value``
+    * 'in': ``value`` is a collection of values, one of which must be equal
+    * 'between': ``value`` is a pair ``(lowest, highest)`` of the range the value must be in, both
+      inclusive
+
+    Except for '==', '!=' and 'in', a value of ``None`` never matches.
+    '''
+    def __init__(self, name, operator, value):
+        assert name
+        if operator not in ConditionOperators:
+            raise Error(u'operator for condition on "%s" must be one of %s but is: %r' % (
+                name, ', '.join(ConditionOperators), operator))
+        if operator == 'in':
+            value = frozenset(value)
+        elif operator == 'between':
+            value = tuple(value)
+            if len(value) != 2:
+                raise Error(u'value for condition "%s between" must be a pair (lowest, highest) but is: %r' % (
+                    name, value))
+        self.name = name
+        self.operator = operator
+        self.value = value
+
+    def matches(self, value):
+        '''
+        ``True`` if ``value`` meets the condition.
+        '''
+        operator = self.operator
+        if operator == '==':
+            result = (value == self.value)
+        elif operator == 'in':
+            result = (value in self.value)
+        elif operator == '!=':
+            result = (value != self.value)
+        elif value is None:
+            result = False
+        elif operator == 'between':
+            result = (self.value[0] <= value <= self.value[1])
+        elif operator == '<':
+            result = (value < self.value)
+        elif operator == '<=':
+            result = (value <= self.value)
+        elif operator == '>':
+            result = (value > self.value)
+        else:
+            assert operator == '>=', u'operator=%r' % operator
+            result = (value >= self.value)
+        return result
+
+    def __eq__(self, other):
+        return isinstance(other, Condition) \
+            and ((self.name, self.operator, self.value) == (other.name, other.operator, other.value))
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        value = sorted(self.value, key=repr) if self.operator == 'in' else self.value
+        return 'Condition(%r, %r, %r)' % (self.name, self.operator, value)
+
+
+def _conditions(conditions, names, kind):
+    '''
+    Tuple of `Condition` for ``conditions``, which can also be specified as tuples
+    ``(name, operator, value)``. Each name must be one of ``names``.
+    '''
+    result = []
+    for condition in conditions:
+        if not isinstance(condition, Condition):
+            condition = Condition(*condition)
+        if condition.name not in names:
+            raise Error(u'%s conditions must refer to one of %s but also refer to: %s' % (
+                kind, ', '.join(names), condition.name))
+        result.append(condition)
+    return tuple(result)
+
+
+class Query(object):
+    '''
+    Declarative selection of the messages and trades to read, for example to process only the trades
+    at a certain location settled in 2005 from messages of type 598::
+
+        query = Query(
+            messageConditions=[('messageType', '==', '598'), ('reportType', '==', 'RAWCE260')],
+            tradeConditions=[
+                ('tradeLocation', '==', 'XEUR'),
+                ('settlementDate', 'between', (date(2005, 1, 1), date(2005, 12, 31)))])
+        report = Report(statementFile, query=query)
+
+    A message or trade is selected if it matches all conditions. Conditions can be `Condition` or
+    tuples ``(name, operator, value)``.
+
+    * messageConditions: conditions on the attributes of `LazyMessage` listed in
+      `MessageConditionNames`. Only the headers of the messages are parsed to check them; the body
+      of other messages is skipped without tokenizing it.
+    * tradeConditions: conditions on the attributes in `TradeAttributeNames`. A trade is rejected as
+      soon as an attribute does not match, and the fields of the trade that follow are skipped
+      without converting or validating their values.
+
+    Use `queriedMessages()` to select messages, or pass the query to `Report` or `ReportReader` to
+    select trades.
+    '''
+    def __init__(self, messageConditions=(), tradeConditions=()):
+        self.messageConditions = _conditions(messageConditions, MessageConditionNames, u'message')
+        self.tradeConditions = _conditions(tradeConditions, TradeAttributeNames, u'trade')
+        #: Names of the `Trade` attributes the trade conditions refer to.
+        self.tradeAttributeNames = frozenset(condition.name for condition in self.tradeConditions)
+
+    def matchesMessage(self, message):
+        '''
+        ``True`` if the `LazyMessage` ``message`` matches all message conditions.
+        '''
+        for condition in self.messageConditions:
+            if not condition.matches(getattr(message, condition.name)):
+                return False
+        return True
+
+    def matchesTrade(self, trade):
+        '''
+        ``True`` if ``trade`` matches all trade conditions.
+        '''
+        for condition in self.tradeConditions:
+            if not condition.matches(getattr(trade, condition.name)):
+                return False
+        return True
+
+    def __eq__(self, other):
+        return isinstance(other, Query) \
+            and ((self.messageConditions, self.tradeConditions) == (other.messageConditions, other.tradeConditions))
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return 'Query(messageConditions=%r, tradeConditions=%r)' % (
+            list(self.messageConditions), list(self.tradeConditions))
+
+
+def queriedMessages(readable, query, bufferSize=DefaultBufferSize):
+    '''
+    `LazyMessage` for each message in ``readable`` that matches the message conditions of ``query``.
+
+    Example::
+
+        query = Query(messageConditions=[('messageType', '==', '598'), ('reportType', '==', 'RAWCE260')])
+        with MappedFile('statement.txt') as swiftFile:
+            for message in queriedMessages(swiftFile, query):
+                print(message.messageUserReference)
+    '''
+    assert query is not None
+    for message in lazyMessages(readable, bufferSize):
+        if query.matchesMessage(message):
+            yield message
+
+
+def _checkedQuery(query, quarantine, stats):
+    '''
+    ``query`` after checking it can be combined with ``quarantine`` and ``stats``.
+    '''
+    if (query is not None) and query.messageConditions and ((quarantine is not None) or (stats is not None)):
+        raise Error(
+            u'query with message conditions must not be combined with a quarantine or stats '
+            u'because the body of messages that do not match is never parsed')
+    return query
+
+
+def _reportItems(messageToRead, query, quarantine, stats, symbols):
+    '''
+    Structured items of the messages in ``messageToRead`` to process for a `Report` using ``query``.
+    '''
+    if (query is not None) and query.messageConditions:
+        result = _queriedItems(messageToRead, query, symbols)
+    else:
+        result = structuredItems(messageToRead, quarantine, stats, symbols)
+    return result
+
+
+def _queriedItems(messageToRead, query, symbols):
+    for message in queriedMessages(messageToRead, query):
+        for item in message.bodyItems(symbols):
+            yield item
+
+
+class Report(object):
+    '''
+    Report read from ``messageToRead``. For report type RAWCE260, ``trades`` contains the trades,
+    either as a list of `Trade` or, if ``columnar`` is ``True``, as `TradeColumns`.
+
+    Amounts are expected in SWIFT format, for example "1234,5". Unless ``strictAmounts`` is ``True``,
+    other formats are accepted too, for example "1,234.5" or "1.234,5".
+
+    If ``quarantine`` is a `Quarantine`, messages that cannot be parsed are added to it and skipped
+    as described in `messageItems`.
+
+    If ``stats`` is a `ParseStats`, it is updated while reading the report.
+
+    Of the transaction details in field 70E, only those in ``transactionDetailNames`` are stored in
+    the trades; by default these are all in `TransactionDetailAttributeNames`. The attributes for the
+    other details remain ``None``.
+
+    If ``tradeAttributeNames`` is specified, only these attributes of the trades are extracted. The
+    fields for other attributes are skipped without converting or validating their values, and the
+    attributes remain ``None``. This makes reading considerably faster if for example only trade
+    numbers and nominals are needed::
+
+        report = Report(statementFile, tradeAttributeNames=['tradeNumber', 'nominal'])
+
+    If ``query`` is a `Query`, only the messages and trades matching it are processed. The
+    attributes its trade conditions refer to are extracted even if they are not in
+    ``tradeAttributeNames``. For RAWCE260, ``rejectedTradeCount`` is the number of trades skipped
+    because they did not match. A query with message conditions cannot be combined with
+    ``quarantine`` or ``stats``.
+    '''
+    def __init__(
+            self, messageToRead, columnar=False, strictAmounts=False, quarantine=None, stats=None,
+            transactionDetailNames=None, tradeAttributeNames=None, query=None):
+        assert messageToRead is not None
+        self._initReport()
+        self._columnar = columnar
+        self._strictAmounts = strictAmounts
+        self._tradeQuery = _checkedQuery(query, quarantine, stats)
+        self._initProjection(transactionDetailNames, tradeAttributeNames)
+        items = _reportItems(messageToRead, query, quarantine, stats, self.symbols)
+        if stats is None:
+            for item in items:
+                self._process(item)
+            self._finish()
+        else:
+            for item in items:
+                _processMeasured(self, item, stats)
+            self._finish()
+            stats._addTrades(self.report, len(getattr(self, 'trades', ())))
+            stats._notify()
+
+    def _initReport(self):
+        self.report = None
+        self._reportType = None
+        self._columnar = False
+        self._strictAmounts = False
+        self._transactionDetailAttributes = _transactionDetailAttributeMap()
+        self._tradeAttributeNames = None
+        self._tradeQuery = None
+        self._initConverterCaches()
+
+    def _initProjection(self, transactionDetailNames, tradeAttributeNames):
+        self._tradeAttributeNames = _projectedTradeAttributeNames(tradeAttributeNames)
+        if (self._tradeAttributeNames is not None) and (self._tradeQuery is not None):
+            self._tradeAttributeNames |= self._tradeQuery.tradeAttributeNames
+        self._transactionDetailAttributes = _transactionDetailAttributeMap(transactionDetailNames)
+        if self._tradeAttributeNames is not None:
+            self._transactionDetailAttributes = dict(
+                (name, attributeName) for name, attributeName in self._transactionDetailAttributes.items()
+                if attributeName in self._tradeAttributeNames)
+
+    def _initConverterCaches(self):
+        self._dateCache = _LruCache()
+        self._decimalCache = _LruCache()
+        self._currencyAndAmountCache = _LruCache()
+        self.symbols = SymbolTable()
+
+    def __getstate__(self):
+        # Omit the report type handlers, caches and symbols; they are set up again when unpickling.
+        result = dict(self.__dict__)
+        for name in ('_reportType', '_dateCache', '_decimalCache', '_currencyAndAmountCache', 'symbols'):
+            del result[name]
+        return result
+
+    def __setstate__(self, state):
+        self._tradeAttributeNames = None
+        self._tradeQuery = None
+        self.__dict__.update(state)
+        self._reportType = self._reportTypeFor(self.report)
+        self._initConverterCaches()
+
+    def _reportTypeFor(self, report):
+        '''
+        The `ReportType` to process reports of type ``report`` with, reduced to the handlers needed for
+        the projected trade attributes and rejecting trades that do not match the query, or ``None``
+        if the report type is unknown.
+        '''
+        result = _reportTypes.get(report)
+        if result is not None:
+            if self._tradeAttributeNames is not None:
+                result = result.projected(self._tradeAttributeNames)
+            if (self._tradeQuery is not None) and self._tradeQuery.tradeConditions:
+                result = result.queried(self._tradeQuery.tradeConditions)
+        return result
+
+    def _setReport(self, report):
+        self.report = report
+        self._reportType = self._reportTypeFor(report)
+        if (self._reportType is not None) and (self._reportType.init is not None):
+            self._reportType.init(self)
+
+    def _process(self, item):
+        if self.report is None:
+            if item[:3] == (1, 4, '77E'):
+                report = self._valueFor(item, '/TRNA')
+                if self.report is None:
+                    self._setReport(report)
+                else:
+                    raise Error(u'cannot set report to "%s" because it already is "%s"' % (report, self.report))
+        elif self._reportType is not None:
+            self._reportType.process(self, item)
+        else:
+            raise Error(u'cannot (yet) read reports of type "%s"' % self.report)
+
+    def _finish(self):
+        if (self._reportType is not None) and (self._reportType.finish is not None):
+            self._reportType.finish(self)
+
+    def _valueFor(self, item, valuePrefix, strip=True, required=True, defaultValue=None):
+        assert item is not None
+        assert valuePrefix
+        if required:
+            assert defaultValue is None
+
+        result = None
+        _, block, field, values = item
+        valueIndex = 0
+        valueCount = len(values)
+        while (result is None) and (valueIndex < valueCount):
+            value = values[valueIndex]
+            if value.startswith(valuePrefix):
+                result = value[len(valuePrefix):]
+                if strip:
+                    result = result.strip()
+            else:
+                valueIndex += 1
+        if result is None:
+            if required:
+                raise Error(u'block %d, field "%s" must contain %s but found only: %s' % (block, field, valuePrefix, values))
+            else:
+                result = defaultValue
+        return result
+
+    def _slashedNameValue(self, item):
+        assert item is not None
+        _, block, field, values = item
+        if len(values) != 1:
+            raise Error(u'value in block "%s", field "%s" must fit into one line but is: %r' % (block, field, values))
+        finding = _SlashedNameValueRegex.match(values[0])
+        if finding is None:
+            raise Error(u'value in block "%s", field "%s" must contain text matching ":<NAME>//<VALUE>" but is: %r' % (block, field, values))
+        name = finding.group('name')
+        value = finding.group('value')
+        return (name, value)
+
+    def _dateFromIsoText(self, item, name, text):
+        assert item is not None
+        assert text is not None
+
+        result = self._dateCache.get(text)
+        if result is None:
+            isoDate = _IsoDateRegex.match(text)
+            if isoDate is not None:
+                try:
+                    result = date(int(isoDate.group(1)), int(isoDate.group(2)), int(isoDate.group(3)))
+                except ValueError:
+                    # Let strptime() report the error.
+                    pass
+            if result is None:
+                _, block, field, _ = item
+                try:
+                    textAsTime = datetime.strptime(text, '%Y%m%d')
+                except ValueError as error:
+                    message = u'cannot convert "%s" in block "%s", field "%s"' % (text, block, field)
+                    if name is not None:
+                        message += u', item "%s"' % name
+                    message += u' to date: %s' % error
+                    raise Error(message)
+                result = date(textAsTime.year, textAsTime.month, textAsTime.day)
+            self._dateCache.put(text, result)
+        return result
+
+    def _decimalFrom(self, item, name, value):
+        '''
+        A ``decimal.Decimal`` from ``value`` properly handling all kinds of separators.
+
+        Examples:
+
+        * _decimalFrom(..., '1') --> 1
+        * _decimalFrom(..., '123.45') --> 123.45
+        * _decimalFrom(..., '123,45') --> 123.45
+        * _decimalFrom(..., '123456.78') --> 123456.78
+        * _decimalFrom(..., '123,456.78') --> 123456.78
+        * _decimalFrom(..., '123.456,78') --> 123456.78
+
+        With ``strictAmounts``, only the SWIFT format (for example '123456,78') is accepted.
+        '''
+        assert item is not None
+        assert value is not None
+
+        result = self._decimalCache.get(value)
+        if result is None:
+            swiftAmount = _SwiftAmountRegex.match(value)
+            if swiftAmount is not None:
+                # Same as the conversion below but without guessing the separators.
+                result = decimal.Decimal(swiftAmount.group(1) + '.' + swiftAmount.group(2))
+            else:
+                unifiedValue = None
+                if not self._strictAmounts:
+                    isGermanNumeric = False
+                    firstCommaIndex = value.find(',')
+                    if firstCommaIndex >= 0:
+                        firstDotIndex = value.find('.')
+                        if firstCommaIndex > firstDotIndex:
+                            isGermanNumeric = True
+                    if isGermanNumeric:
+                        unifiedValue = value.replace('.', '').replace(',', '.')
+                    else:
+                        unifiedValue = value.replace(',', '')
+                try:
+                    if unifiedValue is None:
+                        raise ValueError(u'value must be digits followed by a comma and optional decimals')
+                    result = decimal.Decimal(unifiedValue)
+                except Exception as error:
+                    _, block, field, _ = item
+                    message = u'cannot convert "%s" in block "%s", field "%s"' % (value, block, field)
+                    if name is not None:
+                        message += u', item "%s"' % name
+                    message += u' to decimal: %s' % error
+                    raise Error(message)
+            self._decimalCache.put(value, result)
+        return result
+
+    def _currencyAndAmountFrom(self, item, name, value):
+        '''
+        tuple with currency (as ISO code) and amount extracted from ``value``.
+
+        Example: 'EUR123,45' --> (u'EUR', 123.45)
+        '''
+        assert item is not None
+        assert value is not None
+
+        def errorMessage(details):
+            _, block, field, _ = item
+            result = u'cannot convert "%s" in block "%s", field "%s"' % (value, block, field)
+            if name is not None:
+                result += u', item "%s"' % name
+            result += u' to currency and amount: %s' % details
+            return result
+
+        result = self._currencyAndAmountCache.get(value)
+        if result is None:
+            if len(value) < 4:
+                raise Error(errorMessage(u'value must have at least 4 characters'))
+            currency = self.symbols.intern(value[:3])
+            try:
+                amount = self._decimalFrom(item, name, value[3:])
+            except Exception as error:
+                raise Error(errorMessage(error))
+            result = (currency, amount)
+            self._currencyAndAmountCache.put(value, result)
+        return result
+
+    def _initCe260(self):
+        self.financialInstrument = None
+        self.safekeepingAccount = None
+        if self._columnar:
+            self.trades = TradeColumns()
+        else:
+            self.trades = []
+        self.rejectedTradeCount = 0
+        self._trade = None
+        self._tradeRejected = False
+
+    def _checkHasTrade(self, field, name=None):
+        if self._trade is None:
+            message = u'trade must start with 94B::PRIC before details can be specified with '
+            if name is None:
+                message += field
+            else:
+                message += field + '::' + name
+            raise Error(message)
+
+    def _appendPossibleTrade(self):
+        trade = self._trade
+        if trade is not None:
+            # Trades missing a field are only rejected now because no handler could check them before.
+            if self._tradeRejected or ((self._tradeQuery is not None) and not self._tradeQuery.matchesTrade(trade)):
+                self.rejectedTradeCount += 1
+            else:
+                self.trades.append(trade)
+        self._tradeRejected = False
+
+
+class ReportType(object):
+    '''
+    Handlers to process the items of reports of type ``name`` as specified by block 4, field 77E,
+    item /TRNA:
+
+    * ``init(report)`` is called once the report type is known and can set up the attributes of
+      ``report``.
+    * ``finish(report)`` is called after the last item has been processed.
+    * Field handlers registered with `addHandler()` process the items of fields in top level
+      blocks.
+
+    To make `Report` process reports of a new type, register its handlers using
+    `registerReportType()`.
+    '''
+    def __init__(self, name, init=None, finish=None):
+        assert name
+        self.name = name
+        self.init = init
+        self.finish = finish
+        # Map of (block, field) to either a handler or a map of qualifier to handler.
+        self._blockFieldToHandler = {}
+        # Arguments of all calls to `addHandler()`, used to build projections.
+        self._handlers = []
+
+    def addHandler(self, block, field, qualifier, handler, attributeNames=None):
+        '''
+        Make ``handler`` process the items of ``field`` in ``block``.
+
+        If ``qualifier`` is ``None``, every item is passed as ``handler(report, item)``. Otherwise,
+        the item must have a single value of the form ":<QUALIFIER>//<VALUE>" and is passed as
+        ``handler(report, item, qualifier, value)`` if its qualifier matches. Values of other
+        qualifiers are ignored.
+
+        If ``attributeNames`` is specified, it lists the `Trade` attributes ``handler`` sets, and the
+        handler is omitted from projections that need none of them, see `projected()`.
+        '''
+        assert block is not None
+        assert field is not None
+        assert handler is not None
+        blockField = (block, field)
+        existingHandler = self._blockFieldToHandler.get(blockField)
+        if qualifier is None:
+            if existingHandler is not None:
+                raise Error(u'handler for block %s, field "%s" must be added only once' % (block, field))
+            self._blockFieldToHandler[blockField] = handler
+        else:
+            if existingHandler is None:
+                existingHandler = {}
+                self._blockFieldToHandler[blockField] = existingHandler
+            elif not isinstance(existingHandler, dict):
+                raise Error(u'handler for block %s, field "%s" must not have a qualifier' % (block, field))
+            if qualifier in existingHandler:
+                raise Error(u'handler for block %s, field "%s", qualifier "%s" must be added only once' % (block, field, qualifier))
+            existingHandler[qualifier] = handler
+        self._handlers.append((block, field, qualifier, handler, attributeNames))
+
+    def projected(self, tradeAttributeNames):
+        '''
+        Copy of this report type without the handlers that set none of the attributes in
+        ``tradeAttributeNames``. Fields without a remaining handler are skipped entirely, including
+        the extraction of their qualifier.
+        '''
+        assert tradeAttributeNames is not None
+        result = ReportType(self.name, self.init, self.finish)
+        for block, field, qualifier, handler, attributeNames in self._handlers:
+            if (attributeNames is None) or not set(attributeNames).isdisjoint(tradeAttributeNames):
+                result.addHandler(block, field, qualifier, handler, attributeNames)
+        return result
+
+    def queried(self, tradeConditions):
+        '''
+        Copy of this report type that rejects the current trade as soon as a handler has set an
+        attribute that does not match ``tradeConditions``. For the rest of a rejected trade, the
+        handlers that set trade attributes are skipped.
+        '''
+        assert tradeConditions is not None
+        result = ReportType(self.name, self.init, self.finish)
+        for block, field, qualifier, handler, attributeNames in self._handlers:
+            if attributeNames is not None:
+                conditions = [condition for condition in tradeConditions if condition.name in attributeNames]
+                handler = _queriedHandler(handler, conditions)
+            result.addHandler(block, field, qualifier, handler, attributeNames)
+        return result
+
+    def process(self, report, item):
+        '''
+        Process ``item`` using the handler registered for its block, field and qualifier.
+        '''
+        level, block, field, _ = item
+        if level == 1:
+            handler = self._blockFieldToHandler.get((block, field))
+            if handler is not None:
+                if isinstance(handler, dict):
+                    qualifier, value = report._slashedNameValue(item)
+                    qualifierHandler = handler.get(qualifier)
+                    if qualifierHandler is not None:
+                        qualifierHandler(report, item, qualifier, value)
+                else:
+                    handler(report, item)
+
+
+def _queriedHandler(handler, conditions):
+    '''
+    Handler that calls ``handler`` unless the current trade has been rejected, and rejects it if the
+    attributes set do not match ``conditions``.
+    '''
+    def queriedHandler(report, *arguments):
+        if not report._tradeRejected:
+            handler(report, *arguments)
+            trade = report._trade
+            for condition in conditions:
+                if not condition.matches(getattr(trade, condition.name)):
+                    report._tradeRejected = True
+                    break
+    return queriedHandler
+
+
+# Map of report type name to `ReportType`.
+_reportTypes = {}
+
+
+def registerReportType(reportType):
+    '''
+    Make `Report` process reports of type ``reportType.name`` using ``reportType``.
+    '''
+    assert reportType is not None
+    _reportTypes[reportType.name] = reportType
+
+
+def _initCe260(report):
+    report._initCe260()
+
+
+def _finishCe260(report):
+    # Add possibly remaining trade.
+    report._appendPossibleTrade()
+    report._trade = None
+    if (len(report.trades) == 0) and (report.rejectedTradeCount == 0):
+        raise Error(u'report must contain at least 1 trade (starting with :94B::PRIC)')
+
+
+def _processCe260AccrInterest(report, item, name, value):
+    report._checkHasTrade('19A', name)
+    report._trade.accrInterest = report._currencyAndAmountFrom(item, name, value)
+
+
+def _processCe260TradeSettlement(report, item, name, value):
+    report._checkHasTrade('19A', name)
+    report._trade.tradeSettlement = report._currencyAndAmountFrom(item, name, value)
+
+
+def _processCe260TradeNumber(report, item, name, value):
+    field = '20C'
+    report._checkHasTrade(field, name)
+    _TradeNumberIndex = 8
+    if len(value) <= _TradeNumberIndex:
+        raise Error(u'trade number in %s::%s must have at least %d characters: "%s"' % (field, name, _TradeNumberIndex + 1, value))
+    report._trade.tradeNumber = value[_TradeNumberIndex:]
+
+
+def _processCe260FinancialInstrument(report, item):
+    report.financialInstrument = item[3]
+
+
+def _processCe260Nominal(report, item, name, value):
+    report._checkHasTrade('36B', name)
+    if value.startswith(_FamtMarker):
+        nominalText = value[len(_FamtMarker):]
+        try:
+            report._trade.nominal = report._decimalFrom(item, name, nominalText)
+        except Exception as error:
+            raise Error(error)
+
+
+def _processCe260TransactionDetails(report, item):
+    report._checkHasTrade('70E')
+    values = item[3]
+    assert values
+    if not values[0].startswith(_TransactionDetailsHeader):
+        raise Error(u'transaction details in field "%s" must start with "%s" but are: %s' % (
+            item[2], _TransactionDetailsHeader, values))
+    transactionDetails = [values[0][len(_TransactionDetailsHeader):]]
+    transactionDetails.extend(values[1:])
+    trade = report._trade
+    attributes = report._transactionDetailAttributes
+    intern = report.symbols.intern
+    namesFound = set()
+    for detail in u' '.join(transactionDetails).split(u'/'):
+        detail = detail.rstrip()
+        if detail:
+            name, space, value = detail.partition(' ')
+            if name in namesFound:
+                raise Error(u'duplicate transaction detail "%s" must be removed: %s' % (name, transactionDetails))
+            namesFound.add(name)
+            attributeName = attributes.get(name)
+            if attributeName is not None:
+                if not space:
+                    value = None
+                elif name in _UnsharedTransactionDetailNames:
+                    value = value.lstrip()
+                else:
+                    value = intern(value.lstrip())
+                setattr(trade, attributeName, value)
+
+
+def _processCe260Price(report, item, name, value):
+    report._appendPossibleTrade()
+    report._trade = Trade()
+
+
+def _processCe260TradeLocation(report, item, name, value):
+    report._checkHasTrade('94B', name)
+    ExchHeader = 'EXCH/'
+    if value.startswith(ExchHeader):
+        report._trade.tradeLocation = report.symbols.intern(value[len(ExchHeader):])
+
+
+def _processCe260SafekeepingAccount(report, item):
+    report.safekeepingAccount = report._valueFor(item, ':SAFE//')
+
+
+def _processCe260SettlementDate(report, item, name, value):
+    report._trade.settlementDate = report._dateFromIsoText(item, name, value)
+
+
+def _processCe260TradeDate(report, item, name, value):
+    report._trade.tradeDate = report._dateFromIsoText(item, name, value)
+
+
+def _ce260ReportType():
+    result = ReportType(u'RAWCE260', _initCe260, _finishCe260)
+    transactionDetailAttributeNames = [attributeName for _, attributeName in TransactionDetailAttributeNames]
+    for field, qualifier, handler, attributeNames in (
+        ('19A', 'ACRU', _processCe260AccrInterest, ['accrInterest']),
+        ('19A', 'PSTA', _processCe260TradeSettlement, ['tradeSettlement']),
+        ('20C', 'TRRF', _processCe260TradeNumber, ['tradeNumber']),
+        ('35B', None, _processCe260FinancialInstrument, None),
+        ('36B', 'PSTA', _processCe260Nominal, ['nominal']),
+        ('70E', None, _processCe260TransactionDetails, transactionDetailAttributeNames),
+        ('94B', 'PRIC', _processCe260Price, None),
+        ('94B', 'TRAD', _processCe260TradeLocation, ['tradeLocation']),
+        ('97A', None, _processCe260SafekeepingAccount, None),
+        ('98A', 'SETT', _processCe260SettlementDate, ['settlementDate']),
+        ('98A', 'TRAD', _processCe260TradeDate, ['tradeDate']),
+    ):
+        result.addHandler(4, field, qualifier, handler, attributeNames)
+    return result
+
+
+registerReportType(_ce260ReportType())
+
+
+class ReportReader(object):
+    '''
+    Same as `Report` but instead of collecting all trades in a list, iterating yields each `Trade`
+    as soon as the next trade starts or the input ends. The report type and header data are
+    available as soon as they are found.
+
+    Example::
+
+        with open('statement.txt', 'rb') as statementFile:
+            reader = ReportReader(statementFile)
+            for trade in reader:
+                print(reader.safekeepingAccount, trade.tradeNumber)
+    '''
+    def __init__(
+            self, messageToRead, strictAmounts=False, quarantine=None, stats=None, transactionDetailNames=None,
+            tradeAttributeNames=None, query=None):
+        assert messageToRead is not None
+        self._messageToRead = messageToRead
+        self._quarantine = quarantine
+        self._stats = stats
+        self._query = _checkedQuery(query, quarantine, stats)
+        self._report = _emptyReport()
+        self._report._strictAmounts = strictAmounts
+        self._report._tradeQuery = query
+        self._report._initProjection(transactionDetailNames, tradeAttributeNames)
+        self.tradeCount = 0
+
+    @property
+    def report(self):
+        '''
+        The report type as specified by block 4, field 77E, item /TRNA or ``None`` if it has not been
+        found yet.
+        '''
+        return self._report.report
+
+    @property
+    def financialInstrument(self):
+        return getattr(self._report, 'financialInstrument', None)
+
+    @property
+    def safekeepingAccount(self):
+        return getattr(self._report, 'safekeepingAccount', None)
+
+    @property
+    def rejectedTradeCount(self):
+        '''
+        The number of trades so far that did not match the query.
+        '''
+        return getattr(self._report, 'rejectedTradeCount', 0)
+
+    def __iter__(self):
+        assert self._messageToRead is not None, u'trades must be read only once'
+        messageToRead = self._messageToRead
+        self._messageToRead = None
+        items = _reportItems(messageToRead, self._query, self._quarantine, self._stats, self._report.symbols)
+        for trade in self._processedTrades(items):
+            yield trade
+        for trade in self._remainingTrades():
+            yield trade
+
+    def _processedTrades(self, items):
+        '''
+        Process the structured ``items`` and yield the trades completed by them.
+        '''
+        report = self._report
+        stats = self._stats
+        for item in items:
+            if stats is None:
+                report._process(item)
+            else:
+                _processMeasured(report, item, stats)
+            if report.report == u'RAWCE260':
+                trades = report.trades
+                if trades:
+                    self.tradeCount += len(trades)
+                    for trade in trades:
+                        yield trade
+                    del trades[:]
+
+    def _remainingTrades(self):
+        '''
+        The last trade, which is complete once the input ends.
+        '''
+        result = []
+        report = self._report
+        if report.report == u'RAWCE260':
+            report._appendPossibleTrade()
+            report._trade = None
+            result.extend(report.trades)
+            del report.trades[:]
+            self.tradeCount += len(result)
+            if (self.tradeCount == 0) and (report.rejectedTradeCount == 0):
+                raise Error(u'report must contain at least 1 trade (starting with :94B::PRIC)')
+        if self._stats is not None:
+            self._stats._addTrades(report.report, self.tradeCount)
+            self._stats._notify()
+        return result
+
+
+def _emptyReport():
+    '''
+    `Report` without any data, to be filled by calling its ``_process()`` method.
+    '''
+    result = Report.__new__(Report)
+    result._initReport()
+    return result
+
+
+def _isTradeStart(item):
+    result = False
+    if item[:3] == (1, 4, '94B'):
+        try:
+            name, _ = _emptyReport()._slashedNameValue(item)
+            result = (name == 'PRIC')
+        except Error:
+            # Broken values are reported when the item is actually processed.
+            pass
+    return result
+
+
+def _nextMessageEnd(buffer, position, size):
+    '''
+    Offset after the first message ending at or after ``position`` in ``buffer``.
+    '''
+    result = size
+    if position < size:
+        messageEnd = _MessageEndBytesRegex.search(buffer, position)
+        if messageEnd is not None:
+            result = messageEnd.end()
+    return result
+
+
+def _reportChunkRanges(path, chunkSize):
+    '''
+    Report type and list of ``(start, end)`` byte ranges that split the file at ``path`` into chunks
+    of about ``chunkSize`` bytes at message boundaries. The first chunk reaches at least to the end of
+    the message that specifies the report type so the remaining chunks can be processed without it.
+
+    Like `Report`, the report type is taken from the first field 77E. To find it without tokenizing
+    the whole file in case there is none, the raw data are searched for it first.
+    '''
+    assert chunkSize > 0
+    result = []
+    reportType = None
+    with MappedFile(path) as swiftFile:
+        size = len(swiftFile._buffer)
+        firstEnd = 0
+        reportFieldStart = _ReportFieldBytesRegex.search(swiftFile._buffer)
+        if reportFieldStart is not None:
+            firstEnd = _nextMessageEnd(swiftFile._buffer, reportFieldStart.end(), size)
+            for entry in _messageIndexEntries(
+                    SelectedMessages(swiftFile, [MessageIndexEntry(0, firstEnd)]), DefaultBufferSize):
+                if entry.reportType is not None:
+                    reportType = entry.reportType
+                    break
+        start = 0
+        while start < size:
+            if start == 0:
+                end = max(firstEnd, _nextMessageEnd(swiftFile._buffer, chunkSize, size))
+            else:
+                end = _nextMessageEnd(swiftFile._buffer, start + chunkSize, size)
+            result.append((start, end))
+            start = end
+    return (reportType, result)
+
+
+def _parseReportChunk(arguments):
+    '''
+    Tuple ``(report, leadingItems, error)`` describing the result of processing the bytes from
+    ``start`` to ``end`` in the file at ``path``:
+
+    * report: `Report` with the trades found; the last trade is still in ``report._trade`` because
+      the next chunk might add details to it.
+    * leadingItems: for all but the first chunk, the structured items before the first trade in the
+      chunk; they belong to the last trade of the previous chunk and have to be processed after it.
+    * error: the exception that stopped processing, or ``None``.
+    '''
+    path, start, end, reportType = arguments
+    report = _emptyReport()
+    leadingItems = []
+    error = None
+    try:
+        with MappedFile(path) as swiftFile:
+            items = structuredItems(
+                SelectedMessages(swiftFile, [MessageIndexEntry(start, end)]), symbols=report.symbols)
+            if start > 0:
+                report._setReport(reportType)
+                for item in items:
+                    if _isTradeStart(item):
+                        report._process(item)
+                        break
+                    leadingItems.append(item)
+            for item in items:
+                report._process(item)
+    except Exception as chunkError:
+        error = chunkError
+    return (report, leadingItems, error)
+
+
+class _ReportChunkMerger(object):
+    '''
+    Merger for the results of `_parseReportChunk()` for consecutive chunks.
+    '''
+    def __init__(self):
+        self.report = None
+        self.tradeCount = 0
+
+    def add(self, chunkResult):
+        '''
+        Tuple ``(trades, error)`` with the trades completed by ``chunkResult`` and the error that
+        processing the chunk raised.
+        '''
+        chunkReport, leadingItems, error = chunkResult
+        trades = []
+        if self.report is None:
+            assert leadingItems == []
+            self.report = chunkReport
+            if self.report.report == u'RAWCE260':
+                trades.extend(chunkReport.trades)
+                chunkReport.trades = []
+        else:
+            try:
+                for item in leadingItems:
+                    self.report._process(item)
+            except Exception as leadingError:
+                error = leadingError
+            if (error is None) and (chunkReport._trade is not None):
+                # The chunk started a new trade, so the last trade of the previous chunk is complete.
+                if self.report._trade is not None:
+                    trades.append(self.report._trade)
+                trades.extend(chunkReport.trades)
+                self.report._trade = chunkReport._trade
+            if chunkReport.financialInstrument is not None:
+                self.report.financialInstrument = chunkReport.financialInstrument
+            if chunkReport.safekeepingAccount is not None:
+                self.report.safekeepingAccount = chunkReport.safekeepingAccount
+        self.tradeCount += len(trades)
+        return (trades, error)
+
+    def finish(self):
+        '''
+        List with the last trade, if any.
+        '''
+        result = []
+        if (self.report is not None) and (self.report.report == u'RAWCE260'):
+            if self.report._trade is not None:
+                result.append(self.report._trade)
+                self.tradeCount += 1
+                self.report._trade = None
+            if self.tradeCount == 0:
+                raise Error(u'report must contain at least 1 trade (starting with :94B::PRIC)')
+        return result
+
+
+def _isChunkable(reportType):
+    '''
+    ``True`` if `_ReportChunkMerger` can merge the chunks of reports of type ``reportType``.
+    '''
+    return reportType == u'RAWCE260'
+
+
+def _chunkResults(path, reportType, chunkRanges, workerCount, ordered):
+    '''
+    Pairs ``(chunkIndex, chunkResult)`` for the ``chunkRanges`` of the file at ``path`` processed by a
+    pool of ``workerCount`` processes, either in order or as soon as they are available.
+    '''
+    arguments = [(path, start, end, reportType) for start, end in chunkRanges]
+    pool = multiprocessing.Pool(workerCount)
+    try:
+        if ordered:
+            for chunkIndex, chunkResult in enumerate(pool.imap(_parseReportChunk, arguments)):
+                yield (chunkIndex, chunkResult)
+        else:
+            for chunkIndexAndResult in pool.imap_unordered(_indexedParseReportChunk, enumerate(arguments)):
+                yield chunkIndexAndResult
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _indexedParseReportChunk(chunkIndexAndArguments):
+    chunkIndex, arguments = chunkIndexAndArguments
+    return (chunkIndex, _parseReportChunk(arguments))
+
+
+def parallelTrades(path, workerCount=None, chunkSize=DefaultChunkSize, ordered=True):
+    '''
+    The trades of the report in the file at ``path``, parsed by a pool of ``workerCount`` processes
+    (default: number of CPUs) in chunks of about ``chunkSize`` bytes split at message boundaries.
+
+    If ``ordered`` is ``True``, trades are yielded in the same order as with `Report`, and errors are
+    raised after yielding the same trades `Report` would have found before the error. Otherwise
+    trades are yielded as soon as their chunk is processed, and an error can be raised before trades
+    preceding it in the file have been yielded.
+
+    Only RAWCE260 reports are split into chunks. Other reports are read serially by a `ReportReader`
+    so the result is the same as without a pool, including errors for unknown report types.
+    '''
+    assert path is not None
+    assert (workerCount is None) or (workerCount > 0)
+    assert chunkSize > 0
+
+    reportType, chunkRanges = _reportChunkRanges(path, chunkSize)
+    if not _isChunkable(reportType):
+        with MappedFile(path) as swiftFile:
+            for trade in ReportReader(swiftFile):
+                yield trade
+    else:
+        for trade in _mergedTrades(path, reportType, chunkRanges, workerCount, ordered):
+            yield trade
+
+
+def _mergedTrades(path, reportType, chunkRanges, workerCount, ordered):
+    '''
+    Same as `parallelTrades` for the ``chunkRanges`` of a report of a chunkable ``reportType``.
+    '''
+    merger = _ReportChunkMerger()
+    if ordered:
+        for _, chunkResult in _chunkResults(path, reportType, chunkRanges, workerCount, True):
+            trades, error = merger.add(chunkResult)
+            for trade in trades:
+                yield trade
+            if error is not None:
+                raise error
+    else:
+        pendingChunkResults = {}
+        nextChunkIndex = 0
+        for chunkIndex, chunkResult in _chunkResults(path, reportType, chunkRanges, workerCount, False):
+            chunkReport, _, error = chunkResult
+            if error is not None:
+                raise error
+            if chunkReport.report == u'RAWCE260':
+                # Yield the trades already closed by a later trade in the same chunk.
+                for trade in chunkReport.trades:
+                    yield trade
+                merger.tradeCount += len(chunkReport.trades)
+                chunkReport.trades = []
+            pendingChunkResults[chunkIndex] = chunkResult
+            while nextChunkIndex in pendingChunkResults:
+                trades, error = merger.add(pendingChunkResults.pop(nextChunkIndex))
+                for trade in trades:
+                    yield trade
+                if error is not None:
+                    raise error
+                nextChunkIndex += 1
+    for trade in merger.finish():
+        yield trade
+
+
+def parallelReport(path, workerCount=None, chunkSize=DefaultChunkSize):
+    '''
+    Same as ``Report(open(path, 'rb'))`` but parsed by a pool of ``workerCount`` processes (default:
+    number of CPUs) in chunks of about ``chunkSize`` bytes split at message boundaries. As with
+    `parallelTrades`, only RAWCE260 reports are split into chunks while others are read serially.
+    '''
+    reportType, chunkRanges = _reportChunkRanges(path, chunkSize)
+    if not _isChunkable(reportType):
+        with MappedFile(path) as swiftFile:
+            result = Report(swiftFile)
+    else:
+        merger = _ReportChunkMerger()
+        trades = []
+        for _, chunkResult in _chunkResults(path, reportType, chunkRanges, workerCount, True):
+            chunkTrades, error = merger.add(chunkResult)
+            if error is not None:
+                raise error
+            trades.extend(chunkTrades)
+        trades.extend(merger.finish())
+        result = merger.report
+        result.trades = trades
+    return result
+
+
+#: Pool kinds supported by `ingestReports`.
+IngestPoolKinds = ('process', 'thread')
+
+
+class IngestResult(object):
+    '''
+    Result of reading the report in the file at ``path`` with `ingestReports`:
+
+    * path: the path of the file
+    * report: the `Report` or ``None`` if it could not be read
+    * error: text describing why the report could not be read, or ``None``
+    * seconds: time spent reading the report
+    '''
+    def __init__(self, path, report, error, seconds):
+        assert path is not None
+        assert (report is None) != (error is None)
+        self.path = path
+        self.report = report
+        self.error = error
+        self.seconds = seconds
+
+    def __repr__(self):
+        return 'IngestResult(%r, %r, %r, %r)' % (
+            self.path, self.report.report if self.report is not None else None, self.error, self.seconds)
+
+
+def openSwiftFile(path):
+    '''
+    Readable for the file at ``path`` to pass to `messageItems`, `Report` and the like. Files ending
+    with ".gz" or ".bz2" are decompressed while being read.
+    '''
+    assert path is not None
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix == '.gz':
+        result = gzip.GzipFile(path, 'rb')
+    elif suffix == '.bz2':
+        result = bz2.BZ2File(path, 'rb')
+    else:
+        result = MappedFile(path)
+    return result
+
+
+def ingestPaths(source):
+    '''
+    Sorted list of the files in the folder ``source``, or matching the glob pattern ``source``, for
+    example ``'/data/swift/*.txt.gz'``.
+    '''
+    assert source is not None
+    if os.path.isdir(source):
+        result = [os.path.join(source, name) for name in os.listdir(source)]
+    else:
+        result = glob.glob(source)
+    return sorted(path for path in result if os.path.isfile(path))
+
+
+def _ingestReport(indexAndArguments):
+    '''
+    Pair ``(index, result)`` with the `IngestResult` for the report at ``path``.
+    '''
+    index, (path, reportOptions) = indexAndArguments
+    report = None
+    error = None
+    startTime = _timer()
+    try:
+        swiftFile = openSwiftFile(path)
+        try:
+            report = Report(swiftFile, **reportOptions)
+        finally:
+            swiftFile.close()
+    except (EnvironmentError, Error) as readError:
+        error = _Text(readError)
+    return (index, IngestResult(path, report, error, _timer() - startTime))
+
+
+def _throttled(items, semaphore, stopped):
+    '''
+    Yield ``items`` but each only after acquiring ``semaphore``, and stop once the event ``stopped``
+    is set.
+    '''
+    for item in items:
+        semaphore.acquire()
+        if stopped.is_set():
+            break
+        yield item
+
+
+def ingestReports(source, workerCount=None, pool='process', ordered=False, maxInFlight=None, **reportOptions):
+    '''
+    `IngestResult` for each report in the files specified by ``source``, which is either a list of
+    paths or a folder or glob pattern as described in `ingestPaths`. The reports are read by a pool
+    of ``workerCount`` processes or threads (default: number of CPUs) depending on ``pool``, which is
+    one of `IngestPoolKinds`. ``reportOptions`` are passed on to `Report`, for example
+    ``strictAmounts=True``.
+
+    Results are yielded as soon as their report is read, or in the order of the paths if ``ordered``
+    is ``True``. To limit memory usage, at most ``maxInFlight`` (default: twice the number of workers)
+    reports are read or waiting to be yielded at the same time.
+
+    A ``quarantine`` or ``stats`` requires a pool of threads because processes would fill copies of
+    them that are lost afterwards.
+
+    Example::
+
+        for result in ingestReports('/data/swift/*.txt.gz', ordered=True):
+            if result.error is None:
+                print(result.path, len(result.report.trades))
+    '''
+    assert source is not None
+    assert (workerCount is None) or (workerCount > 0)
+    assert pool in IngestPoolKinds, u'pool=%r' % pool
+    assert (maxInFlight is None) or (maxInFlight > 0)
+    if (pool == 'process') and _hasCollectingOptions(reportOptions):
+        raise ValueError(u'quarantine and stats must be used with a pool of threads instead of processes')
+
+    if isinstance(source, _StringTypes):
+        paths = ingestPaths(source)
+    else:
+        paths = list(source)
+    return _ingestResults(paths, workerCount, pool, ordered, maxInFlight, reportOptions)
+
+
+def _ingestResults(paths, workerCount, pool, ordered, maxInFlight, reportOptions):
+    '''
+    Same as `ingestReports` but for a list of ``paths`` and without checking the arguments.
+    '''
+    if workerCount is None:
+        workerCount = multiprocessing.cpu_count()
+    if maxInFlight is None:
+        maxInFlight = 2 * workerCount
+    inFlight = threading.Semaphore(maxInFlight)
+    stopped = threading.Event()
+    arguments = _throttled(enumerate((path, reportOptions) for path in paths), inFlight, stopped)
+    if pool == 'process':
+        workerPool = multiprocessing.Pool(workerCount)
+    else:
+        workerPool = multiprocessing.pool.ThreadPool(workerCount)
+    try:
+        if ordered:
+            indexedResults = workerPool.imap(_ingestReport, arguments)
+        else:
+            indexedResults = workerPool.imap_unordered(_ingestReport, arguments)
+        for _, result in indexedResults:
+            inFlight.release()
+            yield result
+        workerPool.close()
+    finally:
+        # Wake up the pool in case it waits for the next arguments.
+        stopped.set()
+        inFlight.release()
+        workerPool.terminate()
+        workerPool.join()
+
+
+def ingestMain(arguments=None):
+    '''
+    Command line interface to read many reports at once and print a line for each with the path,
+    report type, number of trades, seconds and error. The result is the exit code, which is 1 if any
+    report could not be read.
+    '''
+    if arguments is None:
+        arguments = sys.argv[1:]
+    parser = optparse.OptionParser(
+        usage='%prog [options] FOLDER_OR_PATTERN...',
+        description='read the SWIFT reports in the files in FOLDER or matching PATTERN',
+        version='%prog ' + __version__)
+    parser.add_option(
+        '-w', '--workers', type='int', metavar='COUNT', dest='workerCount',
+        help='number of reports to read at the same time (default: number of CPUs)')
+    parser.add_option(
+        '-p', '--pool', choices=IngestPoolKinds, default='process',
+        help='kind of workers: %s (default: %%default)' % ', '.join(IngestPoolKinds))
+    parser.add_option(
+        '-m', '--max-in-flight', type='int', metavar='COUNT', dest='maxInFlight',
+        help='maximum number of reports to keep in memory (default: twice the number of workers)')
+    parser.add_option(
+        '-o', '--ordered', action='store_true', help='print results in the order of the paths')
+    options, others = parser.parse_args(arguments)
+    if not others:
+        parser.error('FOLDER or PATTERN must be specified')
+    if (options.workerCount is not None) and (options.workerCount < 1):
+        parser.error('number of workers must be at least 1')
+    if (options.maxInFlight is not None) and (options.maxInFlight < 1):
+        parser.error('maximum number of reports in memory must be at least 1')
+    paths = []
+    for source in others:
+        paths.extend(ingestPaths(source))
+    result = 0
+    for ingestResult in ingestReports(
+            paths, options.workerCount, options.pool, options.ordered, options.maxInFlight):
+        if ingestResult.error is None:
+            report = ingestResult.report
+            line = u'%s\t%s\t%d\t%.3f\t' % (
+                ingestResult.path, report.report, len(getattr(report, 'trades', ())), ingestResult.seconds)
+        else:
+            line = u'%s\t\t\t%.3f\t%s' % (ingestResult.path, ingestResult.seconds, ingestResult.error)
+            result = 1
+        if _Text is not str:
+            # Python 2 writes bytes to stdout.
+            line = line.encode('utf-8')
+        sys.stdout.write(line)
+        sys.stdout.write('\n')
+    return result
+
+
+#: Maximum number of bytes a `ReportCache` uses unless specified otherwise.
+DefaultReportCacheSize = 256 * 1024 * 1024
+
+#: Suffix of the files a `ReportCache` stores reports in.
+ReportCacheSuffix = '.report'
+
+# Version of the format of cached reports; change it whenever `Report` changes its attributes.
+_ReportCacheFormatVersion = 3
+_ReportCacheHeader = b'swiftmess-report'
+
+
+class ReportCache(object):
+    '''
+    Cache for reports stored in ``folder`` so files read before do not have to be parsed again.
+    Reports are identified by a hash of the content of their file, the options passed to `Report`
+    and the version and source code of swiftmess, so changing a file or the parser automatically
+    ignores previously cached reports.
+
+    Reports are stored as compressed pickles. Once the files in the cache take more than ``maxSize``
+    bytes, the least recently used ones are removed.
+
+    Reports read with a ``quarantine`` or ``stats`` are never cached because these have to be
+    filled by actually parsing the file.
+
+    Example::
+
+        cache = ReportCache('/var/cache/swiftmess')
+        report = cache.report('statement.txt.gz')
+    '''
+    def __init__(self, folder, maxSize=DefaultReportCacheSize):
+        assert folder is not None
+        assert maxSize >= 0
+        self.folder = folder
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+
+    def key(self, path, **reportOptions):
+        '''
+        Key identifying the report for the file at ``path`` read using ``reportOptions``, which must
+        not contain a quarantine or stats.
+        '''
+        assert path is not None
+        if _hasCollectingOptions(reportOptions):
+            raise ValueError(u'report read with quarantine or stats must not be cached')
+        contentHash = hashlib.sha1()
+        contentHash.update(repr((
+            __version__, _ReportCacheFormatVersion, _moduleSourceHash(), _cacheKeyValue(reportOptions))).encode('utf-8'))
+        with open(path, 'rb') as fileToHash:
+            data = fileToHash.read(DefaultBufferSize)
+            while data:
+                contentHash.update(data)
+                data = fileToHash.read(DefaultBufferSize)
+        return contentHash.hexdigest()
+
+    def _cachePath(self, key):
+        return os.path.join(self.folder, key + ReportCacheSuffix)
+
+    def get(self, key):
+        '''
+        The cached `Report` for ``key`` or ``None`` if there is none.
+        '''
+        assert key is not None
+        result = None
+        cachePath = self._cachePath(key)
+        try:
+            with open(cachePath, 'rb') as cacheFile:
+                data = cacheFile.read()
+        except EnvironmentError:
+            data = None
+        if data is not None:
+            header = _ReportCacheHeader + b'\0' + str(_ReportCacheFormatVersion).encode('ascii') + b'\0'
+            if data.startswith(header):
+                try:
+                    result = pickle.loads(zlib.decompress(data[len(header):]))
+                except Exception as error:
+                    _log.warning(u'cannot read cached report "%s": %s', cachePath, error)
+            if result is None:
+                _removeIfExists(cachePath)
+            else:
+                # Remember the access for the eviction of the least recently used reports.
+                os.utime(cachePath, None)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    def put(self, key, report):
+        '''
+        Store ``report`` for ``key`` and remove the least recently used reports if the cache takes
+        more than ``maxSize`` bytes.
+        '''
+        assert key is not None
+        assert report is not None
+        header = _ReportCacheHeader + b'\0' + str(_ReportCacheFormatVersion).encode('ascii') + b'\0'
+        _writeFileAtomically(self._cachePath(key), header + zlib.compress(pickle.dumps(report, 2)))
+        self.evict()
+
+    def evict(self):
+        '''
+        Remove the least recently used reports until the cache takes at most ``maxSize`` bytes.
+        '''
+        entries = []
+        totalSize = 0
+        for name in os.listdir(self.folder):
+            if name.endswith(ReportCacheSuffix):
+                cachePath = os.path.join(self.folder, name)
+                try:
+                    status = os.stat(cachePath)
+                except EnvironmentError:
+                    # Another process removed the file meanwhile.
+                    continue
+                entries.append((status.st_mtime, cachePath, status.st_size))
+                totalSize += status.st_size
+        entries.sort()
+        for _, cachePath, size in entries:
+            if totalSize <= self.maxSize:
+                break
+            _removeIfExists(cachePath)
+            totalSize -= size
+
+    def report(self, path, **reportOptions):
+        '''
+        The `Report` for the file at ``path``, which is read using `openSwiftFile` and ``reportOptions``
+        unless it has been cached already. With a quarantine or stats, the cache is bypassed.
+        '''
+        if _hasCollectingOptions(reportOptions):
+            result = _readReport(path, reportOptions)
+        else:
+            key = self.key(path, **reportOptions)
+            result = self.get(key)
+            if result is None:
+                result = _readReport(path, reportOptions)
+                self.put(key, result)
+        return result
+
+
+def _moduleSourceHash():
+    '''
+    Hash of the source code of this module, which changes with every change to the parser.
+    '''
+    global _sourceHash
+    if _sourceHash is None:
+        # Python 2 can report the compiled module as __file__.
+        sourcePath = os.path.splitext(__file__)[0] + '.py'
+        try:
+            with open(sourcePath, 'rb') as sourceFile:
+                _sourceHash = hashlib.sha1(sourceFile.read()).hexdigest()
+        except EnvironmentError as error:
+            _log.warning(u'cannot read source "%s" for report cache keys: %s', sourcePath, error)
+            _sourceHash = ''
+    return _sourceHash
+
+
+_sourceHash = None
+
+
+def _cacheKeyValue(value):
+    '''
+    ``value`` with dictionaries and sets turned into sorted tuples so its ``repr()`` is the same in
+    every process even though the order of sets depends on randomized string hashes.
+    '''
+    if isinstance(value, dict):
+        result = tuple(sorted((key, _cacheKeyValue(item)) for key, item in value.items()))
+    elif isinstance(value, (set, frozenset)):
+        result = tuple(sorted((_cacheKeyValue(item) for item in value), key=repr))
+    elif isinstance(value, (list, tuple)):
+        result = tuple(_cacheKeyValue(item) for item in value)
+    else:
+        result = value
+    return result
+
+
+def _hasCollectingOptions(reportOptions):
+    '''
+    ``True`` if ``reportOptions`` contain a quarantine or stats, which are filled while parsing.
+    '''
+    return (reportOptions.get('quarantine') is not None) or (reportOptions.get('stats') is not None)
+
+
+def _readReport(path, reportOptions):
+    swiftFile = openSwiftFile(path)
+    try:
+        result = Report(swiftFile, **reportOptions)
+    finally:
+        swiftFile.close()
+    return result
+
+
+def _removeIfExists(path):
+    try:
+        os.remove(path)
+    except EnvironmentError:
+        if os.path.exists(path):
+            raise
+
+
+#: Number of trades `MessageWriter.writeRawce260()` puts in each message unless specified otherwise.
+DefaultTradesPerMessage = 100
+
+# Characters `MessageParser` would end a value at or remove from it.
+_UnwritableValueRegex = re.compile(r'[\r\n}]')
+
+
+class MessageWriter(object):
+    '''
+    Writer for SWIFT messages to ``targetFile``, which can be a binary or text file. Reading the
+    written messages using `messageItems` yields the same items they were written from.
+
+    Text written to a binary file is encoded using ``encoding``, which has to be used to read it
+    too; by default characters that ISO-8859-1 cannot represent are escaped. Lines end with
+    ``lineSeparator``.
+
+    Messages are collected in memory and written in parts of about ``bufferSize`` characters, so
+    writing many small messages needs few calls to ``targetFile.write()``. Call `close()` or use
+    ``with`` to write the rest; ``targetFile`` itself remains open.
+
+    Example::
+
+        with open('replay.txt', 'wb') as replayFile:
+            with MessageWriter(replayFile) as writer:
+                writer.writeMessage(
+                    'F01BANKBEBBAXXX2222123456', 'I598BANKDEFFXXXXN',
+                    [('20', '9999000001'), ('77E', ['/TREF XXXXXXXXXXXXXXXX', '/TRNA RAWCE260'])])
+    '''
+    def __init__(self, targetFile, encoding=None, lineSeparator='\n', bufferSize=DefaultBufferSize):
+        assert targetFile is not None
+        assert lineSeparator in ('\n', '\r\n')
+        assert bufferSize > 0
+        self._targetFile = targetFile
+        self._encoding = encoding
+        self._lineSeparator = lineSeparator
+        self._bufferSize = bufferSize
+        self._parts = []
+        self._partsSize = 0
+        # State of `writeItems()`: the number of open blocks, whether values can follow, whether the
+        # last value still has to be ended, and whether the value of a field has to follow.
+        self._level = 0
+        self._isInLine = False
+        self._hasOpenValue = False
+        self._hasOpenField = False
+
+    def _write(self, text):
+        self._parts.append(text)
+        self._partsSize += len(text)
+        if self._partsSize >= self._bufferSize:
+            self.flush()
+
+    def flush(self):
+        '''
+        Write the messages collected so far to the target file.
+        '''
+        if self._parts:
+            text = ''.join(self._parts)
+            self._parts = []
+            self._partsSize = 0
+            if (self._encoding is not None) and not isinstance(self._targetFile, io.TextIOBase):
+                data = text.encode(self._encoding)
+            else:
+                data = _dataFor(self._targetFile, text)
+            self._targetFile.write(data)
+
+    def close(self):
+        '''
+        Close the blocks still open and write the rest of the messages to the target file.
+        '''
+        self._closeBlocks(0)
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exceptionType, exceptionValue, traceback):
+        if exceptionType is None:
+            self.close()
+
+    def _closeBlocks(self, level):
+        while self._level > level:
+            # A '}' also ends an open value.
+            self._hasOpenValue = False
+            self._write('}')
+            self._level -= 1
+            self._isInLine = False
+
+    def _endOpenValue(self):
+        if self._hasOpenValue:
+            self._write(self._lineSeparator)
+            self._hasOpenValue = False
+
+    def _checkInLine(self, level, kind, value):
+        if not self._isInLine or (level != self._level):
+            raise Error(u'%s %r at level %d must follow a block, field or value at the same level' % (
+                kind, value, level))
+
+    def writeItems(self, items):
+        '''
+        Write ``items`` of the form ``(level, kind, value)`` as yielded by `messageItems`. Blocks are
+        closed as soon as an item follows at a lower level; use `close()` to close the remaining ones.
+        '''
+        assert items is not None
+        for level, kind, value in items:
+            if self._hasOpenField and ((kind != 'value') or (level != self._level)):
+                raise Error(u'field must be followed by its value but found %s %r at level %d' % (kind, value, level))
+            if kind == 'value':
+                self._checkInLine(level, kind, value)
+                if self._hasOpenField:
+                    self._write(_writableValue(value))
+                    self._hasOpenField = False
+                    self._hasOpenValue = True
+                else:
+                    self._endOpenValue()
+                    if value:
+                        self._write(_writableLine(value))
+                        self._hasOpenValue = True
+                    else:
+                        self._write(self._lineSeparator)
+            elif kind == 'field':
+                self._checkInLine(level, kind, value)
+                self._endOpenValue()
+                self._write(':' + _writableFieldKey(value) + ':')
+                self._hasOpenField = True
+            elif kind == 'block':
+                if not (1 <= level <= self._level + 1):
+                    raise Error(u'block %r at level %d must be nested in a block at level %d' % (value, level, level - 1))
+                if (value < 0) or (value != int(value)):
+                    raise Error(u'block id must be a non-negative integer: %r' % value)
+                self._closeBlocks(level - 1)
+                self._endOpenValue()
+                self._write('{%d:' % value)
+                self._level = level
+                self._isInLine = True
+            elif kind == 'message':
+                if level != 0:
+                    raise Error(u'message must end at level 0 instead of %d' % level)
+                self._closeBlocks(0)
+                self._write(self._lineSeparator)
+            else:
+                raise Error(u'kind of item must be one of: block, field, message, value; but is: %r' % kind)
+
+    def writeMessage(self, basicHeader, applicationHeader, fields, userHeader=None):
+        '''
+        Write a message with the text ``basicHeader`` in block 1, ``applicationHeader`` in block 2,
+        the tags in ``userHeader`` in block 3 and ``fields`` in block 4:
+
+        * userHeader: map of the tags to their value, for example ``{108: 'MUR'}``; if it is ``None``,
+          block 3 is omitted
+        * fields: pairs ``(field, values)`` where ``values`` is either the text of a single line or a
+          sequence of lines
+
+        Block 4 ends with a line containing '-' as usual.
+        '''
+        assert basicHeader is not None
+        assert applicationHeader is not None
+        assert fields is not None
+        if self._level != 0:
+            raise Error(u'blocks written by writeItems() must be closed before writing a message')
+        lineSeparator = self._lineSeparator
+        parts = ['{1:', _writableLine(basicHeader), '}{2:', _writableLine(applicationHeader), '}']
+        if userHeader is not None:
+            parts.append('{3:')
+            for tag, value in sorted(userHeader.items()):
+                parts.append('{%d:%s}' % (tag, _writableLine(value)))
+            parts.append('}')
+        parts.append('{4:')
+        parts.append(lineSeparator)
+        for field, values in fields:
+            if isinstance(values, _StringTypes):
+                values = (values,)
+            parts.append(':' + _writableFieldKey(field) + ':')
+            if values:
+                parts.append(_writableValue(values[0]))
+                for line in values[1:]:
+                    parts.append(lineSeparator)
+                    parts.append(_writableLine(line))
+            parts.append(lineSeparator)
+        parts.append(_MessageEndLine + '}')
+        parts.append(lineSeparator)
+        self._write(''.join(parts))
+
+    def writeRawce260(
+            self, basicHeader, applicationHeader, trades, safekeepingAccount=None, financialInstrument=None,
+            tradesPerMessage=DefaultTradesPerMessage, userHeader=None):
+        '''
+        Write a RAWCE260 report with ``trades`` in messages of up to ``tradesPerMessage`` trades each
+        using the headers described in `writeMessage()`. The first message contains the text of the
+        ``safekeepingAccount`` and the lines of the ``financialInstrument`` if they are specified.
+
+        ``trades`` can be any iterable of `Trade` or `TradeRow`, for example a generator creating them
+        while they are written. Reading the report yields the same trades except for the price in
+        field 94B::PRIC, which is not part of a `Trade` and therefore written empty.
+
+        Example::
+
+            report = Report(statementFile)
+            with MessageWriter(replayFile) as writer:
+                writer.writeRawce260(
+                    'F01BANKBEBBAXXX2222123456', 'I598BANKDEFFXXXXN', report.trades,
+                    report.safekeepingAccount, report.financialInstrument)
+        '''
+        assert trades is not None
+        assert tradesPerMessage >= 1
+        reportFields = []
+        if safekeepingAccount is not None:
+            reportFields.append(('97A', ':SAFE//' + safekeepingAccount))
+        if financialInstrument is not None:
+            reportFields.append(('35B', financialInstrument))
+        messageNumber = 0
+        fields = []
+        tradeCount = 0
+        for trade in trades:
+            fields.extend(_ce260TradeFields(trade))
+            tradeCount += 1
+            if tradeCount == tradesPerMessage:
+                messageNumber += 1
+                self._writeCe260Message(basicHeader, applicationHeader, userHeader, messageNumber, reportFields + fields)
+                reportFields = []
+                fields = []
+                tradeCount = 0
+        if (tradeCount > 0) or (messageNumber == 0):
+            # Without trades, still write the report so reading it reports the missing trades.
+            self._writeCe260Message(basicHeader, applicationHeader, userHeader, messageNumber + 1, reportFields + fields)
+
+    def _writeCe260Message(self, basicHeader, applicationHeader, userHeader, messageNumber, fields):
+        messageFields = [
+            ('20', '%016d' % messageNumber),
+            ('12', '%03d' % (messageNumber % 1000)),
+            ('77E', _TrnaMarker + ' RAWCE260'),
+        ]
+        messageFields.extend(fields)
+        self.writeMessage(basicHeader, applicationHeader, messageFields, userHeader)
+
+
+def _writableValue(value):
+    '''
+    ``value`` after checking `MessageParser` would read it as a single value.
+    '''
+    if _UnwritableValueRegex.search(value) is not None:
+        raise Error(u'value to write must not contain carriage return, newline or "}": %r' % value)
+    return value
+
+
+def _writableLine(line):
+    '''
+    Same as `_writableValue` but for a value at the start of a line, which must not start a field or
+    block.
+    '''
+    if line[:1] in (':', '{'):
+        raise Error(u'line to write must not start with ":" or "{": %r' % line)
+    return _writableValue(line)
+
+
+def _writableFieldKey(field):
+    if (':' in field) or ('\r' in field):
+        raise Error(u'field to write must not contain ":" or carriage return: %r' % field)
+    return field
+
+
+def _swiftDateText(value):
+    '''
+    ``value`` in SWIFT format, for example date(2005, 11, 28) --> '20051128'.
+    '''
+    return '%04d%02d%02d' % (value.year, value.month, value.day)
+
+
+def _swiftAmountText(value):
+    '''
+    ``value`` in SWIFT format, for example Decimal('1234.50') --> '1234,50'.
+    '''
+    integral, _, fraction = '{0:f}'.format(value).partition('.')
+    return integral + ',' + fraction
+
+
+def _ce260TradeFields(trade):
+    '''
+    Pairs ``(field, values)`` for the fields of a RAWCE260 report from which `Report` reads ``trade``.
+    '''
+    result = [('94B', ':PRIC//')]
+    if trade.tradeLocation is not None:
+        result.append(('94B', ':TRAD//EXCH/' + trade.tradeLocation))
+    if trade.tradeDate is not None:
+        result.append(('98A', ':TRAD//' + _swiftDateText(trade.tradeDate)))
+    if trade.settlementDate is not None:
+        result.append(('98A', ':SETT//' + _swiftDateText(trade.settlementDate)))
+    if trade.tradeNumber is not None:
+        # Trade references start with the trade date, which is skipped when reading the trade number.
+        tradeDateText = _swiftDateText(trade.tradeDate) if trade.tradeDate is not None else '00000000'
+        result.append(('20C', ':TRRF//' + tradeDateText + trade.tradeNumber))
+    if trade.nominal is not None:
+        result.append(('36B', ':PSTA//' + _FamtMarker + _swiftAmountText(trade.nominal)))
+    for qualifier, currencyAndAmount in (('ACRU', trade.accrInterest), ('PSTA', trade.tradeSettlement)):
+        if currencyAndAmount is not None:
+            currency, amount = currencyAndAmount
+            result.append(('19A', ':%s//%s%s' % (qualifier, currency, _swiftAmountText(amount))))
+    details = []
+    for name, attributeName in TransactionDetailAttributeNames:
+        value = getattr(trade, attributeName)
+        if value is not None:
+            if '/' in value:
+                raise Error(u'transaction detail %s to write must not contain "/": %r' % (name, value))
+            details.append(name + ' ' + value)
+    detailLines = [' /'.join(details[lineIndex:lineIndex + 3]) for lineIndex in _range(0, max(len(details), 1), 3)]
+    # Field 70E is always written last so the line ending the message cannot end up in another field.
+    result.append(('70E', [_TransactionDetailsHeader + detailLines[0]] + ['/' + line for line in detailLines[1:]]))
+    return result
+
+
+#: Number of trades exporters convert and write at once.
+DefaultExportBatchSize = 10000
+
+#: Formats supported by `exportTrades`.
+ExportFormats = ('arrow', 'csv', 'parquet')
+
+# Precision and scale of decimals in Arrow and Parquet files.
+_ArrowDecimalPrecision = 38
+_ArrowDecimalScale = 10
+_ArrowDecimalQuantum = decimal.Decimal(1).scaleb(-_ArrowDecimalScale)
+_ArrowDecimalContext = decimal.Context(prec=_ArrowDecimalPrecision, rounding=decimal.ROUND_HALF_EVEN)
+
+
+def _exportColumnNames():
+    result = []
+    for name in TradeAttributeNames:
+        if name in _TradeCurrencyAndAmountNames:
+            result.append(name + 'Currency')
+            result.append(name + 'Amount')
+        else:
+            result.append(name)
+    return tuple(result)
+
+
+#: Names of the columns written by the exporters: the attributes of `Trade` with ``(currency, amount)``
+#: tuples split into two columns ending in "Currency" and "Amount".
+ExportColumnNames = _exportColumnNames()
+
+
+def _exportRow(trade):
+    result = []
+    for name in TradeAttributeNames:
+        value = getattr(trade, name)
+        if name in _TradeCurrencyAndAmountNames:
+            if value is None:
+                result.append(None)
+                result.append(None)
+            else:
+                result.extend(value)
+        else:
+            result.append(value)
+    return result
+
+
+def _batches(trades, batchSize):
+    '''
+    Lists of up to ``batchSize`` export rows for ``trades``.
+    '''
+    assert batchSize > 0
+    batch = []
+    for trade in trades:
+        batch.append(_exportRow(trade))
+        if len(batch) == batchSize:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _csvText(value):
+    if value is None:
+        result = ''
+    elif isinstance(value, date):
+        result = value.isoformat()
+    elif _StrIsBytes and isinstance(value, _Text):
+        result = value.encode('utf-8')
+    else:
+        result = str(value)
+    return result
+
+
+def _openCsvForWriting(path):
+    '''
+    File at ``path`` opened as the ``csv`` module of the current Python version requires.
+    '''
+    if _StrIsBytes:
+        result = open(path, 'wb')
+    else:
+        result = io.open(path, 'w', encoding='utf-8', newline='')
+    return result
+
+
+def writeTradesCsv(trades, csvFile, batchSize=DefaultExportBatchSize):
+    '''
+    Write ``trades`` to ``csvFile`` with a header containing `ExportColumnNames`. Dates are written in
+    ISO format, text in UTF-8 and missing values as empty text. With Python 2, ``csvFile`` has to
+    be opened in binary mode, with Python 3 in text mode using ``newline=''``.
+    '''
+    assert trades is not None
+    assert csvFile is not None
+
+    csvWriter = csv.writer(csvFile)
+    csvWriter.writerow(ExportColumnNames)
+    for batch in _batches(trades, batchSize):
+        csvWriter.writerows([[_csvText(value) for value in row] for row in batch])
+
+
+def _arrowSchema(pyarrow):
+    fields = []
+    for name in ExportColumnNames:
+        if name in _TradeDateNames:
+            arrowType = pyarrow.date32()
+        elif (name in _TradeDecimalNames) or name.endswith('Amount'):
+            arrowType = pyarrow.decimal128(_ArrowDecimalPrecision, _ArrowDecimalScale)
+        else:
+            arrowType = pyarrow.string()
+        fields.append(pyarrow.field(name, arrowType))
+    return pyarrow.schema(fields)
+
+
+def _arrowDecimal(value):
+    '''
+    ``value`` rounded to the scale of the Arrow decimal columns.
+    '''
+    if value is not None:
+        value = value.quantize(_ArrowDecimalQuantum, context=_ArrowDecimalContext)
+    return value
+
+
+def _exportColumns(tradeColumns, start, end):
+    '''
+    Lists with the values of each column in `ExportColumnNames` for the trades from ``start`` to
+    ``end`` in the `TradeColumns` ``tradeColumns``, taken from its columns without building an
+    object for each trade.
+    '''
+    result = []
+    for name in TradeAttributeNames:
+        column = tradeColumns._columns[name]
+        if name in _TradeCurrencyAndAmountNames:
+            result.append(column._currencies[start:end])
+            result.append(column._amounts.values(start, end))
+        else:
+            result.append(tradeColumns.column(name, start, end))
+    return result
+
+
+def _columnBatches(trades, batchSize):
+    '''
+    Lists with the values of each column in `ExportColumnNames` for up to ``batchSize`` of ``trades``.
+    '''
+    assert batchSize > 0
+    if isinstance(trades, TradeColumns):
+        tradeCount = len(trades)
+        for start in _range(0, tradeCount, batchSize):
+            yield _exportColumns(trades, start, min(start + batchSize, tradeCount))
+    else:
+        columnIndices = _range(len(ExportColumnNames))
+        for batch in _batches(trades, batchSize):
+            yield [[row[columnIndex] for row in batch] for columnIndex in columnIndices]
+
+
+def _arrowRecordBatch(pyarrow, schema, columnBatch):
+    columns = []
+    for field, values in zip(schema, columnBatch):
+        if pyarrow.types.is_decimal(field.type):
+            values = [_arrowDecimal(value) for value in values]
+        columns.append(pyarrow.array(values, type=field.type))
+    return pyarrow.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def writeTradesArrow(trades, targetPath, format='parquet', batchSize=DefaultExportBatchSize):
+    '''
+    Write ``trades`` to a file at ``targetPath`` in ``format``, which can be 'parquet' or 'arrow'
+    (the Arrow IPC file format). The columns are named after `ExportColumnNames` and use Arrow types
+    ``date32`` for dates and ``decimal128(38, 10)`` for amounts. Amounts with more than 10 decimal
+    places are rounded half to even.
+
+    If ``trades`` is a `TradeColumns`, for example from ``Report(..., columnar=True)``, the Arrow
+    arrays are built from its columns directly.
+
+    This requires the ``pyarrow`` package.
+    '''
+    assert trades is not None
+    assert targetPath is not None
+    assert format in ('arrow', 'parquet'), u'format=%r' % format
+
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        if format == 'parquet':
+            import pyarrow.parquet
+    except ImportError as error:
+        raise Error(u'package pyarrow must be installed to write %s files: %s' % (format, error))
+    schema = _arrowSchema(pyarrow)
+    if format == 'parquet':
+        writer = pyarrow.parquet.ParquetWriter(targetPath, schema)
+
+        def writeBatch(recordBatch):
+            writer.write_table(pyarrow.Table.from_batches([recordBatch]))
+    else:
+        writer = pyarrow.ipc.new_file(targetPath, schema)
+        writeBatch = writer.write_batch
+    try:
+        for columnBatch in _columnBatches(trades, batchSize):
+            writeBatch(_arrowRecordBatch(pyarrow, schema, columnBatch))
+    finally:
+        writer.close()
+
+
+def exportTrades(sourcePath, targetPath, format=None, batchSize=DefaultExportBatchSize, quarantinePath=None):
+    '''
+    Convert the RAWCE260 report in the file at ``sourcePath`` to a file at ``targetPath`` in
+    ``format``, which is one of `ExportFormats`. By default, the format is derived from the suffix
+    of ``targetPath``. Trades are read using `ReportReader` so memory usage does not depend on the
+    size of the report.
+
+    If ``quarantinePath`` is not ``None``, messages that cannot be parsed are skipped and described in
+    a file at ``quarantinePath`` as written by `Quarantine.write()`.
+
+    The result is the number of trades written. If an error occurs, for example because the report is
+    not a RAWCE260 report, the file at ``targetPath`` is removed.
+    '''
+    assert sourcePath is not None
+    assert targetPath is not None
+
+    if format is None:
+        format = os.path.splitext(targetPath)[1].lstrip('.').lower()
+        if format not in ExportFormats:
+            raise Error(u'format must be specified because target suffix must be one of %s: %s' % (
+                ', '.join(ExportFormats), targetPath))
+    assert format in ExportFormats, u'format=%r' % format
+
+    quarantine = Quarantine() if quarantinePath is not None else None
+    with MappedFile(sourcePath) as swiftFile:
+        reader = ReportReader(swiftFile, quarantine=quarantine)
+        try:
+            if format == 'csv':
+                with _openCsvForWriting(targetPath) as csvFile:
+                    writeTradesCsv(reader, csvFile, batchSize)
+            else:
+                writeTradesArrow(reader, targetPath, format, batchSize)
+            if reader.report != u'RAWCE260':
+                raise Error(u'report type must be RAWCE260 but is: %s' % reader.report)
+        except Exception:
+            # Do not leave a truncated or empty target behind.
+            _removeIfExists(targetPath)
+            raise
+    if quarantine is not None:
+        with open(quarantinePath, 'w') as quarantineFile:
+            quarantine.write(quarantineFile)
+        if quarantine.entries:
+            _log.warning(u'quarantined %d messages in "%s"', len(quarantine), quarantinePath)
+    return reader.tradeCount
+
+
+def main(arguments=None):
+    '''
+    Command line interface to convert a RAWCE260 report to CSV, Arrow or Parquet. The result is the
+    exit code.
+    '''
+    if arguments is None:
+        arguments = sys.argv[1:]
+    parser = optparse.OptionParser(
+        usage='%prog [options] SWIFTFILE TARGETFILE',
+        description='convert the trades in RAWCE260 report SWIFTFILE to TARGETFILE',
+        version='%prog ' + __version__)
+    parser.add_option(
+        '-f', '--format', choices=ExportFormats,
+        help='format of TARGETFILE: %s (default: derived from suffix)' % ', '.join(ExportFormats))
+    parser.add_option(
+        '-b', '--batch-size', type='int', default=DefaultExportBatchSize, metavar='COUNT', dest='batchSize',
+        help='number of trades to convert at once (default: %default)')
+    parser.add_option(
+        '-q', '--quarantine', metavar='FILE',
+        help='skip messages that cannot be parsed and describe them in FILE instead of stopping')
+    options, others = parser.parse_args(arguments)
+    if len(others) != 2:
+        parser.error('SWIFTFILE and TARGETFILE must be specified')
+    if options.batchSize < 1:
+        parser.error('batch size must be at least 1')
+    sourcePath, targetPath = others
+    logging.basicConfig(level=logging.INFO)
+    try:
+        tradeCount = exportTrades(sourcePath, targetPath, options.format, options.batchSize, options.quarantine)
+        _log.info(u'wrote %d trades to "%s"', tradeCount, targetPath)
+        result = 0
+    except (EnvironmentError, Error) as error:
+        _log.error(u'cannot convert "%s": %s', sourcePath, error)
+        result = 1
+    return result
+
 
-        level, block, field, values = item
-        if (level == 1) and (block == 4):
-            if field == '19A':
-                name, value = self._slashedNameValue(item)
-                if name == 'ACRU':
-                    self._checkHasTrade(field, name)
-                    self._trade.accrInterest = self._currencyAndAmountFrom(item, name, value)
-                elif name == 'PSTA':
-                    self._checkHasTrade(field, name)
-                    self._trade.tradeSettlement = self._currencyAndAmountFrom(item, name, value)
-            elif field == '20C':
-                name, value = self._slashedNameValue(item)
-                if name == 'TRRF':
-                    self._checkHasTrade(field, name)
-                    _TradeNumberIndex = 8
-                    if len(value) <= _TradeNumberIndex:
-                        raise Error(u'trade number in %s::%s must have at least %d characters: "%s"' % (field, name, _TradeNumberIndex + 1, value))
-                    self._trade.tradeNumber = value[_TradeNumberIndex:]
-            elif field == '35B':
-                self.financialInstrument = values
-            if field == '36B':
-                name, value = self._slashedNameValue(item)
-                if name == 'PSTA':
-                    self._checkHasTrade(field, name)
-                    if value.startswith(_FamtMarker):
-                        nominalText = value[len(_FamtMarker):]
-                        try:
-                            self._trade.nominal = self._decimalFrom(item, name, nominalText)
-                        except Exception, error:
-                            raise Error(error)
-            elif field == '70E':
-                self._checkHasTrade(field)
-                transactionDetails = createTransactionDetailsNameToValueMap(item)
-                self._trade.clearingMember = transactionDetails.get('CLGM')
-                self._trade.exchangeMember = transactionDetails.get('EXCH')
-                self._trade.leg = transactionDetails.get('LN')
-                self._trade.originType = transactionDetails.get('OT')
-                self._trade.transactionType = transactionDetails.get('TYPE')
-                self._trade.ca = transactionDetails.get('CA')
-                self._trade.ccpStatus = transactionDetails.get('CCPSTAT')
-                self._trade.orderNettingType = transactionDetails.get('ORDNETT')
-                self._trade.orderNumber = transactionDetails.get('ORDNB')
-                self._trade.tradeType = transactionDetails.get('TTYP')
-            elif field == '94B':
-                name, value = self._slashedNameValue(item)
-                if name == 'PRIC':
-                    self._appendPossibleTrade()
-                    self._trade = Trade()
-                elif name == 'TRAD':
-                    self._checkHasTrade(field, name)
-                    ExchHeader = 'EXCH/'
-                    if value.startswith(ExchHeader):
-                        self._trade.tradeLocation = value[len(ExchHeader):]
-            elif field == '97A':
-                self.safekeepingAccount = self._valueFor(item, ':SAFE//')
-            elif field == '98A':
-                name, value = self._slashedNameValue(item)
-                if name == 'SETT':
-                    self._trade.settlementDate = self._dateFromIsoText(item, name, value)
-                elif name == 'TRAD':
-                    self._trade.tradeDate = self._dateFromIsoText(item, name, value)
+if __name__ == '__main__':
+    sys.exit(main())
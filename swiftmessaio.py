@@ -0,0 +1,164 @@
+'''
+Asynchronous counterparts of the swiftmess functions to read SWIFT messages from ``asyncio`` streams,
+for example sockets, without blocking the event loop.
+
+This module requires Python 3.6 or later.
+'''
+# Copyright (c) 2012, Thomas Aglassinger
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License
+# for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import codecs
+
+import swiftmess
+
+#: Encoding used to decode the bytes received unless specified otherwise.
+DefaultEncoding = 'iso-8859-1'
+
+
+async def _dataParts(stream, bufferSize):
+    '''
+    Parts of the bytes received from ``stream``, which can be an ``asyncio.StreamReader`` or any other
+    object with a coroutine ``read(size)``, or an asynchronous iterable of bytes.
+    '''
+    if hasattr(stream, 'read'):
+        data = await stream.read(bufferSize)
+        while data:
+            yield data
+            data = await stream.read(bufferSize)
+    else:
+        async for data in stream:
+            if data:
+                yield data
+
+
+async def _textParts(stream, encoding, bufferSize):
+    '''
+    Same as `_dataParts` but decoded using ``encoding``. Characters split between two parts are
+    decoded as a whole.
+    '''
+    decoder = codecs.getincrementaldecoder(encoding)()
+    async for data in _dataParts(stream, bufferSize):
+        text = decoder.decode(data)
+        if text:
+            yield text
+    text = decoder.decode(b'', True)
+    if text:
+        yield text
+
+
+async def messageItems(stream, encoding=DefaultEncoding, bufferSize=swiftmess.DefaultBufferSize, symbols=None):
+    '''
+    Same as `swiftmess.messageItems` but for the bytes received from ``stream`` as described in
+    `_dataParts`. Items are yielded as soon as the data containing them have been received, and the
+    event loop can run other tasks while waiting for more data.
+
+    If ``symbols`` is a `swiftmess.SymbolTable`, it is used to share equal field names, for example
+    between several streams.
+
+    Example::
+
+        reader, writer = await asyncio.open_connection('gateway', 1234)
+        async for level, kind, value in messageItems(reader):
+            ...
+    '''
+    assert stream is not None
+    assert encoding is not None
+    assert bufferSize > 0
+
+    parser = swiftmess.MessageParser(symbols=symbols)
+    async for text in _textParts(stream, encoding, bufferSize):
+        pendingError = None
+        try:
+            parser.feed(text)
+        except Exception as error:
+            # Items found before the error still have to be yielded.
+            pendingError = error
+        for item in parser.popItems():
+            yield item
+        if pendingError is not None:
+            raise pendingError
+    parser.close()
+
+
+async def messages(stream, encoding=DefaultEncoding, bufferSize=swiftmess.DefaultBufferSize, symbols=None):
+    '''
+    Lists of the items yielded by `messageItems` for each complete message received from ``stream``,
+    without the item of kind 'message' that ends it.
+    '''
+    itemsSoFar = []
+    async for item in messageItems(stream, encoding, bufferSize, symbols):
+        if item[1] == 'message':
+            yield itemsSoFar
+            itemsSoFar = []
+        else:
+            itemsSoFar.append(item)
+    if itemsSoFar:
+        yield itemsSoFar
+
+
+class AsyncReportReader(swiftmess.ReportReader):
+    '''
+    Same as `swiftmess.ReportReader` but for the bytes received from ``stream`` as described in
+    `_dataParts`. Each `swiftmess.Trade` is yielded by ``async for`` as soon as the next trade starts
+    or the stream ends.
+
+    Each stream needs its own reader, but many readers can run concurrently in the same event loop.
+
+    As with `swiftmess.Report`, ``tradeAttributeNames`` limits the attributes extracted from the trades
+    and ``query`` selects the trades to yield. Because the received data are tokenized as they
+    arrive, the query must not have message conditions.
+
+    Example::
+
+        async def printTrades(reader):
+            async for trade in AsyncReportReader(reader):
+                print(trade.tradeNumber)
+    '''
+    def __init__(
+            self, stream, encoding=DefaultEncoding, strictAmounts=False,
+            bufferSize=swiftmess.DefaultBufferSize, tradeAttributeNames=None, query=None):
+        if (query is not None) and query.messageConditions:
+            raise swiftmess.Error(u'query for %s must have only trade conditions' % type(self).__name__)
+        super(AsyncReportReader, self).__init__(
+            stream, strictAmounts, tradeAttributeNames=tradeAttributeNames, query=query)
+        assert encoding is not None
+        assert bufferSize > 0
+        self._encoding = encoding
+        self._bufferSize = bufferSize
+
+    def __iter__(self):
+        raise TypeError(u'trades of %s must be read using "async for"' % type(self).__name__)
+
+    async def __aiter__(self):
+        assert self._messageToRead is not None, u'trades must be read only once'
+        stream = self._messageToRead
+        self._messageToRead = None
+        parser = swiftmess.MessageParser(symbols=self._report.symbols)
+        structurer = swiftmess._ItemStructurer()
+        async for text in _textParts(stream, self._encoding, self._bufferSize):
+            pendingError = None
+            try:
+                parser.feed(text)
+            except Exception as error:
+                # Trades found before the error still have to be yielded.
+                pendingError = error
+            for trade in self._processedTrades(structurer.structure(parser.popItems())):
+                yield trade
+            if pendingError is not None:
+                raise pendingError
+        parser.close()
+        for trade in self._processedTrades(structurer.close()):
+            yield trade
+        for trade in self._remainingTrades():
+            yield trade
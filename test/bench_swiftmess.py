@@ -0,0 +1,247 @@
+'''
+Benchmarks for `swiftmess` measuring throughput and peak memory of `messageItems`,
+`structuredItems` and `Report` on a synthetic RAWCE260 report created by `swiftgen`.
+
+The benchmark pythonMessageItems runs `messageItems` without the C extension ``_swiftmess`` to
+measure its speedup.
+
+Examples::
+
+  $ python test/bench_swiftmess.py --messages 2000 --trades 50 --output bench_0.2.json
+  $ python test/bench_swiftmess.py --messages 2000 --trades 50 --compare bench_0.2.json
+'''
+# Copyright (c) 2012, Thomas Aglassinger
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License
+# for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+from __future__ import with_statement
+
+import json
+import logging
+import multiprocessing
+import optparse
+import os
+import sys
+import tempfile
+import time
+
+import swiftgen
+import swiftmess
+
+try:
+    import resource
+except ImportError:
+    # Peak memory cannot be measured on this platform.
+    resource = None
+
+_log = logging.getLogger('swift')
+
+#: Names of the available benchmarks.
+BenchmarkNames = ('messageItems', 'pythonMessageItems', 'structuredItems', 'lazyMessages', 'Report')
+
+
+def _process(benchmarkName, path):
+    with open(path, 'rb') as swiftFile:
+        if benchmarkName in ('messageItems', 'pythonMessageItems'):
+            for _ in swiftmess.messageItems(swiftFile):
+                pass
+        elif benchmarkName == 'structuredItems':
+            for _ in swiftmess.structuredItems(swiftFile):
+                pass
+        elif benchmarkName == 'lazyMessages':
+            for message in swiftmess.lazyMessages(swiftFile):
+                message.reportType
+        else:
+            assert benchmarkName == 'Report', u'benchmarkName=%r' % benchmarkName
+            swiftmess.Report(swiftFile)
+
+
+def _peakMemoryKb():
+    result = None
+    if resource is not None:
+        result = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin':
+            # Mac OS X measures in bytes instead of kilobytes.
+            result //= 1024
+    return result
+
+
+def _measure(benchmarkName, path, repeatCount, resultQueue):
+    '''
+    Put the best duration in seconds out of ``repeatCount`` runs and the peak memory of the
+    current process in ``resultQueue``.
+    '''
+    try:
+        if benchmarkName == 'pythonMessageItems':
+            # Each benchmark runs in a process of its own, so this does not affect the others.
+            swiftmess._swiftmess = None
+        bestDuration = None
+        for _ in range(repeatCount):
+            startTime = time.time()
+            _process(benchmarkName, path)
+            duration = time.time() - startTime
+            if (bestDuration is None) or (duration < bestDuration):
+                bestDuration = duration
+        resultQueue.put((bestDuration, _peakMemoryKb(), None))
+    except Exception as error:
+        resultQueue.put((None, None, str(error)))
+
+
+def _perSecond(count, duration):
+    if duration > 0:
+        result = count / duration
+    else:
+        result = None
+    return result
+
+
+def benchmark(path, benchmarkNames=BenchmarkNames, repeatCount=3):
+    '''
+    Dictionary with the results of the benchmarks ``benchmarkNames`` for the RAWCE260 report at
+    ``path``. Each benchmark runs ``repeatCount`` times in its own process, and the fastest run
+    counts.
+    '''
+    assert path is not None
+    assert repeatCount >= 1
+
+    with swiftmess.MappedFile(path) as swiftFile:
+        messageCount = len(swiftmess.buildMessageIndex(swiftFile))
+    with swiftmess.MappedFile(path) as swiftFile:
+        tradeCount = sum(1 for _ in swiftmess.ReportReader(swiftFile))
+    megabytes = os.path.getsize(path) / (1024.0 * 1024.0)
+    results = {}
+    for benchmarkName in benchmarkNames:
+        resultQueue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_measure, args=(benchmarkName, path, repeatCount, resultQueue))
+        process.start()
+        duration, peakMemoryKb, errorMessage = resultQueue.get()
+        process.join()
+        if errorMessage is not None:
+            raise swiftmess.Error(u'cannot run benchmark %s: %s' % (benchmarkName, errorMessage))
+        results[benchmarkName] = {
+            'seconds': duration,
+            'megabytesPerSecond': _perSecond(megabytes, duration),
+            'messagesPerSecond': _perSecond(messageCount, duration),
+            'tradesPerSecond': _perSecond(tradeCount, duration),
+            'peakMemoryKb': peakMemoryKb,
+        }
+    return {
+        'version': swiftmess.__version__,
+        'python': sys.version.split()[0],
+        'megabytes': megabytes,
+        'messages': messageCount,
+        'trades': tradeCount,
+        'results': results,
+    }
+
+
+def _numberText(value, format='%.1f'):
+    if value is None:
+        result = 'n/a'
+    else:
+        result = format % value
+    return result
+
+
+def _changeText(value, previousValue):
+    if (value is None) or not previousValue:
+        result = ''
+    else:
+        result = ' (%+.1f%%)' % (100.0 * (value - previousValue) / previousValue)
+    return result
+
+
+def resultLines(benchmarkResult, previousBenchmarkResult=None):
+    '''
+    Lines describing ``benchmarkResult`` and, if specified, the change compared to
+    ``previousBenchmarkResult``.
+    '''
+    yield 'swiftmess %s, Python %s, %.1f MB, %d messages, %d trades' % (
+        benchmarkResult['version'], benchmarkResult['python'], benchmarkResult['megabytes'],
+        benchmarkResult['messages'], benchmarkResult['trades'])
+    if previousBenchmarkResult is not None:
+        yield 'compared to swiftmess %s, Python %s' % (
+            previousBenchmarkResult['version'], previousBenchmarkResult['python'])
+    for benchmarkName in BenchmarkNames:
+        result = benchmarkResult['results'].get(benchmarkName)
+        if result is not None:
+            previousResult = {}
+            if previousBenchmarkResult is not None:
+                previousResult = previousBenchmarkResult['results'].get(benchmarkName, {})
+            parts = []
+            for key, unit in (
+                ('megabytesPerSecond', 'MB/s'), ('messagesPerSecond', 'messages/s'),
+                ('tradesPerSecond', 'trades/s'), ('peakMemoryKb', 'KB peak')
+            ):
+                value = result[key]
+                parts.append('%s %s%s' % (_numberText(value), unit, _changeText(value, previousResult.get(key))))
+            yield '  %-20s %s' % (benchmarkName + ':', ', '.join(parts))
+
+
+def main(arguments=None):
+    if arguments is None:
+        arguments = sys.argv[1:]
+    parser = optparse.OptionParser(
+        usage='%prog [options] [SWIFTFILE]',
+        description='benchmark swiftmess on SWIFTFILE or on a generated RAWCE260 report')
+    parser.add_option(
+        '-m', '--messages', type='int', default=1000, metavar='COUNT',
+        help='number of messages to generate (default: %default)')
+    parser.add_option(
+        '-t', '--trades', type='int', default=20, metavar='COUNT',
+        help='number of trades per generated message (default: %default)')
+    parser.add_option(
+        '-d', '--details', type='int', default=len(swiftgen.TransactionDetailNames), metavar='COUNT',
+        help='number of transaction details per generated trade (default: %default)')
+    parser.add_option('--crlf', action='store_true', help='end generated lines with CR+LF instead of LF')
+    parser.add_option(
+        '-r', '--repeat', type='int', default=3, metavar='COUNT',
+        help='number of runs per benchmark of which the fastest counts (default: %default)')
+    parser.add_option(
+        '-b', '--benchmark', action='append', choices=BenchmarkNames, dest='benchmarkNames', metavar='NAME',
+        help='benchmark to run: %s (default: all)' % ', '.join(BenchmarkNames))
+    parser.add_option('-o', '--output', metavar='FILE', help='store results in JSON FILE')
+    parser.add_option('-c', '--compare', metavar='FILE', help='compare results with JSON FILE from previous --output')
+    options, others = parser.parse_args(arguments)
+    if len(others) > 1:
+        parser.error('at most one SWIFTFILE must be specified')
+    if options.repeat < 1:
+        parser.error('number of runs must be at least 1')
+    benchmarkNames = options.benchmarkNames or BenchmarkNames
+
+    previousBenchmarkResult = None
+    if options.compare is not None:
+        with open(options.compare, 'r') as previousFile:
+            previousBenchmarkResult = json.load(previousFile)
+    if others:
+        benchmarkResult = benchmark(others[0], benchmarkNames, options.repeat)
+    else:
+        lineSeparator = '\r\n' if options.crlf else '\n'
+        swiftFileHandle, swiftPath = tempfile.mkstemp(suffix='.txt', prefix='swiftmess_bench_')
+        try:
+            with os.fdopen(swiftFileHandle, 'wb') as swiftFile:
+                swiftgen.writeRawce260(swiftFile, options.messages, options.trades, options.details, lineSeparator)
+            benchmarkResult = benchmark(swiftPath, benchmarkNames, options.repeat)
+        finally:
+            os.remove(swiftPath)
+    for line in resultLines(benchmarkResult, previousBenchmarkResult):
+        print(line)
+    if options.output is not None:
+        with open(options.output, 'w') as outputFile:
+            json.dump(benchmarkResult, outputFile, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,147 @@
+'''
+Generator for synthetic SWIFT files with RAWCE260 reports to test and benchmark `swiftmess`.
+
+Example::
+
+  $ python test/swiftgen.py --messages 1000 --trades 50 rawce260_big.txt
+'''
+# Copyright (c) 2012, Thomas Aglassinger
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License
+# for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+from __future__ import with_statement
+
+import optparse
+import random
+import sys
+
+#: Names of the transaction details in field 70E in the order they are written.
+TransactionDetailNames = ('CLGM', 'EXCH', 'LN', 'OT', 'TYPE', 'CA', 'CCPSTAT', 'ORDNETT', 'ORDNB', 'TTYP')
+
+_DetailsPerLine = 3
+_Exchanges = ('XEUR', 'XETR', 'XFRA')
+_Members = ('ABCFR', 'XYZDE', 'QRSGB', 'MNOIT')
+_TradeDates = ('20051128', '20051129', '20051130')
+_SettlementDates = ('20051130', '20051201', '20051202')
+
+
+def _amountText(amount):
+    '''
+    ``amount`` in cents formatted as SWIFT amount, for example 123456 --> '1234,56'.
+    '''
+    return '%d,%02d' % divmod(amount, 100)
+
+
+def _transactionDetailLines(randomGenerator, detailCount, orderNumber):
+    details = []
+    for name in TransactionDetailNames[:detailCount]:
+        if name in ('CLGM', 'EXCH'):
+            value = randomGenerator.choice(_Members)
+        elif name == 'ORDNB':
+            value = str(orderNumber)
+        elif name in ('CA', 'ORDNETT'):
+            value = randomGenerator.choice('NY')
+        elif name == 'OT':
+            value = randomGenerator.choice('AP')
+        else:
+            value = str(randomGenerator.randint(1, 3))
+        details.append('%s %s' % (name, value))
+    result = []
+    for lineIndex in range(0, len(details), _DetailsPerLine):
+        result.append('/' + ' /'.join(details[lineIndex:lineIndex + _DetailsPerLine]))
+    result[0] = ':70E::TRDE//' + result[0][1:]
+    return result
+
+
+def rawce260Lines(messageCount=10, tradesPerMessage=10, detailCount=len(TransactionDetailNames), seed=0):
+    '''
+    Lines of a SWIFT file with a RAWCE260 report consisting of ``messageCount`` messages with
+    ``tradesPerMessage`` trades each. Field 70E holds the first ``detailCount`` transaction details
+    of `TransactionDetailNames`. The same ``seed`` yields the same lines.
+    '''
+    assert messageCount >= 1
+    assert tradesPerMessage >= 1
+    assert 1 <= detailCount <= len(TransactionDetailNames)
+
+    randomGenerator = random.Random(seed)
+    tradeNumber = 0
+    for messageNumber in range(1, messageCount + 1):
+        yield '{1:F01XXXXXXXXXXXX0000999999}{2:O5981519051128XXXXXXXXXXXX000099999905112815 19N}{3:{108:}}{4:'
+        yield ':20:9999%010d' % messageNumber
+        yield ':12:%03d' % (messageNumber % 1000)
+        yield ':77E:/TREF XXXXXXXXXXXXXXXX'
+        yield '/TRNA RAWCE260'
+        if messageNumber == 1:
+            yield ':97A::SAFE//7000001'
+            yield ':35B:ISIN DE0001135275'
+            yield 'BUND 4,00 04.01.2037'
+        for _ in range(tradesPerMessage):
+            tradeNumber += 1
+            nominal = randomGenerator.randint(1, 1000) * 100000
+            accruedInterest = randomGenerator.randint(0, 10000000)
+            yield ':94B::PRIC//ACTU/EUR%s' % _amountText(randomGenerator.randint(9000, 11000))
+            yield ':94B::TRAD//EXCH/%s' % randomGenerator.choice(_Exchanges)
+            yield ':98A::TRAD//%s' % randomGenerator.choice(_TradeDates)
+            yield ':98A::SETT//%s' % randomGenerator.choice(_SettlementDates)
+            yield ':20C::TRRF//20051128%06d' % tradeNumber
+            yield ':36B::PSTA//FAMT/%d,' % nominal
+            yield ':19A::ACRU//EUR%s' % _amountText(accruedInterest)
+            yield ':19A::PSTA//EUR%s' % _amountText(nominal * 100 + accruedInterest)
+            for line in _transactionDetailLines(randomGenerator, detailCount, 10000 + tradeNumber):
+                yield line
+        yield '-}'
+
+
+def writeRawce260(
+        targetFile, messageCount=10, tradesPerMessage=10, detailCount=len(TransactionDetailNames),
+        lineSeparator='\n', seed=0):
+    '''
+    Write a RAWCE260 report as described by `rawce260Lines()` to ``targetFile``, which should be
+    opened in binary mode, using ``lineSeparator`` to end lines.
+    '''
+    assert targetFile is not None
+    assert lineSeparator in ('\n', '\r\n')
+    for line in rawce260Lines(messageCount, tradesPerMessage, detailCount, seed):
+        targetFile.write((line + lineSeparator).encode('ascii'))
+
+
+def main(arguments=None):
+    if arguments is None:
+        arguments = sys.argv[1:]
+    parser = optparse.OptionParser(
+        usage='%prog [options] TARGETFILE', description='write a synthetic RAWCE260 report to TARGETFILE')
+    parser.add_option(
+        '-m', '--messages', type='int', default=10, metavar='COUNT', help='number of messages (default: %default)')
+    parser.add_option(
+        '-t', '--trades', type='int', default=10, metavar='COUNT',
+        help='number of trades per message (default: %default)')
+    parser.add_option(
+        '-d', '--details', type='int', default=len(TransactionDetailNames), metavar='COUNT',
+        help='number of transaction details per trade in field 70E, 1 to %d (default: %%default)' % len(TransactionDetailNames))
+    parser.add_option('--crlf', action='store_true', help='end lines with CR+LF instead of LF')
+    parser.add_option('-s', '--seed', type='int', default=0, help='seed for random values (default: %default)')
+    options, others = parser.parse_args(arguments)
+    if len(others) != 1:
+        parser.error('TARGETFILE must be specified')
+    if (options.messages < 1) or (options.trades < 1):
+        parser.error('number of messages and trades must be at least 1')
+    if not (1 <= options.details <= len(TransactionDetailNames)):
+        parser.error('number of details must be between 1 and %d' % len(TransactionDetailNames))
+    lineSeparator = '\r\n' if options.crlf else '\n'
+    with open(others[0], 'wb') as targetFile:
+        writeRawce260(targetFile, options.messages, options.trades, options.details, lineSeparator, options.seed)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
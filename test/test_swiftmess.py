@@ -16,30 +16,110 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from __future__ import with_statement
 
+import bz2
+import csv
+import gzip
+import io
 import logging
+import mmap
 import os
+import pickle
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
 import unittest
+
+import swiftgen
 import swiftmess
+from datetime import date, datetime
+from decimal import Decimal
 
 _log = logging.getLogger('swift')
 
 
+# Text type that differs between Python 2 and 3.
+try:
+    _Text = unicode
+except NameError:
+    _Text = str
+
+
+def _readable(data):
+    '''
+    Readable for ``data``, which can be bytes or text.
+    '''
+    if isinstance(data, bytes):
+        result = io.BytesIO(data)
+    else:
+        result = io.StringIO(data)
+    return result
+
+
+def _openCsvForReading(path):
+    if bytes is str:
+        result = open(path, 'rb')
+    else:
+        result = io.open(path, 'r', encoding='utf-8', newline='')
+    return result
+
+
 def _testFilePath(name):
     basePath = os.path.dirname(__file__)
     return os.path.join(basePath, name)
 
 
+def _testFileData(name):
+    with open(_testFilePath(name), 'rb') as testFile:
+        result = testFile.read()
+    return result
+
+
+def _importOrSkip(moduleName):
+    '''
+    Module ``moduleName`` or skip the test if it cannot be imported. Same as
+    ``pytest.importorskip()`` but also works when running the tests with unittest.
+    '''
+    try:
+        __import__(moduleName)
+    except ImportError as error:
+        raise unittest.SkipTest(u'module %s must be installed: %s' % (moduleName, error))
+    return sys.modules[moduleName]
+
+
+def _runCommandLine(function, arguments):
+    '''
+    Exit code of the command line interface ``function`` for ``arguments`` and the text it wrote to
+    stdout, leaving ``sys.stdout`` and the root logger as they were.
+    '''
+    rootLogger = logging.getLogger()
+    originalHandlers = list(rootLogger.handlers)
+    originalLevel = rootLogger.level
+    originalStdout = sys.stdout
+    # Python 2 writes bytes to stdout.
+    sys.stdout = io.BytesIO() if str is bytes else io.StringIO()
+    try:
+        exitCode = function(arguments)
+        output = sys.stdout.getvalue()
+    finally:
+        sys.stdout = originalStdout
+        rootLogger.handlers[:] = originalHandlers
+        rootLogger.setLevel(originalLevel)
+    return (exitCode, output)
+
+
 class TestSwiftmess(unittest.TestCase):
 
     def testCanReadMessageItems(self):
         ExpectedItems = [
-            (1, 'block', 1L),
+            (1, 'block', 1),
             (1, 'value', 'F01XXXXXXXXXXXX0000999999'),
-            (1, 'block', 2L),
+            (1, 'block', 2),
             (1, 'value', 'O5981519051128XXXXXXXXXXXX000099999905112815 19N'),
-            (1, 'block', 3L),
-            (2, 'block', 108L),
-            (1, 'block', 4L),
+            (1, 'block', 3),
+            (2, 'block', 108),
+            (1, 'block', 4),
             (1, 'value', ''),
             (1, 'field', '20'),
             (1, 'value', '99990212189999'),
@@ -54,13 +134,13 @@ class TestSwiftmess(unittest.TestCase):
             (1, 'value', '/TRNA RAWCE290'),
             (1, 'value', '-'),
             (0, 'message', None),
-            (1, 'block', 1L),
+            (1, 'block', 1),
             (1, 'value', 'F01XXXXXXXXXXXX0000999999'),
-            (1, 'block', 2L),
+            (1, 'block', 2),
             (1, 'value', 'O5981519051128XXXXXXXXXXXX000099999905112815 19N'),
-            (1, 'block', 3L),
-            (2, 'block', 108L),
-            (1, 'block', 4L),
+            (1, 'block', 3),
+            (2, 'block', 108),
+            (1, 'block', 4),
             (1, 'value', ''),
             (1, 'field', '20'),
             (1, 'value', '99990212189999'),
@@ -74,9 +154,1382 @@ class TestSwiftmess(unittest.TestCase):
         with open(_testFilePath('rawce290.txt')) as testFile:
             actualItems = list(swiftmess.messageItems(testFile))
             self.assertEqual(actualItems, ExpectedItems)
+        with open(_testFilePath('rawce290.txt')) as testFile:
+            actualItems = list(swiftmess.messageItems(testFile, engine='reference'))
+            self.assertEqual(actualItems, ExpectedItems)
+
+
+def _itemsAndError(text, engine, bufferSize=swiftmess.DefaultBufferSize):
+    '''
+    Items found in ``text`` by ``engine`` and the error message possibly raised.
+    '''
+    result = []
+    errorMessage = None
+    try:
+        for item in swiftmess.messageItems(_readable(text), engine, bufferSize):
+            result.append(item)
+    except swiftmess.Error as error:
+        errorMessage = _Text(error)
+    return (result, errorMessage)
+
+
+class TestBufferedEngine(unittest.TestCase):
+    def _testSameAsReference(self, text):
+        expected = _itemsAndError(text, 'reference')
+        for bufferSize in (1, 2, 3, 5, 7, 64, swiftmess.DefaultBufferSize):
+            actual = _itemsAndError(text, 'buffered', bufferSize)
+            self.assertEqual(actual, expected, u'bufferSize=%d, text=%r' % (bufferSize, text))
+
+    def testCanReadTestFileInSmallChunks(self):
+        with open(_testFilePath('rawce290.txt')) as testFile:
+            text = testFile.read()
+        self._testSameAsReference(text)
+        self._testSameAsReference(text.replace('\n', '\r\n'))
+
+    def testCanHandleNestedBlocksAndEmptyValues(self):
+        self._testSameAsReference('{1:}{3:{108:ABC}{119:}}{4:\n\n:20:x{y:z\n-}\n')
+        self._testSameAsReference('{4:\r\n:20:a\rb}')
+        self._testSameAsReference('')
+
+    def testFailsOnBrokenMessages(self):
+        for text in ('x', '}', '{1:}}', '{12x:}', '{1:{2:}\n', '{1:abc', '{4:\n:20', '{12'):
+            _, errorMessage = _itemsAndError(text, 'reference')
+            self.assertNotEqual(errorMessage, None, u'text=%r' % text)
+            self._testSameAsReference(text)
+
+
+def _parsedWith(compiled, data, partSize, encoding=None):
+    '''
+    Items, error message and final checkpoint of a `swiftmess.MessageParser` fed ``data`` in parts of
+    ``partSize``, using the C extension if ``compiled`` is ``True`` and pure Python otherwise.
+    '''
+    originalCompiledParser = swiftmess._swiftmess
+    if not compiled:
+        swiftmess._swiftmess = None
+    try:
+        parser = swiftmess.MessageParser(encoding)
+        items = []
+        errorMessage = None
+        try:
+            for start in range(0, len(data), partSize):
+                parser.feed(data[start:start + partSize])
+                items.extend(parser.popItems())
+            parser.close()
+        except swiftmess.Error as error:
+            errorMessage = _Text(error)
+        except ValueError as error:
+            # For example, empty block ids such as "{:" fail to convert and undecodable values fail to decode.
+            errorMessage = _Text(error)
+        items.extend(parser.popItems())
+        checkpoint = parser.checkpoint()
+    finally:
+        swiftmess._swiftmess = originalCompiledParser
+    return (items, errorMessage, checkpoint)
+
+
+@unittest.skipIf(swiftmess._swiftmess is None, 'C extension _swiftmess must be built')
+class TestCompiledParser(unittest.TestCase):
+    def _testSameAsPython(self, data, encoding=None):
+        for partSize in (1, 3, 64, swiftmess.DefaultBufferSize):
+            expected = _parsedWith(False, data, partSize, encoding)
+            actual = _parsedWith(True, data, partSize, encoding)
+            self.assertEqual(actual, expected, u'partSize=%d, data=%r' % (partSize, data))
+            self.assertEqual([type(value) for _, _, value in actual[0]], [type(value) for _, _, value in expected[0]])
+
+    def testCanParseTestFiles(self):
+        for name in ('rawce260.txt', 'rawce290.txt'):
+            with open(_testFilePath(name), 'rb') as testFile:
+                data = testFile.read()
+            self._testSameAsPython(data)
+            self._testSameAsPython(data.replace(b'\n', b'\r\n'))
+
+    def testCanDecodeValues(self):
+        self._testSameAsPython(b'{4:\n:70E::TRDE//\xc3\xa4nderung\n:\xc3\xa4:x\n-}\n', 'utf-8')
+
+    def testFailsOnSameUndecodableValues(self):
+        for data in (b'{4:\n:20:\xff\n-}\n', b'{4:\n:\xff:x\n-}\n', b'{4:\n\xff\n-}\n'):
+            self._testSameAsPython(data, 'utf-8')
+
+    def testFailsOnSameBrokenMessages(self):
+        for data in (b'x', b'}', b'{1:}}', b'{12x:}', b'{1:{2:}\n', b'{1:abc', b'{4:\n:20', b'{12', b'{:}\n'):
+            self._testSameAsPython(data)
+
+    def testCanParseMutatedMessages(self):
+        with open(_testFilePath('rawce290.txt'), 'rb') as testFile:
+            data = bytearray(testFile.read())
+        randomGenerator = random.Random(0)
+        for _ in range(200):
+            mutatedData = bytearray(data)
+            for _ in range(randomGenerator.randint(1, 3)):
+                mutatedData[randomGenerator.randrange(len(mutatedData))] = ord(randomGenerator.choice('{}:\n\r1x'))
+            self._testSameAsPython(bytes(mutatedData))
+
+
+class TestMessageParser(unittest.TestCase):
+    def setUp(self):
+        with open(_testFilePath('rawce290.txt'), 'rb') as testFile:
+            self.data = testFile.read()
+        self.expectedItems = list(swiftmess.messageItems(_readable(self.data)))
+
+    def testCanResumeFromPickledCheckpoint(self):
+        for stopOffset in range(0, len(self.data), 97):
+            parser = swiftmess.MessageParser()
+            parser.feed(self.data[:stopOffset])
+            actualItems = parser.popItems()
+            checkpoint = pickle.loads(pickle.dumps(parser.checkpoint()))
+            self.assertEqual(checkpoint.offset, stopOffset)
+            resumedParser = swiftmess.MessageParser(checkpoint=checkpoint)
+            resumedParser.feed(self.data[checkpoint.offset:])
+            resumedParser.close()
+            actualItems.extend(resumedParser.popItems())
+            self.assertEqual(actualItems, self.expectedItems, u'stopOffset=%d' % stopOffset)
+
+    def testCanWriteAndReadCheckpoint(self):
+        checkpointFolder = tempfile.mkdtemp()
+        try:
+            checkpointPath = os.path.join(checkpointFolder, 'test.chk')
+            self.assertEqual(swiftmess.readParserCheckpoint(checkpointPath), None)
+            parser = swiftmess.MessageParser()
+            parser.feed('{1:F01ABC}{4:\n:20C::SE')
+            parser.popItems()
+            for _ in range(2):
+                swiftmess.writeParserCheckpoint(checkpointPath, parser.checkpoint())
+                self.assertEqual(swiftmess.readParserCheckpoint(checkpointPath), parser.checkpoint())
+        finally:
+            shutil.rmtree(checkpointFolder)
+
+    def testFailsOnCheckpointWithPendingItems(self):
+        parser = swiftmess.MessageParser()
+        parser.feed('{1:}')
+        self.assertRaises(AssertionError, parser.checkpoint)
+
+
+class TestMappedFile(unittest.TestCase):
+    def setUp(self):
+        with open(_testFilePath('rawce290.txt')) as testFile:
+            self.expectedItems = list(swiftmess.messageItems(testFile))
+
+    def testCanReadItemsFromPath(self):
+        with swiftmess.MappedFile(_testFilePath('rawce290.txt')) as swiftFile:
+            actualItems = list(swiftmess.messageItems(swiftFile, bufferSize=17))
+        self.assertEqual(actualItems, self.expectedItems)
+
+    def testCanReadItemsFromMmap(self):
+        with open(_testFilePath('rawce290.txt'), 'rb') as testFile:
+            mappedData = mmap.mmap(testFile.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                actualItems = list(swiftmess.messageItems(swiftmess.MappedFile(mappedData)))
+            finally:
+                mappedData.close()
+        self.assertEqual(actualItems, self.expectedItems)
+
+    def testCanReadItemsFromMemoryview(self):
+        with open(_testFilePath('rawce290.txt'), 'rb') as testFile:
+            data = memoryview(testFile.read())
+        actualItems = list(swiftmess.messageItems(swiftmess.MappedFile(data), bufferSize=5))
+        self.assertEqual(actualItems, self.expectedItems)
+
+    def testCanDecodeValues(self):
+        data = b'{4:\n:70E::TRDE//\xc4NDERUNG\n-}\n'
+        for engine in ('buffered', 'reference'):
+            actualItems = list(swiftmess.messageItems(swiftmess.MappedFile(memoryview(data)), engine, encoding='iso-8859-1'))
+            self.assertEqual(actualItems, [
+                (1, 'block', 4),
+                (1, 'value', u''),
+                (1, 'field', u'70E'),
+                (1, 'value', u':TRDE//\xc4NDERUNG'),
+                (1, 'value', u'-'),
+                (0, 'message', None)
+            ])
+            self.assertTrue(isinstance(actualItems[3][2], _Text))
+
+    def testCanReadEmptyFile(self):
+        emptyFileHandle, emptyPath = tempfile.mkstemp()
+        os.close(emptyFileHandle)
+        try:
+            with swiftmess.MappedFile(emptyPath) as swiftFile:
+                self.assertEqual(list(swiftmess.messageItems(swiftFile)), [])
+        finally:
+            os.remove(emptyPath)
+
+
+class TestLazyMessages(unittest.TestCase):
+    def testCanReadSameBodyItemsAsStructuredItems(self):
+        for name in ('rawce260.txt', 'rawce290.txt'):
+            with open(_testFilePath(name), 'rb') as testFile:
+                data = testFile.read()
+            for text in (data, data.replace(b'\n', b'\r\n')):
+                expectedItems = [item for item in swiftmess.structuredItems(_readable(text)) if item[1] == 4]
+                for bufferSize in (1, 7, swiftmess.DefaultBufferSize):
+                    actualItems = []
+                    for message in swiftmess.lazyMessages(_readable(text), bufferSize):
+                        self.assertEqual(text[message.start:message.start + 4], b'{1:F')
+                        actualItems.extend(message.bodyItems())
+                    self.assertEqual(actualItems, expectedItems, u'name=%r, bufferSize=%d' % (name, bufferSize))
+
+    def testCanDecodeOutputMessageHeaders(self):
+        with open(_testFilePath('rawce290.txt'), 'rb') as testFile:
+            messages = list(swiftmess.lazyMessages(testFile))
+        self.assertEqual(len(messages), 2)
+        message = messages[0]
+        self.assertEqual(message.basicHeader.applicationId, 'F')
+        self.assertEqual(message.basicHeader.sessionNumber, '0000')
+        self.assertEqual(message.basicHeader.sequenceNumber, '999999')
+        self.assertEqual(message.applicationHeader.direction, 'O')
+        self.assertEqual(message.messageType, '598')
+        self.assertEqual(message.applicationHeader.inputTime, '1519')
+        self.assertEqual(message.applicationHeader.outputDate, '051128')
+        self.assertEqual(message.messageUserReference, '')
+        self.assertEqual(message.reportType, 'RAWCE290')
+        self.assertEqual(messages[1].reportType, None)
+
+    def testCanDecodeInputMessageHeaders(self):
+        text = '{1:F01BANKBEBBAXXX2222123456}{2:I598BANKDEFFXXXXN}{3:{108:MUR123}}{4:\n:20:X\n-}{5:{CHK:1}}\n'
+        message, = swiftmess.lazyMessages(_readable(text))
+        self.assertEqual((message.start, message.end), (0, len(text)))
+        self.assertEqual(message.sender, 'BANKBEBBAXXX')
+        self.assertEqual(message.receiver, 'BANKDEFFXXXX')
+        self.assertEqual(message.applicationHeader.priority, 'N')
+        self.assertEqual(message.messageUserReference, 'MUR123')
+        self.assertEqual(message.body, '\n:20:X\n-')
+        self.assertEqual(message.trailer, '{5:{CHK:1}}')
+
+    def testFailsOnBrokenMessages(self):
+        for text in ('x{1:}', '{1:F01}\n', '{1:F01BANKBEBBAXXX2222123456}{2:X598}\n', '{4:\n:20:X'):
+            self.assertRaises(swiftmess.Error, list, swiftmess.lazyMessages(_readable(text)))
+
+
+class TestQuarantine(unittest.TestCase):
+    def setUp(self):
+        with open(_testFilePath('rawce290.txt'), 'rb') as testFile:
+            self.data = testFile.read()
+        self.messages = self.data.replace(b'\n\n', b'\n').split(b'\n{')
+        self.messages = [self.messages[0] + b'\n'] + [b'{' + message + b'\n' for message in self.messages[1:-1]] \
+            + [b'{' + self.messages[-1]]
+
+    def _items(self, text, bufferSize=swiftmess.DefaultBufferSize):
+        quarantine = swiftmess.Quarantine()
+        items = list(swiftmess.messageItems(_readable(text), bufferSize=bufferSize, quarantine=quarantine))
+        return (items, list(quarantine))
+
+    def testCanReadCleanInput(self):
+        expectedItems = list(swiftmess.messageItems(_readable(self.data)))
+        for bufferSize in (1, 7, swiftmess.DefaultBufferSize):
+            self.assertEqual(self._items(self.data, bufferSize), (expectedItems, []))
+
+    def testCanSkipBrokenMessages(self):
+        firstMessage, secondMessage = self.messages
+        expectedItems = list(swiftmess.messageItems(_readable(firstMessage + secondMessage)))
+        for brokenMessage, errorStart in (
+                (b'{1:F01}}\n', 'unmatched'),
+                (b'{1:F01}{4:\n:20:\n', 'block must be closed'),
+                (b'{1:{2:}\n', 'nested block must be closed'),
+                (b'{1:F01}{x:}\n', 'block id must')):
+            text = firstMessage + brokenMessage + secondMessage
+            brokenStart = len(firstMessage)
+            for bufferSize in (1, 7, swiftmess.DefaultBufferSize):
+                actualItems, quarantinedMessages = self._items(text, bufferSize)
+                self.assertEqual(actualItems, expectedItems, u'brokenMessage=%r' % brokenMessage)
+                self.assertEqual(len(quarantinedMessages), 1)
+                quarantinedMessage = quarantinedMessages[0]
+                self.assertEqual(
+                    (quarantinedMessage.start, quarantinedMessage.end),
+                    (brokenStart, brokenStart + len(brokenMessage)))
+                self.assertTrue(quarantinedMessage.error.startswith(errorStart), quarantinedMessage.error)
+
+    def testCanSkipBrokenMessageWithoutBasicHeader(self):
+        goodMessage = b'{4:\n:20:A\n-}\n'
+        brokenMessage = b'{4:\n:20:B\n-}{x:}\n'
+        text = goodMessage + brokenMessage + goodMessage + goodMessage
+        expectedItems = list(swiftmess.messageItems(_readable(goodMessage * 3)))
+        for bufferSize in (1, 7, swiftmess.DefaultBufferSize):
+            actualItems, quarantinedMessages = self._items(text, bufferSize)
+            self.assertEqual(actualItems, expectedItems)
+            self.assertEqual(
+                [(entry.start, entry.end) for entry in quarantinedMessages],
+                [(len(goodMessage), len(goodMessage) + len(brokenMessage))])
+
+    def testCannotResyncAfterUnclosedBlockWithoutBasicHeader(self):
+        goodMessage = b'{4:\n:20:A\n-}\n'
+        unclosedMessage = b'{4:\n:20:B\n'
+        text = goodMessage + unclosedMessage + goodMessage + goodMessage
+        actualItems, quarantinedMessages = self._items(text)
+        self.assertEqual(actualItems, list(swiftmess.messageItems(_readable(goodMessage))))
+        self.assertEqual([(entry.start, entry.end) for entry in quarantinedMessages], [(len(goodMessage), len(text))])
+
+    def testCanWriteQuarantine(self):
+        quarantine = swiftmess.Quarantine()
+        quarantine.entries.append(swiftmess.QuarantinedMessage(3, 17, u'broken\nmessage'))
+        quarantineFile = io.BytesIO()
+        quarantine.write(quarantineFile)
+        self.assertEqual(quarantineFile.getvalue(), b'3\t17\tbroken message\n')
+
+    def testCanReadReportWithBrokenMessages(self):
+        with open(_testFilePath('rawce260.txt'), 'rb') as testFile:
+            data = testFile.read()
+        quarantine = swiftmess.Quarantine()
+        report = swiftmess.Report(_readable(b'{1:x}}\n' + data + b'{1:y}}\n'), quarantine=quarantine)
+        self.assertEqual([trade.tradeNumber for trade in report.trades], ['000123', '000124', '000007'])
+        self.assertEqual([(entry.start, entry.end) for entry in quarantine], [(0, 7), (7 + len(data), 14 + len(data))])
+
+
+class TestParseStats(unittest.TestCase):
+    def setUp(self):
+        with open(_testFilePath('rawce260.txt'), 'rb') as testFile:
+            self.data = testFile.read()
+
+    def testCanCollectReportStats(self):
+        notifiedTradeCounts = []
+        stats = swiftmess.ParseStats(lambda stats: notifiedTradeCounts.append(dict(stats.tradeCounts)))
+        swiftmess.Report(_readable(self.data), stats=stats)
+        self.assertEqual(stats.bytesRead, len(self.data))
+        self.assertEqual(stats.messageCount, 2)
+        self.assertEqual(stats.blockCount, self.data.count(b'{'))
+        self.assertEqual(stats.fieldCounts['98A'], self.data.count(b':98A:'))
+        self.assertEqual(stats.fieldCount, sum(stats.fieldCounts.values()))
+        self.assertEqual(stats.tradeCounts, {'RAWCE260': 3})
+        self.assertEqual(stats.errorCount, 0)
+        self.assertTrue(stats.tokenizeSeconds >= 0.0)
+        self.assertTrue(stats.convertSeconds >= 0.0)
+        self.assertEqual(notifiedTradeCounts[-1], {'RAWCE260': 3})
+        self.assertEqual(stats.asDict()['tradeCounts'], {'RAWCE260': 3})
+
+    def testCanCollectReportReaderStats(self):
+        stats = swiftmess.ParseStats()
+        tradeNumbers = [trade.tradeNumber for trade in swiftmess.ReportReader(_readable(self.data), stats=stats)]
+        self.assertEqual(len(tradeNumbers), 3)
+        self.assertEqual(stats.tradeCounts, {'RAWCE260': 3})
+        self.assertEqual(stats.messageCount, 2)
+
+    def testCanCountLastMessageWithoutNewline(self):
+        data = self.data.rstrip(b'\n')
+        for quarantine in (None, swiftmess.Quarantine()):
+            stats = swiftmess.ParseStats()
+            swiftmess.Report(_readable(data), quarantine=quarantine, stats=stats)
+            self.assertEqual((stats.messageCount, stats.bytesRead), (2, len(data)))
+
+    def testCanCountErrors(self):
+        stats = swiftmess.ParseStats()
+        self.assertRaises(swiftmess.Error, list, swiftmess.messageItems(_readable('{1:}\nx'), stats=stats))
+        self.assertEqual((stats.messageCount, stats.errorCount), (1, 1))
+
+        stats = swiftmess.ParseStats()
+        brokenData = self.data.replace(b':98A::TRAD//20051128', b':98A::TRAD//2005112x', 1)
+        self.assertRaises(swiftmess.Error, swiftmess.Report, _readable(brokenData), stats=stats)
+        self.assertEqual(stats.errorCount, 1)
+
+        stats = swiftmess.ParseStats()
+        swiftmess.Report(_readable(b'{1:x}}\n' + self.data), quarantine=swiftmess.Quarantine(), stats=stats)
+        self.assertEqual((stats.messageCount, stats.errorCount, stats.bytesRead), (2, 1, len(self.data) + 7))
+
+
+class TestMessageIndex(unittest.TestCase):
+    def setUp(self):
+        with open(_testFilePath('rawce290.txt'), 'rb') as testFile:
+            self.data = testFile.read()
+        self.secondMessageStart = self.data.index(b'{1:', 1)
+
+    def testCanBuildMessageIndex(self):
+        index = swiftmess.buildMessageIndex(_readable(self.data), 7)
+        self.assertEqual(list(index), [
+            swiftmess.MessageIndexEntry(0, self.secondMessageStart, '99990212189999', 'RAWCE290'),
+            swiftmess.MessageIndexEntry(self.secondMessageStart, len(self.data), '99990212189999', None),
+        ])
+        self.assertEqual(index.entriesForReportType('RAWCE290'), [index[0]])
+
+    def testCanIndexLastMessageWithoutNewline(self):
+        data = self.data.replace(b'\n', b'\r\n').rstrip(b'\r\n')
+        index = swiftmess.buildMessageIndex(_readable(data))
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index[1].end, len(data))
+
+    def testCanWriteAndReadMessageIndex(self):
+        index = swiftmess.buildMessageIndex(_readable(self.data))
+        indexFile = io.BytesIO()
+        index.write(indexFile, 123, 456)
+        indexFile.seek(0)
+        self.assertEqual(list(swiftmess.readMessageIndex(indexFile, 123, 456)), list(index))
+        indexFile.seek(0)
+        self.assertEqual(swiftmess.readMessageIndex(indexFile, 124, 456), None)
+        self.assertRaises(swiftmess.Error, swiftmess.readMessageIndex, _readable(b'broken\n'))
+
+    def testCanStoreIndexNextToSourceFile(self):
+        tempFolder = tempfile.mkdtemp()
+        try:
+            sourcePath = os.path.join(tempFolder, 'rawce290.txt')
+            shutil.copy(_testFilePath('rawce290.txt'), sourcePath)
+            index = swiftmess.messageIndexFor(sourcePath)
+            self.assertTrue(os.path.exists(sourcePath + swiftmess.IndexSuffix))
+            self.assertEqual(list(swiftmess.messageIndexFor(sourcePath)), list(index))
+            with open(sourcePath, 'ab') as sourceFile:
+                sourceFile.write(self.data)
+            self.assertEqual(len(swiftmess.messageIndexFor(sourcePath)), 4)
+            self.assertEqual(sorted(os.listdir(tempFolder)), ['rawce290.txt', 'rawce290.txt' + swiftmess.IndexSuffix])
+        finally:
+            shutil.rmtree(tempFolder)
+
+    def testCanDetectChangeWithinSameSecond(self):
+        tempFolder = tempfile.mkdtemp()
+        try:
+            sourcePath = os.path.join(tempFolder, 'rawce290.txt')
+            shutil.copy(_testFilePath('rawce290.txt'), sourcePath)
+            os.utime(sourcePath, (1000000000.25, 1000000000.25))
+            self.assertEqual(swiftmess.messageIndexFor(sourcePath).entries[0].reference, '99990212189999')
+            with open(sourcePath, 'wb') as sourceFile:
+                sourceFile.write(self.data.replace(b'99990212189999', b'11110212189999', 1))
+            os.utime(sourcePath, (1000000000.75, 1000000000.75))
+            self.assertEqual(swiftmess.messageIndexFor(sourcePath).entries[0].reference, '11110212189999')
+        finally:
+            shutil.rmtree(tempFolder)
+
+    def testCanReadSelectedMessages(self):
+        index = swiftmess.buildMessageIndex(_readable(self.data))
+        expectedItems = list(swiftmess.messageItems(_readable(self.data[self.secondMessageStart:])))
+        with swiftmess.MappedFile(_testFilePath('rawce290.txt')) as swiftFile:
+            selectedMessages = swiftmess.SelectedMessages(swiftFile, [index[1]])
+            actualItems = list(swiftmess.messageItems(selectedMessages, bufferSize=10))
+        self.assertEqual(actualItems, expectedItems)
+        with open(_testFilePath('rawce290.txt'), 'rb') as testFile:
+            selectedMessages = swiftmess.SelectedMessages(testFile, [index[1], index[0]])
+            self.assertEqual(selectedMessages.read(), self.data[self.secondMessageStart:] + self.data[:self.secondMessageStart])
+
+
+def _tradeValues(trades):
+    return [trade.asDict() for trade in trades]
+
+
+def _reportValues(report):
+    return (report.report, report.financialInstrument, report.safekeepingAccount, _tradeValues(report.trades))
+
+
+class TestReport(unittest.TestCase):
+    def testCanReadLastTradeOfMessage(self):
+        with open(_testFilePath('rawce260.txt'), 'rb') as testFile:
+            data = testFile.read()
+        report = swiftmess.Report(_readable(data))
+        self.assertEqual([trade.tradeType for trade in report.trades], ['1', '2', '1'])
+        self.assertEqual(list(swiftmess.structuredItems(_readable(data)))[-1][3][-1], '/ORDNB 12347 /TTYP 1')
+        # Without 70E, a field with a single value must fit into one line ends the message.
+        detailsStart = data.index(b':70E::TRDE//CLGM XYZDE')
+        dataWithoutDetails = data[:detailsStart] + data[data.index(b'-}', detailsStart):]
+        report = swiftmess.Report(_readable(dataWithoutDetails))
+        self.assertEqual(report.trades[1].tradeSettlement, ('EUR', Decimal('498734.5')))
+        self.assertEqual(report.trades[1].tradeType, None)
+
+    def testCanRemoveOnlyMessageEndLineFromStructuredItems(self):
+        for data, tokenizedValues, structuredValues in (
+                ('{4:\n:20:A\n-}\n', ['A', '-'], ['A']),
+                ('{4:\n:20:A\n-\n-}\n', ['A', '-', '-'], ['A', '-']),
+                ('{4:\n:20:-}\n', ['-'], ['-']),
+                ('{4:\n:20:-\n-}\n', ['-', '-'], ['-'])):
+            # Before, structured items had the same values as the tokenized items.
+            actualTokenizedValues = [
+                value for _, kind, value in swiftmess.messageItems(_readable(data)) if kind == 'value'][1:]
+            self.assertEqual(actualTokenizedValues, tokenizedValues, u'data=%r' % data)
+            self.assertEqual(list(swiftmess.structuredItems(_readable(data))), [
+                (1, 4, None, ['']), (1, 4, '20', structuredValues)], u'data=%r' % data)
+
+    def testCanReadRawce260(self):
+        with open(_testFilePath('rawce260.txt'), 'rb') as testFile:
+            report = swiftmess.Report(testFile)
+        self.assertEqual(report.report, 'RAWCE260')
+        self.assertEqual(report.safekeepingAccount, '7000001')
+        self.assertEqual(report.financialInstrument, ['ISIN DE0001135275', 'BUND 4,00 04.01.2037'])
+        self.assertEqual([trade.tradeNumber for trade in report.trades], ['000123', '000124', '000007'])
+        firstTrade = report.trades[0]
+        self.assertEqual(firstTrade.tradeDate, date(2005, 11, 28))
+        self.assertEqual(firstTrade.settlementDate, date(2005, 11, 30))
+        self.assertEqual(firstTrade.nominal, Decimal('1000000'))
+        self.assertEqual(firstTrade.accrInterest, ('EUR', Decimal('12345.67')))
+        self.assertEqual(firstTrade.tradeSettlement, ('EUR', Decimal('1024845.67')))
+        self.assertEqual(firstTrade.tradeLocation, 'XEUR')
+        self.assertEqual(firstTrade.clearingMember, 'ABCFR')
+        self.assertEqual(firstTrade.orderNumber, '12345')
+
+
+class TestTradeColumns(unittest.TestCase):
+    def testCanStoreTradesInColumns(self):
+        with open(_testFilePath('rawce260.txt'), 'rb') as testFile:
+            expectedValues = _reportValues(swiftmess.Report(testFile))
+        with open(_testFilePath('rawce260.txt'), 'rb') as testFile:
+            report = swiftmess.Report(testFile, columnar=True)
+        self.assertTrue(isinstance(report.trades, swiftmess.TradeColumns))
+        self.assertEqual(_reportValues(report), expectedValues)
+        self.assertEqual(report.trades[-1].tradeNumber, '000007')
+        self.assertEqual(report.trades.trade(0).asDict(), expectedValues[3][0])
+        self.assertEqual(report.trades.column('tradeNumber'), ['000123', '000124', '000007'])
+        self.assertRaises(IndexError, report.trades.__getitem__, 3)
+        self.assertRaises(AttributeError, getattr, report.trades[0], 'noSuchAttribute')
+
+    def testCanStoreSpecialValues(self):
+        specialDecimals = [None, Decimal('0'), Decimal('-12.345'), Decimal('1E+3'), Decimal('NaN'), Decimal('1E-200'), Decimal(10 ** 30)]
+        trades = swiftmess.TradeColumns()
+        for specialDecimal in specialDecimals:
+            trade = swiftmess.Trade()
+            trade.nominal = specialDecimal
+            trade.accrInterest = ('EUR', specialDecimal)
+            trade.tradeDate = date(1, 1, 1)
+            trades.append(trade)
+        self.assertEqual([str(nominal) for nominal in trades.column('nominal')], [str(value) for value in specialDecimals])
+        self.assertEqual(str(trades[-1].accrInterest[1]), str(specialDecimals[-1]))
+        self.assertEqual(trades[0].tradeDate, date(1, 1, 1))
+
+    def testCanPickleTrade(self):
+        trade = swiftmess.Trade()
+        trade.nominal = Decimal('1.5')
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            self.assertEqual(pickle.loads(pickle.dumps(trade, protocol)).asDict(), trade.asDict())
+
+
+class TestSymbolTable(unittest.TestCase):
+    def testCanInternValues(self):
+        symbols = swiftmess.SymbolTable()
+        first = symbols.intern(''.join(['EU', 'R']))
+        second = symbols.intern(''.join(['E', 'UR']))
+        self.assertTrue(first is second)
+        self.assertEqual(symbols.intern(None), None)
+        self.assertEqual((symbols.hits, symbols.misses, len(symbols)), (1, 1, 1))
+        self.assertEqual(symbols.hitRate, 0.5)
+        self.assertEqual(swiftmess.SymbolTable().hitRate, 0.0)
+
+    def testCanLimitSize(self):
+        symbols = swiftmess.SymbolTable(2)
+        for value in ('a', 'b', 'c', 'c'):
+            self.assertEqual(symbols.intern(value), value)
+        self.assertEqual((symbols.hits, symbols.misses, len(symbols)), (0, 4, 2))
+
+    def testCanShareReportValues(self):
+        with open(_testFilePath('rawce260.txt'), 'rb') as testFile:
+            report = swiftmess.Report(testFile)
+        firstTrade, _, thirdTrade = report.trades
+        self.assertEqual(firstTrade.clearingMember, 'ABCFR')
+        self.assertTrue(firstTrade.clearingMember is thirdTrade.clearingMember)
+        self.assertTrue(firstTrade.clearingMember is firstTrade.exchangeMember)
+        self.assertTrue(firstTrade.accrInterest[0] is thirdTrade.accrInterest[0])
+        self.assertTrue(report.symbols.hitRate > 0.5)
+
+
+class TestConverters(unittest.TestCase):
+    def setUp(self):
+        self.report = swiftmess._emptyReport()
+        self.item = (1, 4, '98A', [])
+
+    def _errorMessage(self, function, *arguments):
+        try:
+            function(*arguments)
+            self.fail()
+        except swiftmess.Error as error:
+            result = _Text(error)
+        return result
+
+    def testCanConvertDates(self):
+        self.assertEqual(self.report._dateFromIsoText(self.item, 'SETT', '20051128'), date(2005, 11, 28))
+        self.assertEqual(self.report._dateFromIsoText(self.item, 'SETT', '20051128'), date(2005, 11, 28))
+        self.assertEqual(self.report._dateCache.hits, 1)
+        self.assertEqual(self.report._dateFromIsoText(self.item, 'SETT', '2005111'), date(2005, 11, 1))
+
+    def testFailsOnBrokenDatesLikeStrptime(self):
+        for text in ('20051232', '20050229', '00001128', '2005-11-28', ''):
+            try:
+                datetime.strptime(text, '%Y%m%d')
+                self.fail()
+            except ValueError as error:
+                expectedMessage = u'cannot convert "%s" in block "4", field "98A", item "SETT" to date: %s' % (text, error)
+            self.assertEqual(self._errorMessage(self.report._dateFromIsoText, self.item, 'SETT', text), expectedMessage)
+
+    def testCanConvertAmounts(self):
+        for value, expectedAmount in (
+            ('1234,5', '1234.5'), ('1234,', '1234'), ('0,01', '0.01'),
+            ('1.234,5', '1234.5'), ('1,234.5', '1234.5'), ('1234.5', '1234.5'),
+        ):
+            amount = self.report._decimalFrom(self.item, 'PSTA', value)
+            self.assertEqual(str(amount), expectedAmount)
+        self.assertEqual(
+            self.report._currencyAndAmountFrom(self.item, 'PSTA', 'EUR1234,5'), ('EUR', Decimal('1234.5')))
+        self.assertEqual(
+            self.report._currencyAndAmountFrom(self.item, 'PSTA', 'EUR1234,5'), ('EUR', Decimal('1234.5')))
+        self.assertEqual(self.report._currencyAndAmountCache.hits, 1)
+
+    def testFailsOnNonSwiftAmountsInStrictMode(self):
+        self.report._strictAmounts = True
+        self.assertEqual(self.report._decimalFrom(self.item, 'PSTA', '1234,5'), Decimal('1234.5'))
+        for value in ('1.234,5', '1234.5', '1234', ''):
+            errorMessage = self._errorMessage(self.report._decimalFrom, self.item, 'PSTA', value)
+            self.assertTrue(errorMessage.startswith(u'cannot convert "%s" in block "4", field "98A", item "PSTA" to decimal: ' % value))
+
+    def testFailsOnBrokenAmounts(self):
+        self.assertTrue(self._errorMessage(self.report._decimalFrom, self.item, 'PSTA', 'x').startswith(
+            u'cannot convert "x" in block "4", field "98A", item "PSTA" to decimal: '))
+        self.assertEqual(
+            self._errorMessage(self.report._currencyAndAmountFrom, self.item, 'PSTA', 'EUR'),
+            u'cannot convert "EUR" in block "4", field "98A", item "PSTA" to currency and amount: value must have at least 4 characters')
+
+    def testCanReadReportWithStrictAmounts(self):
+        with open(_testFilePath('rawce260.txt'), 'rb') as testFile:
+            self.assertRaises(swiftmess.Error, swiftmess.Report, testFile, strictAmounts=True)
+        with open(_testFilePath('rawce260.txt'), 'rb') as testFile:
+            data = testFile.read().replace(b'1.000.000,', b'1000000,').replace(b'12.345,67', b'12345,67').replace(b'1.024.845,67', b'1024845,67')
+        report = swiftmess.Report(_readable(data), strictAmounts=True)
+        self.assertEqual(report.trades[0].nominal, Decimal('1000000'))
+
+    def testCanDiscardLeastRecentlyUsed(self):
+        cache = swiftmess._LruCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(len(cache), 2)
+
+
+class TestTransactionDetails(unittest.TestCase):
+    def setUp(self):
+        with open(_testFilePath('rawce260.txt'), 'rb') as testFile:
+            self.data = testFile.read()
+
+    def testCanReadAllDetails(self):
+        trade = swiftmess.Report(_readable(self.data)).trades[0]
+        self.assertEqual(
+            [getattr(trade, attributeName) for _, attributeName in swiftmess.TransactionDetailAttributeNames],
+            ['ABCFR', 'ABCFR', '1', 'A', '1', 'N', '1', 'N', '12345', '1'])
+
+    def testCanReadSelectedDetails(self):
+        for reader in (
+                lambda: swiftmess.Report(_readable(self.data), transactionDetailNames=['ORDNB', 'CLGM']).trades,
+                lambda: list(swiftmess.ReportReader(_readable(self.data), transactionDetailNames=['ORDNB', 'CLGM']))):
+            trade = reader()[1]
+            self.assertEqual((trade.clearingMember, trade.orderNumber), ('XYZDE', '12346'))
+            self.assertEqual((trade.exchangeMember, trade.leg, trade.tradeType), (None, None, None))
+
+    def testFailsOnUnknownDetail(self):
+        self.assertRaises(
+            swiftmess.Error, swiftmess.Report, _readable(self.data), transactionDetailNames=['CLGM', 'XXX'])
+
+    def testFailsOnDuplicateDetail(self):
+        for transactionDetailNames in (None, ['CLGM']):
+            for duplicateDetail in (b'/OT B', b'/XXX 1 /XXX 2', b'/OT'):
+                brokenData = self.data.replace(b'/ORDNB 12345', duplicateDetail + b' /ORDNB 12345', 1)
+                try:
+                    swiftmess.Report(_readable(brokenData), transactionDetailNames=transactionDetailNames)
+                    self.fail()
+                except swiftmess.Error as error:
+                    self.assertTrue('duplicate transaction detail' in _Text(error), error)
+
+    def testFailsOnMissingHeader(self):
+        brokenData = self.data.replace(b':70E::TRDE//', b':70E::XXXX//', 1)
+        self.assertRaises(swiftmess.Error, swiftmess.Report, _readable(brokenData))
+
+
+class TestTradeProjection(unittest.TestCase):
+    def setUp(self):
+        with open(_testFilePath('rawce260.txt'), 'rb') as testFile:
+            self.data = testFile.read()
+
+    def _assertProjected(self, trades, tradeAttributeNames):
+        expectedTrades = swiftmess.Report(_readable(self.data)).trades
+        self.assertEqual(len(trades), len(expectedTrades))
+        for trade, expectedTrade in zip(trades, expectedTrades):
+            for name in swiftmess.TradeAttributeNames:
+                if name in tradeAttributeNames:
+                    self.assertEqual(getattr(trade, name), getattr(expectedTrade, name))
+                else:
+                    self.assertEqual(getattr(trade, name), None, name)
+
+    def testCanReadProjectedTrades(self):
+        tradeAttributeNames = ['tradeNumber', 'nominal', 'orderNumber']
+        for reader in (
+                lambda: swiftmess.Report(_readable(self.data), tradeAttributeNames=tradeAttributeNames).trades,
+                lambda: list(swiftmess.Report(
+                    _readable(self.data), columnar=True, tradeAttributeNames=tradeAttributeNames).trades),
+                lambda: list(swiftmess.ReportReader(_readable(self.data), tradeAttributeNames=tradeAttributeNames))):
+            self._assertProjected(reader(), tradeAttributeNames)
+
+    def testCanReadReportWithoutTradeAttributes(self):
+        report = swiftmess.Report(_readable(self.data), tradeAttributeNames=[])
+        self.assertEqual(report.safekeepingAccount, '7000001')
+        self._assertProjected(report.trades, [])
+
+    def testCanCombineWithTransactionDetails(self):
+        trades = swiftmess.Report(
+            _readable(self.data), transactionDetailNames=['CLGM', 'ORDNB'],
+            tradeAttributeNames=['clearingMember', 'leg']).trades
+        self.assertEqual((trades[1].clearingMember, trades[1].leg, trades[1].orderNumber), ('XYZDE', None, None))
+
+    def testCanSkipBrokenFieldsNotProjected(self):
+        brokenData = self.data.replace(b':98A::TRAD//20051128', b':98A::TRAD//2005xxxx', 1)
+        self.assertRaises(swiftmess.Error, swiftmess.Report, _readable(brokenData))
+        report = swiftmess.Report(_readable(brokenData), tradeAttributeNames=['tradeNumber'])
+        self.assertEqual([trade.tradeNumber for trade in report.trades], ['000123', '000124', '000007'])
+
+    def testCanPickleProjectedReport(self):
+        report = swiftmess.Report(_readable(self.data), tradeAttributeNames=['tradeNumber'])
+        copiedReport = pickle.loads(pickle.dumps(report, 2))
+        self.assertEqual(copiedReport._reportType._blockFieldToHandler.keys(), report._reportType._blockFieldToHandler.keys())
+        self.assertEqual(_reportValues(copiedReport), _reportValues(report))
+
+    def testFailsOnUnknownTradeAttribute(self):
+        self.assertRaises(
+            swiftmess.Error, swiftmess.Report, _readable(self.data), tradeAttributeNames=['tradeNumber', 'xxx'])
+        self.assertRaises(
+            swiftmess.Error, swiftmess.ReportReader, _readable(self.data), tradeAttributeNames=['xxx'])
+
+
+class TestQuery(unittest.TestCase):
+    def setUp(self):
+        with open(_testFilePath('rawce260.txt'), 'rb') as testFile:
+            self.data = testFile.read()
+        secondMessageStart = self.data.index(b'{1:', 1)
+        self.secondMessageData = self.data[secondMessageStart:]
+        self.mixedData = self.data[:secondMessageStart] + self.secondMessageData.replace(b'{2:O598', b'{2:O599')
+
+    def _tradeNumbers(self, query, data=None):
+        if data is None:
+            data = self.data
+        result = [trade.tradeNumber for trade in swiftmess.Report(_readable(data), query=query).trades]
+        self.assertEqual(list(swiftmess.Report(_readable(data), columnar=True, query=query).trades.column('tradeNumber')), result)
+        self.assertEqual([trade.tradeNumber for trade in swiftmess.ReportReader(_readable(data), query=query)], result)
+        return result
+
+    def testCanMatchConditions(self):
+        self.assertTrue(swiftmess.Condition('nominal', '>=', Decimal(1)).matches(Decimal(1)))
+        self.assertFalse(swiftmess.Condition('nominal', '>', Decimal(1)).matches(None))
+        self.assertTrue(swiftmess.Condition('nominal', '!=', Decimal(1)).matches(None))
+        self.assertTrue(swiftmess.Condition('leg', 'in', ['1', None]).matches(None))
+        self.assertTrue(swiftmess.Condition('tradeDate', 'between', (date(2005, 1, 1), date(2005, 1, 31))).matches(date(2005, 1, 31)))
+
+    def testCanSelectTrades(self):
+        settled = (date(2005, 11, 30), date(2005, 12, 1))
+        self.assertEqual(self._tradeNumbers(swiftmess.Query(tradeConditions=[
+            ('tradeLocation', '==', 'XEUR'), ('settlementDate', 'between', settled)])), ['000123', '000124'])
+        self.assertEqual(self._tradeNumbers(swiftmess.Query(tradeConditions=[
+            ('settlementDate', '>', date(2005, 11, 30)), ('leg', 'in', ['1', '3'])])), ['000007'])
+        self.assertEqual(self._tradeNumbers(swiftmess.Query()), ['000123', '000124', '000007'])
+
+    def testCanReadReportWithoutMatchingTrades(self):
+        report = swiftmess.Report(_readable(self.data), query=swiftmess.Query(tradeConditions=[('tradeLocation', '==', 'XXXX')]))
+        self.assertEqual(report.trades, [])
+        self.assertEqual(report.rejectedTradeCount, 3)
+        self.assertRaises(swiftmess.Error, swiftmess.Report, _readable(self.data[:self.data.index(b':94B::PRIC')]))
+
+    def testCanSkipBrokenFieldsOfRejectedTrades(self):
+        brokenData = self.data.replace(b'FAMT/250000,', b'FAMT/xxx', 1)
+        self.assertRaises(swiftmess.Error, swiftmess.Report, _readable(brokenData))
+        query = swiftmess.Query(tradeConditions=[('tradeLocation', '==', 'XEUR')])
+        self.assertEqual(self._tradeNumbers(query, brokenData), ['000123', '000124'])
+
+    def testCanSelectMessages(self):
+        query = swiftmess.Query(messageConditions=[('messageType', '==', '598'), ('reportType', '==', 'RAWCE260')])
+        messages = list(swiftmess.queriedMessages(_readable(self.mixedData), query))
+        self.assertEqual([message.start for message in messages], [0])
+        brokenData = self.mixedData.replace(b':98A::SETT//20051202', b':98A::SETT//2005xxxx')
+        self.assertEqual(self._tradeNumbers(query, brokenData), ['000123', '000124'])
+
+    def testCanCombineQueryWithProjection(self):
+        query = swiftmess.Query(tradeConditions=[('tradeLocation', '==', 'XETR')])
+        trades = swiftmess.Report(_readable(self.data), tradeAttributeNames=['tradeNumber'], query=query).trades
+        self.assertEqual([(trade.tradeNumber, trade.tradeLocation, trade.nominal) for trade in trades], [('000007', 'XETR', None)])
+
+    def testCanPickleQueriedReport(self):
+        query = swiftmess.Query(tradeConditions=[('leg', 'in', ['2'])])
+        report = swiftmess.Report(_readable(self.data), query=query)
+        copiedReport = pickle.loads(pickle.dumps(report, 2))
+        self.assertEqual(_reportValues(copiedReport), _reportValues(report))
+        self.assertEqual(copiedReport.rejectedTradeCount, 2)
+        self.assertEqual(repr(copiedReport._tradeQuery), repr(query))
+
+    def testFailsOnBrokenQuery(self):
+        self.assertRaises(swiftmess.Error, swiftmess.Condition, 'nominal', '~', 1)
+        self.assertRaises(swiftmess.Error, swiftmess.Condition, 'nominal', 'between', (1, 2, 3))
+        self.assertRaises(swiftmess.Error, swiftmess.Query, tradeConditions=[('xxx', '==', 1)])
+        self.assertRaises(swiftmess.Error, swiftmess.Query, messageConditions=[('tradeLocation', '==', 'XEUR')])
+        query = swiftmess.Query(messageConditions=[('messageType', '==', '598')])
+        self.assertRaises(
+            swiftmess.Error, swiftmess.Report, _readable(self.data), quarantine=swiftmess.Quarantine(), query=query)
+        self.assertRaises(
+            swiftmess.Error, swiftmess.ReportReader, _readable(self.data), stats=swiftmess.ParseStats(), query=query)
+
+
+class TestReportType(unittest.TestCase):
+    def tearDown(self):
+        swiftmess._reportTypes.pop('RAWCE290', None)
+
+    def testCanRegisterReportType(self):
+        def initRawce290(report):
+            report.itemNumbers = []
+
+        def processItemNumber(report, item):
+            report.itemNumbers.extend(item[3])
+
+        rawce290 = swiftmess.ReportType('RAWCE290', initRawce290)
+        rawce290.addHandler(4, '12', None, processItemNumber)
+        swiftmess.registerReportType(rawce290)
+        with open(_testFilePath('rawce290.txt'), 'rb') as testFile:
+            report = swiftmess.Report(testFile)
+        self.assertEqual(report.report, 'RAWCE290')
+        self.assertEqual(report.itemNumbers, ['099'])
+
+    def testCanProcessQualifiers(self):
+        prices = []
+        rawce290 = swiftmess.ReportType('RAWCE290')
+        rawce290.addHandler(4, '90A', 'DEAL', lambda report, item, qualifier, value: prices.append(value))
+        swiftmess.registerReportType(rawce290)
+        swiftmess.Report(_readable(
+            '{4:\n:77E:/TRNA RAWCE290\n:90A::DEAL//PRCT/99,5\n:90A::OTHR//1\n:20:x\n-}\n'))
+        self.assertEqual(prices, ['PRCT/99,5'])
+
+    def testFailsOnDuplicateHandler(self):
+        reportType = swiftmess.ReportType('RAWCE290')
+        reportType.addHandler(4, '20', None, lambda report, item: None)
+        reportType.addHandler(4, '90A', 'DEAL', lambda report, item, qualifier, value: None)
+        self.assertRaises(swiftmess.Error, reportType.addHandler, 4, '20', None, lambda report, item: None)
+        self.assertRaises(swiftmess.Error, reportType.addHandler, 4, '20', 'DEAL', lambda report, item: None)
+        self.assertRaises(swiftmess.Error, reportType.addHandler, 4, '90A', 'DEAL', lambda report, item: None)
+
+    def testFailsOnUnknownReportType(self):
+        with open(_testFilePath('rawce290.txt'), 'rb') as testFile:
+            self.assertRaises(swiftmess.Error, swiftmess.Report, testFile)
+
+
+class TestReportReader(unittest.TestCase):
+    def testCanReadTradesOneAtATime(self):
+        with open(_testFilePath('rawce260.txt'), 'rb') as testFile:
+            expectedValues = _reportValues(swiftmess.Report(testFile))
+        with open(_testFilePath('rawce260.txt'), 'rb') as testFile:
+            reader = swiftmess.ReportReader(testFile)
+            self.assertEqual(reader.report, None)
+            self.assertEqual(reader.safekeepingAccount, None)
+            trades = iter(reader)
+            firstTrade = next(trades)
+            self.assertEqual(reader.report, 'RAWCE260')
+            self.assertEqual(reader.safekeepingAccount, '7000001')
+            self.assertEqual(reader.tradeCount, 1)
+            actualTrades = [firstTrade] + list(trades)
+            self.assertEqual(
+                (reader.report, reader.financialInstrument, reader.safekeepingAccount, _tradeValues(actualTrades)),
+                expectedValues)
+
+    def testCanYieldTradesBeforeBrokenData(self):
+        with open(_testFilePath('rawce260.txt'), 'rb') as testFile:
+            data = testFile.read()
+        reader = swiftmess.ReportReader(_readable(data + b'broken'))
+        trades = []
+        try:
+            for trade in reader:
+                trades.append(trade)
+            self.fail()
+        except swiftmess.Error:
+            pass
+        self.assertEqual([trade.tradeNumber for trade in trades], ['000123', '000124'])
+
+    def testFailsOnReportWithoutTrades(self):
+        data = '{4:\n:77E:/TRNA RAWCE260\n-}\n'
+        reader = swiftmess.ReportReader(_readable(data))
+        self.assertRaises(swiftmess.Error, list, reader)
+
+    def testCanReadReportWithoutType(self):
+        reader = swiftmess.ReportReader(_readable('{4:\n:20:1\n-}\n'))
+        self.assertEqual(list(reader), [])
+        self.assertEqual(reader.report, None)
+
+
+class TestParallel(unittest.TestCase):
+    def setUp(self):
+        self.tempFolder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempFolder)
+
+    def _swiftPath(self, data):
+        result = os.path.join(self.tempFolder, 'swift.txt')
+        with open(result, 'wb') as swiftFile:
+            swiftFile.write(data)
+        return result
+
+    def _rawce260Data(self):
+        with open(_testFilePath('rawce260.txt'), 'rb') as testFile:
+            result = testFile.read()
+        return result
+
+    def _testSameAsReport(self, path):
+        with open(path, 'rb') as swiftFile:
+            expectedValues = _reportValues(swiftmess.Report(swiftFile))
+        for chunkSize in (1, 100, swiftmess.DefaultChunkSize):
+            report = swiftmess.parallelReport(path, 2, chunkSize)
+            self.assertEqual(_reportValues(report), expectedValues)
+            orderedTrades = list(swiftmess.parallelTrades(path, 2, chunkSize))
+            self.assertEqual(_tradeValues(orderedTrades), expectedValues[3])
+            unorderedTrades = list(swiftmess.parallelTrades(path, 2, chunkSize, ordered=False))
+            self.assertEqual(
+                sorted(_tradeValues(unorderedTrades), key=repr), sorted(expectedValues[3], key=repr))
+
+    def testCanParseInParallel(self):
+        self._testSameAsReport(_testFilePath('rawce260.txt'))
+        self._testSameAsReport(self._swiftPath(self._rawce260Data().replace(b'\n', b'\r\n') * 5))
+
+    def testCanParseTradeSpanningMessages(self):
+        # Move the dates of the last trade in the first message to the start of the second message.
+        data = self._rawce260Data()
+        datesToMove = b':98A::TRAD//20051128\n:98A::SETT//20051201\n'
+        data = data.replace(datesToMove, b'')
+        lastPriceIndex = data.rindex(b':94B::PRIC')
+        data = data[:lastPriceIndex] + datesToMove + data[lastPriceIndex:]
+        self._testSameAsReport(self._swiftPath(data))
+
+    def testCanSplitReportWithoutReportType(self):
+        path = self._swiftPath(b'{4:\n:20:A\n-}\n' * 10)
+        self.assertEqual(swiftmess._reportChunkRanges(path, 1), (None, [(13 * i, 13 * (i + 1)) for i in range(10)]))
+        self.assertEqual(list(swiftmess.parallelTrades(path, 2, 1)), [])
+
+    def testFailsOnUnknownReportTypeLikeReport(self):
+        path = _testFilePath('rawce290.txt')
+        with open(path, 'rb') as swiftFile:
+            self.assertRaises(swiftmess.Error, swiftmess.Report, swiftFile)
+        self.assertRaises(swiftmess.Error, swiftmess.parallelReport, path, 2, 1)
+        for ordered in (True, False):
+            self.assertRaises(swiftmess.Error, list, swiftmess.parallelTrades(path, 2, 1, ordered))
+
+    def testCanReadRegisteredReportTypeLikeReport(self):
+        def initRawce290(report):
+            report.itemNumbers = []
+
+        def processItemNumber(report, item):
+            report.itemNumbers.extend(item[3])
+
+        rawce290 = swiftmess.ReportType('RAWCE290', initRawce290)
+        rawce290.addHandler(4, '12', None, processItemNumber)
+        swiftmess.registerReportType(rawce290)
+        try:
+            path = _testFilePath('rawce290.txt')
+            report = swiftmess.parallelReport(path, 2, 1)
+            self.assertEqual((report.report, report.itemNumbers), ('RAWCE290', ['099']))
+            self.assertEqual(list(swiftmess.parallelTrades(path, 2, 1)), [])
+        finally:
+            swiftmess._reportTypes.pop('RAWCE290', None)
+
+    def testFailsOnSameErrorAsReport(self):
+        data = self._rawce260Data()
+        path = self._swiftPath(data + data.replace(b':98A::SETT//20051202', b':98A::SETT//20051232'))
+        with open(path, 'rb') as swiftFile:
+            try:
+                swiftmess.Report(swiftFile)
+                self.fail()
+            except swiftmess.Error as error:
+                expectedMessage = _Text(error)
+        try:
+            swiftmess.parallelReport(path, 2, 100)
+            self.fail()
+        except swiftmess.Error as error:
+            self.assertEqual(_Text(error), expectedMessage)
+
+
+class TestIngest(unittest.TestCase):
+    def setUp(self):
+        self.tempFolder = tempfile.mkdtemp()
+        with open(_testFilePath('rawce260.txt'), 'rb') as testFile:
+            self.data = testFile.read()
+        self.paths = []
+        for name, openTarget in (
+                ('a.txt', open), ('b.txt.gz', gzip.GzipFile), ('c.txt.bz2', bz2.BZ2File), ('d.txt', open)):
+            path = os.path.join(self.tempFolder, name)
+            targetFile = openTarget(path, 'wb')
+            try:
+                if name == 'd.txt':
+                    targetFile.write(b'broken')
+                else:
+                    targetFile.write(self.data)
+            finally:
+                targetFile.close()
+            self.paths.append(path)
+        self.expectedTrades = _tradeValues(swiftmess.Report(_readable(self.data)).trades)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempFolder)
+
+    def testCanFindPaths(self):
+        self.assertEqual(swiftmess.ingestPaths(self.tempFolder), self.paths)
+        self.assertEqual(swiftmess.ingestPaths(os.path.join(self.tempFolder, '*.txt')), [self.paths[0], self.paths[3]])
+
+    def testCanIngestInOrder(self):
+        for pool in swiftmess.IngestPoolKinds:
+            results = list(swiftmess.ingestReports(self.tempFolder, 2, pool, ordered=True, maxInFlight=1))
+            self.assertEqual([result.path for result in results], self.paths)
+            for result in results[:3]:
+                self.assertEqual(result.error, None)
+                self.assertEqual(_tradeValues(result.report.trades), self.expectedTrades)
+                self.assertTrue(result.seconds >= 0.0)
+            self.assertEqual(results[3].report, None)
+            self.assertTrue(results[3].error.startswith('block must start with'), results[3].error)
+
+    def testCanIngestAsCompleted(self):
+        results = list(swiftmess.ingestReports(self.paths[:3], pool='thread', columnar=True))
+        self.assertEqual(sorted(result.path for result in results), self.paths[:3])
+        self.assertTrue(isinstance(results[0].report.trades, swiftmess.TradeColumns))
+
+    def testCanCollectStatsAndQuarantineWithThreads(self):
+        quarantine = swiftmess.Quarantine()
+        stats = swiftmess.ParseStats()
+        results = list(swiftmess.ingestReports(self.paths, pool='thread', quarantine=quarantine, stats=stats))
+        self.assertEqual([result.error for result in results], 4 * [None])
+        self.assertEqual(len(quarantine), 1)
+        self.assertEqual(stats.tradeCounts['RAWCE260'], 9)
+        self.assertTrue(stats.bytesRead > 0)
+
+    def testFailsOnStatsAndQuarantineWithProcesses(self):
+        self.assertRaises(ValueError, swiftmess.ingestReports, self.paths, stats=swiftmess.ParseStats())
+        self.assertRaises(ValueError, swiftmess.ingestReports, self.paths, pool='process', quarantine=swiftmess.Quarantine())
+
+    def testCanIngestFromCommandLine(self):
+        exitCode, output = _runCommandLine(swiftmess.ingestMain, ['--pool', 'thread', '--ordered', self.paths[0]])
+        self.assertEqual(exitCode, 0)
+        self.assertEqual(output.splitlines()[0].split('\t')[:3], [self.paths[0], 'RAWCE260', '3'])
+        exitCode, output = _runCommandLine(swiftmess.ingestMain, ['--workers', '1', self.tempFolder])
+        self.assertEqual(exitCode, 1)
+        self.assertEqual(len(output.splitlines()), len(self.paths))
+
+
+class TestReportCache(unittest.TestCase):
+    def setUp(self):
+        self.tempFolder = tempfile.mkdtemp()
+        self.cacheFolder = os.path.join(self.tempFolder, 'cache')
+        self.sourcePath = os.path.join(self.tempFolder, 'rawce260.txt')
+        shutil.copy(_testFilePath('rawce260.txt'), self.sourcePath)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempFolder)
+
+    def _cachedNames(self):
+        return sorted(name for name in os.listdir(self.cacheFolder) if name.endswith(swiftmess.ReportCacheSuffix))
+
+    def testCanCacheReport(self):
+        cache = swiftmess.ReportCache(self.cacheFolder)
+        with swiftmess.openSwiftFile(self.sourcePath) as swiftFile:
+            expectedValues = _reportValues(swiftmess.Report(swiftFile))
+        for _ in range(2):
+            self.assertEqual(_reportValues(cache.report(self.sourcePath)), expectedValues)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        columnarReport = cache.report(self.sourcePath, columnar=True)
+        self.assertTrue(isinstance(columnarReport.trades, swiftmess.TradeColumns))
+        self.assertEqual(len(self._cachedNames()), 2)
+
+    def testCanDetectChangedContent(self):
+        cache = swiftmess.ReportCache(self.cacheFolder)
+        key = cache.key(self.sourcePath)
+        self.assertEqual(len(cache.report(self.sourcePath).trades), 3)
+        with open(self.sourcePath, 'rb') as sourceFile:
+            data = sourceFile.read()
+        with open(self.sourcePath, 'wb') as sourceFile:
+            sourceFile.write(data.replace(b':20C::TRRF//20051128000124', b':20C::TRRF//20051128000999'))
+        self.assertNotEqual(cache.key(self.sourcePath), key)
+        self.assertEqual([trade.tradeNumber for trade in cache.report(self.sourcePath).trades], ['000123', '000999', '000007'])
+
+    def testCanDetectChangedVersion(self):
+        cache = swiftmess.ReportCache(self.cacheFolder)
+        key = cache.key(self.sourcePath)
+        originalVersion = swiftmess.__version__
+        swiftmess.__version__ = originalVersion + '.test'
+        try:
+            self.assertNotEqual(cache.key(self.sourcePath), key)
+        finally:
+            swiftmess.__version__ = originalVersion
+
+    def testCanDetectChangedSource(self):
+        cache = swiftmess.ReportCache(self.cacheFolder)
+        key = cache.key(self.sourcePath)
+        originalSourceHash = swiftmess._moduleSourceHash()
+        swiftmess._sourceHash = originalSourceHash + 'test'
+        try:
+            self.assertNotEqual(cache.key(self.sourcePath), key)
+        finally:
+            swiftmess._sourceHash = originalSourceHash
+
+    def testCanUseSameKeyForSetsInEveryProcess(self):
+        # String hashes and thus the order of sets differ between processes with different hash seeds.
+        script = 'import swiftmess; print(swiftmess.ReportCache(%r).key(%r, tradeAttributeNames=set(%r)))' % (
+            self.cacheFolder, self.sourcePath, list(swiftmess.TradeAttributeNames))
+        modulePath = os.path.dirname(os.path.abspath(swiftmess.__file__))
+        keys = set()
+        for hashSeed in ('1', '2', '3'):
+            environment = dict(os.environ, PYTHONHASHSEED=hashSeed, PYTHONPATH=modulePath)
+            keys.add(subprocess.check_output([sys.executable, '-c', script], env=environment))
+        self.assertEqual(len(keys), 1)
+
+    def testCanIgnoreBrokenCacheFile(self):
+        cache = swiftmess.ReportCache(self.cacheFolder)
+        cache.report(self.sourcePath)
+        cachedName, = self._cachedNames()
+        with open(os.path.join(self.cacheFolder, cachedName), 'wb') as cacheFile:
+            cacheFile.write(b'broken')
+        self.assertEqual(len(cache.report(self.sourcePath).trades), 3)
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+
+    def testCanBypassCacheForQuarantineAndStats(self):
+        cache = swiftmess.ReportCache(self.cacheFolder)
+        with open(self.sourcePath, 'ab') as sourceFile:
+            sourceFile.write(b'{1:broken\n')
+        for _ in range(2):
+            quarantine = swiftmess.Quarantine()
+            stats = swiftmess.ParseStats()
+            self.assertEqual(len(cache.report(self.sourcePath, quarantine=quarantine, stats=stats).trades), 3)
+            self.assertEqual(len(quarantine), 1)
+            self.assertTrue(stats.bytesRead > 0)
+        self.assertEqual((cache.hits, cache.misses), (0, 0))
+        self.assertEqual(self._cachedNames(), [])
+        self.assertRaises(ValueError, cache.key, self.sourcePath, quarantine=swiftmess.Quarantine())
+
+    def testCanEvictLeastRecentlyUsedReports(self):
+        cache = swiftmess.ReportCache(self.cacheFolder)
+        with swiftmess.openSwiftFile(self.sourcePath) as swiftFile:
+            report = swiftmess.Report(swiftFile)
+        for key in ('a', 'b', 'c'):
+            cache.put(key, report)
+            cachePath = os.path.join(self.cacheFolder, key + swiftmess.ReportCacheSuffix)
+            # Use distinct access times even if the file system has a coarse time resolution.
+            accessTime = {'a': 100, 'b': 300, 'c': 200}[key]
+            os.utime(cachePath, (accessTime, accessTime))
+        reportSize = os.path.getsize(cachePath)
+        cache.maxSize = 2 * reportSize
+        cache.evict()
+        self.assertEqual(self._cachedNames(), ['b' + swiftmess.ReportCacheSuffix, 'c' + swiftmess.ReportCacheSuffix])
+        cache.maxSize = 0
+        cache.evict()
+        self.assertEqual(self._cachedNames(), [])
+
+
+class TestMessageWriter(unittest.TestCase):
+    _BasicHeader = 'F01XXXXXXXXXXXX0000999999'
+    _ApplicationHeader = 'O5981519051128XXXXXXXXXXXX000099999905112815 19N'
+
+    def _writtenItems(self, items, **keywords):
+        targetFile = io.BytesIO()
+        with swiftmess.MessageWriter(targetFile, **keywords) as writer:
+            writer.writeItems(items)
+        return targetFile.getvalue()
+
+    def testCanWriteItemsOfTestFiles(self):
+        for name in ('rawce260.txt', 'rawce290.txt'):
+            with open(_testFilePath(name), 'rb') as testFile:
+                data = testFile.read()
+            items = list(swiftmess.messageItems(_readable(data)))
+            self.assertEqual(self._writtenItems(items), data)
+            crlfData = self._writtenItems(items, lineSeparator='\r\n', bufferSize=7)
+            self.assertEqual(list(swiftmess.messageItems(_readable(crlfData))), items)
+
+    def testCanWriteItemsOfRandomText(self):
+        randomGenerator = random.Random(0)
+        writtenCount = 0
+        for _ in range(2000):
+            tokens = ('{1:', '{4:', '{108:', '}', '}', '\n', '\n', ':20:', ':', 'ab', '-')
+            text = ''.join(randomGenerator.choice(tokens) for _ in range(randomGenerator.randint(1, 12)))
+            try:
+                items = list(swiftmess.messageItems(_readable(text.encode('ascii'))))
+            except (swiftmess.Error, ValueError):
+                continue
+            self.assertEqual(list(swiftmess.messageItems(_readable(self._writtenItems(items)))), items, text)
+            writtenCount += 1
+        self.assertTrue(writtenCount >= 50, writtenCount)
+
+    def testCanWriteEncodedText(self):
+        items = [(1, 'block', 4), (1, 'field', '20'), (1, 'value', u'\u20ac\xe4'), (0, 'message', None)]
+        data = self._writtenItems(items, encoding='utf-8')
+        self.assertEqual(list(swiftmess.messageItems(_readable(data), encoding='utf-8')), items)
+        textFile = io.StringIO()
+        with swiftmess.MessageWriter(textFile) as writer:
+            writer.writeItems(items)
+        self.assertEqual(textFile.getvalue(), u'{4::20:\u20ac\xe4}\n')
+
+    def testCanWriteMessages(self):
+        targetFile = io.BytesIO()
+        with swiftmess.MessageWriter(targetFile) as writer:
+            for messageNumber in range(3):
+                writer.writeMessage(
+                    self._BasicHeader, self._ApplicationHeader,
+                    [('20', '%d' % messageNumber), ('77E', ['/TREF XXXXXXXXXXXXXXXX', '', '/TRNA RAWCE260']), ('12', [])],
+                    {108: 'MUR', 103: ''})
+        messages = list(swiftmess.lazyMessages(_readable(targetFile.getvalue())))
+        self.assertEqual(len(messages), 3)
+        self.assertEqual(messages[2].messageType, '598')
+        self.assertEqual(messages[2].userHeader, {103: '', 108: 'MUR'})
+        self.assertEqual(messages[2].reportType, 'RAWCE260')
+        self.assertEqual(messages[2].bodyItems(), [
+            (1, 4, None, ['']), (1, 4, '20', ['2']), (1, 4, '77E', ['/TREF XXXXXXXXXXXXXXXX', '', '/TRNA RAWCE260']),
+            (1, 4, '12', [''])])
+
+    def testCanWriteRawce260(self):
+        with open(_testFilePath('rawce260.txt'), 'rb') as testFile:
+            data = testFile.read()
+        report = swiftmess.Report(_readable(data))
+        self.assertEqual(report.trades[2].tradeType, '1')
+        for trades in (report.trades, swiftmess.Report(_readable(data), columnar=True).trades):
+            for tradesPerMessage in (1, 2, 100):
+                targetFile = io.BytesIO()
+                with swiftmess.MessageWriter(targetFile) as writer:
+                    writer.writeRawce260(
+                        self._BasicHeader, self._ApplicationHeader, trades, report.safekeepingAccount,
+                        report.financialInstrument, tradesPerMessage)
+                writtenReport = swiftmess.Report(_readable(targetFile.getvalue()), strictAmounts=True)
+                self.assertEqual(_reportValues(writtenReport), _reportValues(report))
+                self.assertEqual(len(swiftmess.buildMessageIndex(_readable(targetFile.getvalue()))), (3 + tradesPerMessage - 1) // tradesPerMessage)
+
+    def testCanWriteRawce260WithEmptyTrades(self):
+        targetFile = io.BytesIO()
+        with swiftmess.MessageWriter(targetFile) as writer:
+            writer.writeRawce260(self._BasicHeader, self._ApplicationHeader, [swiftmess.Trade(), swiftmess.Trade()])
+        trades = swiftmess.Report(_readable(targetFile.getvalue())).trades
+        self.assertEqual(_tradeValues(trades), _tradeValues([swiftmess.Trade(), swiftmess.Trade()]))
+
+    def testFailsOnUnwritableItems(self):
+        for items in (
+            [(1, 'block', 4), (1, 'value', 'a\nb')],
+            [(1, 'block', 4), (1, 'value', ':a')],
+            [(1, 'block', 4), (1, 'field', 'a:b'), (1, 'value', '')],
+            [(1, 'block', 4), (1, 'field', '20'), (1, 'field', '21')],
+            [(1, 'block', 4), (1, 'field', '20'), (1, 'value', 'a}')],
+            [(2, 'block', 4)],
+            [(0, 'value', '')],
+            [(1, 'block', 3), (2, 'block', 108), (0, 'message', None), (1, 'value', 'a')],
+            [(1, 'block', 3), (2, 'block', 108), (1, 'value', 'a')],
+            [(1, 'block', -1)],
+            [(1, 'message', None)],
+            [(1, 'xxx', None)],
+        ):
+            writer = swiftmess.MessageWriter(io.BytesIO())
+            self.assertRaises(swiftmess.Error, writer.writeItems, items)
+
+    def testFailsOnUnwritableMessage(self):
+        writer = swiftmess.MessageWriter(io.BytesIO())
+        self.assertRaises(swiftmess.Error, writer.writeMessage, self._BasicHeader, 'I598}', [])
+        self.assertRaises(swiftmess.Error, writer.writeMessage, self._BasicHeader, self._ApplicationHeader, [('20', ['a', ':b'])])
+        writer.writeItems([(1, 'block', 1)])
+        self.assertRaises(swiftmess.Error, writer.writeMessage, self._BasicHeader, self._ApplicationHeader, [])
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.tempFolder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempFolder)
+
+    def testCanExportCsv(self):
+        csvPath = os.path.join(self.tempFolder, 'trades.csv')
+        tradeCount = swiftmess.exportTrades(_testFilePath('rawce260.txt'), csvPath, batchSize=2)
+        self.assertEqual(tradeCount, 3)
+        with _openCsvForReading(csvPath) as csvFile:
+            rows = list(csv.DictReader(csvFile))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['tradeNumber'], '000123')
+        self.assertEqual(rows[0]['tradeDate'], '2005-11-28')
+        self.assertEqual(rows[0]['accrInterestCurrency'], 'EUR')
+        self.assertEqual(rows[0]['accrInterestAmount'], '12345.67')
+        self.assertEqual(rows[0]['nominal'], '1000000')
+
+    def testFailsOnOtherReportTypeWithoutLeavingTarget(self):
+        csvPath = os.path.join(self.tempFolder, 'trades.csv')
+        self.assertRaises(swiftmess.Error, swiftmess.exportTrades, _testFilePath('rawce290.txt'), csvPath)
+        self.assertFalse(os.path.exists(csvPath))
+
+    def testFailsOnUnknownSuffix(self):
+        self.assertRaises(
+            swiftmess.Error, swiftmess.exportTrades, _testFilePath('rawce260.txt'),
+            os.path.join(self.tempFolder, 'trades.txt'))
+
+    def testCanExportArrowAndParquet(self):
+        pyarrow = _importOrSkip('pyarrow')
+        _importOrSkip('pyarrow.ipc')
+        _importOrSkip('pyarrow.parquet')
+        trades = swiftmess.Report(_readable(_testFileData('rawce260.txt'))).trades
+        trades[0].nominal = Decimal('1.123456789012')
+        trades[1].accrInterest = ('EUR', Decimal('0.00000000005'))
+        for format in ('arrow', 'parquet'):
+            targetPath = os.path.join(self.tempFolder, 'trades.' + format)
+            swiftmess.writeTradesArrow(trades, targetPath, format, batchSize=2)
+            if format == 'arrow':
+                with pyarrow.ipc.open_file(targetPath) as arrowFile:
+                    table = arrowFile.read_all()
+            else:
+                table = pyarrow.parquet.read_table(targetPath)
+            self.assertEqual(table.schema.names, list(swiftmess.ExportColumnNames))
+            rows = table.to_pylist()
+            self.assertEqual([row['tradeNumber'] for row in rows], ['000123', '000124', '000007'])
+            self.assertEqual(rows[0]['nominal'], Decimal('1.1234567890'))
+            self.assertEqual(rows[1]['accrInterestAmount'], Decimal('0E-10'))
+            self.assertEqual(rows[1]['tradeDate'], date(2005, 11, 28))
+            self.assertEqual(rows[2]['tradeSettlementAmount'], Decimal('250099.99'))
+
+    def testCanExportArrowFromTradeColumns(self):
+        pyarrow = _importOrSkip('pyarrow')
+        _importOrSkip('pyarrow.ipc')
+        data = _testFileData('rawce260.txt')
+        tables = []
+        for columnar in (False, True):
+            trades = swiftmess.Report(_readable(data), columnar=columnar).trades
+            targetPath = os.path.join(self.tempFolder, 'trades%d.arrow' % columnar)
+            swiftmess.writeTradesArrow(trades, targetPath, 'arrow', batchSize=2)
+            with pyarrow.ipc.open_file(targetPath) as arrowFile:
+                tables.append(arrowFile.read_all())
+        self.assertTrue(isinstance(trades, swiftmess.TradeColumns))
+        self.assertEqual(tables[1].to_pylist(), tables[0].to_pylist())
+        self.assertEqual(tables[1].num_rows, 3)
+
+    def testFailsOnParquetWithoutPyarrow(self):
+        savedModules = dict((name, module) for name, module in sys.modules.items() if name.split('.')[0] == 'pyarrow')
+        # A module set to None cannot be imported.
+        sys.modules['pyarrow'] = None
+        try:
+            self.assertRaises(
+                swiftmess.Error, swiftmess.exportTrades, _testFilePath('rawce260.txt'),
+                os.path.join(self.tempFolder, 'trades.parquet'))
+        finally:
+            del sys.modules['pyarrow']
+            sys.modules.update(savedModules)
+
+    def testCanConvertFromCommandLine(self):
+        csvPath = os.path.join(self.tempFolder, 'trades.txt')
+        self.assertEqual(_runCommandLine(swiftmess.main, ['--format', 'csv', _testFilePath('rawce260.txt'), csvPath]), (0, ''))
+        self.assertTrue(os.path.exists(csvPath))
+        self.assertEqual(
+            _runCommandLine(swiftmess.main, [os.path.join(self.tempFolder, 'missing.txt'), csvPath + '.csv'])[0], 1)
+
+    def testCanQuarantineBrokenMessagesFromCommandLine(self):
+        with open(_testFilePath('rawce260.txt'), 'rb') as testFile:
+            data = testFile.read()
+        sourcePath = os.path.join(self.tempFolder, 'broken.txt')
+        with open(sourcePath, 'wb') as sourceFile:
+            sourceFile.write(data + b'{1:broken}}\n')
+        csvPath = os.path.join(self.tempFolder, 'trades.csv')
+        quarantinePath = os.path.join(self.tempFolder, 'broken.quarantine')
+        self.assertEqual(_runCommandLine(swiftmess.main, [sourcePath, csvPath])[0], 1)
+        self.assertEqual(_runCommandLine(swiftmess.main, ['--quarantine', quarantinePath, sourcePath, csvPath])[0], 0)
+        with open(quarantinePath, 'rb') as quarantineFile:
+            quarantineLines = quarantineFile.readlines()
+        self.assertEqual(len(quarantineLines), 1)
+        self.assertTrue(quarantineLines[0].startswith(('%d\t%d\t' % (len(data), len(data) + 12)).encode('ascii')))
+
+
+class TestSwiftgen(unittest.TestCase):
+    def _report(self, **keywords):
+        swiftFile = io.BytesIO()
+        swiftgen.writeRawce260(swiftFile, **keywords)
+        swiftFile.seek(0)
+        return swiftmess.Report(swiftFile, strictAmounts=True)
+
+    def testCanGenerateRawce260(self):
+        report = self._report(messageCount=3, tradesPerMessage=4)
+        self.assertEqual(report.report, 'RAWCE260')
+        self.assertEqual(len(report.trades), 12)
+        self.assertEqual(report.trades[-1].tradeNumber, '000012')
+        self.assertNotEqual(report.trades[0].tradeType, None)
+
+    def testCanGenerateWithCrlfAndFewDetails(self):
+        lfReport = self._report(messageCount=2, tradesPerMessage=2, detailCount=1)
+        crlfReport = self._report(messageCount=2, tradesPerMessage=2, detailCount=1, lineSeparator='\r\n')
+        self.assertEqual(_tradeValues(crlfReport.trades), _tradeValues(lfReport.trades))
+        self.assertEqual(lfReport.trades[0].exchangeMember, None)
 
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
-    #import sys;sys.argv = ['', 'Test.testName']
+    # import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
@@ -0,0 +1,199 @@
+'''Tests for `swiftmessaio`.
+'''
+# Copyright (c) 2012, Thomas Aglassinger
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License
+# for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import asyncio
+import io
+import logging
+import os
+import unittest
+
+import swiftmess
+import swiftmessaio
+
+_log = logging.getLogger('swift')
+
+
+def _testFilePath(name):
+    basePath = os.path.dirname(__file__)
+    return os.path.join(basePath, name)
+
+
+def _testData():
+    with open(_testFilePath('rawce260.txt'), 'rb') as testFile:
+        result = testFile.read()
+    return result
+
+
+async def _sendInParts(data, writer, partSize=7):
+    '''
+    Send ``data`` to ``writer`` in parts of ``partSize`` bytes, giving other tasks the chance to run
+    in between like a slow network connection would.
+    '''
+    for start in range(0, len(data), partSize):
+        writer.write(data[start:start + partSize])
+        await writer.drain()
+        await asyncio.sleep(0)
+    writer.close()
+
+
+async def _receivedFromStandInServer(data, consume):
+    '''
+    Result of ``consume(reader)`` for a reader connected to a local server that sends ``data``.
+    '''
+    async def sendData(reader, writer):
+        await _sendInParts(data, writer)
+
+    server = await asyncio.start_server(sendData, '127.0.0.1', 0)
+    try:
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            result = await consume(reader)
+        finally:
+            writer.close()
+    finally:
+        server.close()
+        await server.wait_closed()
+    return result
+
+
+async def _asyncParts(parts):
+    for part in parts:
+        await asyncio.sleep(0)
+        yield part
+
+
+async def _itemsFrom(stream, **keywords):
+    return [item async for item in swiftmessaio.messageItems(stream, **keywords)]
+
+
+async def _messagesFrom(stream):
+    return [message async for message in swiftmessaio.messages(stream)]
+
+
+async def _tradeNumbersFrom(stream):
+    return [trade.tradeNumber async for trade in swiftmessaio.AsyncReportReader(stream)]
+
+
+def _tradeValues(trades):
+    return [trade.asDict() for trade in trades]
+
+
+class TestAsyncMessageItems(unittest.TestCase):
+    def testCanReadItemsFromServer(self):
+        data = _testData()
+        expectedItems = list(swiftmess.messageItems(io.StringIO(data.decode('iso-8859-1'))))
+        actualItems = asyncio.run(_receivedFromStandInServer(data, _itemsFrom))
+        self.assertEqual(actualItems, expectedItems)
+
+    def testCanDecodeCharactersSplitBetweenParts(self):
+        parts = [b'{4:\n:20C::SEME//\xc3', b'\xa4bc\n-}\n']
+        actualItems = asyncio.run(_itemsFrom(_asyncParts(parts), encoding='utf-8'))
+        self.assertEqual(actualItems, [
+            (1, 'block', 4), (1, 'value', ''), (1, 'field', '20C'), (1, 'value', ':SEME//\xe4bc'),
+            (1, 'value', '-'), (0, 'message', None)])
+
+    def testFailsOnBrokenData(self):
+        self.assertRaises(swiftmess.Error, asyncio.run, _itemsFrom(_asyncParts([b'x{1:}\n'])))
+
+    def testCanShareFieldNames(self):
+        symbols = swiftmess.SymbolTable()
+        firstItems = asyncio.run(_itemsFrom(_asyncParts([_testData()]), symbols=symbols))
+        secondItems = asyncio.run(_itemsFrom(_asyncParts([_testData()]), symbols=symbols))
+        self.assertEqual(firstItems, secondItems)
+        fieldIndex = [kind for _, kind, _ in firstItems].index('field')
+        self.assertTrue(firstItems[fieldIndex][2] is secondItems[fieldIndex][2])
+        self.assertEqual(symbols.misses, len(symbols))
+        self.assertTrue(symbols.hits > symbols.misses)
+
+    def testCanReadMessages(self):
+        messages = asyncio.run(_receivedFromStandInServer(_testData(), _messagesFrom))
+        self.assertEqual(len(messages), 2)
+        self.assertEqual(messages[0][0], (1, 'block', 1))
+        self.assertNotIn('message', [kind for _, kind, _ in messages[0]])
+
+
+class TestAsyncReportReader(unittest.TestCase):
+    def testCanReadTradesFromServer(self):
+        data = _testData()
+
+        async def readTrades(stream):
+            reader = swiftmessaio.AsyncReportReader(stream)
+            trades = [trade async for trade in reader]
+            return (reader.report, reader.safekeepingAccount, trades)
+
+        expectedTrades = swiftmess.Report(io.StringIO(data.decode('iso-8859-1'))).trades
+        report, safekeepingAccount, actualTrades = asyncio.run(_receivedFromStandInServer(data, readTrades))
+        self.assertEqual(report, 'RAWCE260')
+        self.assertEqual(safekeepingAccount, '7000001')
+        self.assertEqual(_tradeValues(actualTrades), _tradeValues(expectedTrades))
+
+    def testCanReadConcurrentFeeds(self):
+        feedCount = 5
+
+        async def readFeeds():
+            return await asyncio.gather(*[
+                _receivedFromStandInServer(_testData(), _tradeNumbersFrom) for _ in range(feedCount)])
+
+        self.assertEqual(asyncio.run(readFeeds()), feedCount * [['000123', '000124', '000007']])
+
+    def testCanShareFieldNamesWithReport(self):
+        async def readSymbols():
+            reader = swiftmessaio.AsyncReportReader(_asyncParts([_testData()]))
+            [trade async for trade in reader]
+            return reader._report.symbols
+
+        expectedReport = swiftmess.Report(io.BytesIO(_testData()))
+        self.assertEqual(len(asyncio.run(readSymbols())), len(expectedReport.symbols))
+
+    def testCanYieldTradesBeforeBrokenData(self):
+        tradeNumbers = []
+
+        async def readTrades():
+            async for trade in swiftmessaio.AsyncReportReader(_asyncParts([_testData(), b'broken'])):
+                tradeNumbers.append(trade.tradeNumber)
+
+        self.assertRaises(swiftmess.Error, asyncio.run, readTrades())
+        self.assertEqual(tradeNumbers, ['000123', '000124'])
+
+    def testCanReadProjectedTrades(self):
+        async def readTrades():
+            reader = swiftmessaio.AsyncReportReader(_asyncParts([_testData()]), tradeAttributeNames=['tradeNumber'])
+            return [(trade.tradeNumber, trade.nominal) async for trade in reader]
+
+        self.assertEqual(asyncio.run(readTrades()), [('000123', None), ('000124', None), ('000007', None)])
+
+    def testCanReadQueriedTrades(self):
+        query = swiftmess.Query(tradeConditions=[('tradeNumber', '!=', '000124')])
+
+        async def readTrades():
+            reader = swiftmessaio.AsyncReportReader(_asyncParts([_testData()]), query=query)
+            return ([trade.tradeNumber async for trade in reader], reader.rejectedTradeCount)
+
+        self.assertEqual(asyncio.run(readTrades()), (['000123', '000007'], 1))
+
+    def testFailsOnQueryWithMessageConditions(self):
+        query = swiftmess.Query(messageConditions=[('messageType', '==', '598')])
+        self.assertRaises(swiftmess.Error, swiftmessaio.AsyncReportReader, _asyncParts([]), query=query)
+
+    def testFailsOnSynchronousIteration(self):
+        reader = swiftmessaio.AsyncReportReader(_asyncParts([]))
+        self.assertRaises(TypeError, iter, reader)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    unittest.main()